@@ -17,6 +17,8 @@ setup(
     install_requires=['visitoolkit-eventsystem==0.1.5',
                       'websocket-client-py3==0.15.0',
                       'python-dateutil==2.7.3'],
+    extras_require={'export': ['pyarrow']},
+    entry_points={'console_scripts': ['visitoolkit-loadgen=visitoolkit_connector.loadgen:main']},
     url='https://github.com/stefanbraun-private/visitoolkit_connector',
     license='GPL-3.0',
     author='Stefan Braun',
@@ -0,0 +1,46 @@
+# encoding: utf-8
+"""
+shared fixtures: local stand-in DMS (visitoolkit_connector.standin) and DMSClient connected to it
+"""
+
+import pytest
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import standin
+
+
+def close_client(dmsclient):
+    """ stopping all background threads of DMSClient """
+    dmsclient.close()
+
+
+@pytest.fixture
+def server():
+    """ running stand-in DMS with 200 synthetic datapoints (paths in attribute "test_paths") """
+    srv = standin.StandInDMS()
+    srv.test_paths = srv.populate(200)
+    srv.start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def make_client(server):
+    """ factory: make_client(**kwargs) returns DMSClient connected to stand-in DMS """
+    clients = []
+
+    def _make_client(port=None, **kwargs):
+        dmsclient = connector.DMSClient('pytest', 'pytest', dms_port_int=port or server.port, **kwargs)
+        assert dmsclient.ready_to_send.wait(timeout=10), 'no WebSocket connection to stand-in DMS'
+        clients.append(dmsclient)
+        return dmsclient
+
+    yield _make_client
+    for dmsclient in clients:
+        close_client(dmsclient)
+
+
+@pytest.fixture
+def client(make_client):
+    """ DMSClient connected to stand-in DMS """
+    return make_client()
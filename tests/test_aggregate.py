@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""
+time-bucketed aggregation of trend data (TrendAggregator): NumPy and pure Python give same results
+"""
+
+import datetime
+import math
+import random
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+numpy = pytest.importorskip('numpy')
+
+TZINFO = datetime.timezone.utc
+
+
+def _random_trend(nof_points, seed=1):
+    # irregular trendpoints with some values which aren't numbers
+    rand = random.Random(seed)
+    secs = 1500000000.0
+    trendpoints = []
+    for _ in range(nof_points):
+        secs += rand.uniform(0.5, 120.0)
+        value = rand.choice([round(rand.uniform(-50.0, 50.0), 3), rand.randint(0, 10), 'text', None])
+        trendpoints.append(connector.Trendpoint_tuple(datetime.datetime.fromtimestamp(secs, tz=TZINFO), value))
+    return trendpoints
+
+
+def _aggregate(trendpoints, chunk_size, end):
+    aggregator = connector.TrendAggregator(interval_secs=300, origin=60.0)
+    for idx in range(0, len(trendpoints), chunk_size):
+        aggregator.add(trendpoints[idx:idx + chunk_size])
+    return list(aggregator.result(end=end))
+
+
+def _assert_same(first, second):
+    assert len(first) == len(second)
+    for row_a, row_b in zip(first, second):
+        for val_a, val_b in zip(row_a, row_b):
+            if isinstance(val_a, float) and math.isnan(val_a):
+                assert math.isnan(val_b)
+            elif isinstance(val_a, float):
+                assert val_a == pytest.approx(val_b, rel=1e-9, abs=1e-9)
+            else:
+                assert val_a == val_b
+
+
+def test_aggregation_of_known_values():
+    stamps = [datetime.datetime(2018, 1, 1, 0, 0, secs, tzinfo=TZINFO) for secs in (0, 10, 30)]
+    trendpoints = [connector.Trendpoint_tuple(stamp, value) for stamp, value in zip(stamps, (1.0, 3.0, 'text'))]
+    result = list(connector.HistData_compact([]).aggregate(60))
+    assert result == []
+    aggregator = connector.TrendAggregator(interval_secs=60)
+    aggregator.add(trendpoints)
+    bucket = aggregator.result()[0]
+    assert (bucket.count, bucket.min, bucket.max, bucket.mean, bucket.sum, bucket.first, bucket.last) == (2, 1.0, 3.0, 2.0, 4.0, 1.0, 3.0)
+    # 1.0 during 10 seconds, 3.0 until end of bucket
+    assert bucket.twa == pytest.approx((1.0 * 10 + 3.0 * 50) / 60)
+
+
+@pytest.mark.parametrize('chunk_size', [1, 37, 5000])
+def test_aggregation_parity(monkeypatch, chunk_size):
+    trendpoints = _random_trend(2000)
+    end = trendpoints[-1].stamp + datetime.timedelta(seconds=1000)
+    with_numpy = _aggregate(trendpoints, chunk_size, end)
+    monkeypatch.setattr(connector, 'numpy', None)
+    pure_python = _aggregate(trendpoints, chunk_size, end)
+    assert len(with_numpy) > 100
+    _assert_same(with_numpy, pure_python)
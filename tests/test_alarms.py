@@ -0,0 +1,121 @@
+# encoding: utf-8
+"""
+table of current alarm states (visitoolkit_connector.alarms.AlarmTable) with alarm datapoints of stand-in DMS
+"""
+
+import time
+
+import pytest
+
+from visitoolkit_connector import alarms
+from visitoolkit_connector import standin
+
+
+# path -> (priority, alarmGroup, siteGroup)
+ALARMS = {'ALM:Zone1:A1': (1, 10, 1),
+          'ALM:Zone1:A2': (2, 10, 1),
+          'ALM:Zone1:A3': (2, 20, 1),
+          'ALM:Zone2:A1': (1, 20, 2),
+          'ALM:Zone2:A2': (3, 20, 2),
+          'ALM:Zone2:A3': (3, 30, 2)}
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def alarm_server(server, client):
+    """ stand-in DMS with alarm datapoints: five of them have changelog entries, four are active """
+    for path, (priority, alarm_group, site_group) in ALARMS.items():
+        server.add_alarm(path, priority=priority, alarmGroup=alarm_group, siteGroup=site_group)
+    for path in ('ALM:Zone1:A1', 'ALM:Zone1:A2', 'ALM:Zone1:A3', 'ALM:Zone2:A1', 'ALM:Zone2:A2'):
+        client.dp_set(path, value=True)
+    client.dp_set('ALM:Zone1:A3', value=False)
+    return server
+
+
+@pytest.fixture
+def table(alarm_server, client):
+    alarm_table = alarms.AlarmTable(client, 'ALM').start()
+    yield alarm_table
+    alarm_table.stop()
+
+
+def test_bootstrap(table):
+    # (alarm datapoint without changelog entry has no row)
+    assert len(table) == 5
+    assert 'ALM:Zone2:A3' not in table
+    assert table.get('ALM:Zone1:A3')['state'] == standin.ALARM_STATE_OFF
+    assert table.get('ALM:Zone1:A1')['state'] == standin.ALARM_STATE_ON
+    assert table.get('ALM:Zone1:A1')['priority'] == 1
+    stats = table.get_stats()
+    assert stats['rows'] == 5
+    assert stats['active'] == 4
+
+
+def test_query_and_count(table):
+    assert sorted(entry['path'] for entry in table.get_active()) == ['ALM:Zone1:A1', 'ALM:Zone1:A2', 'ALM:Zone2:A1', 'ALM:Zone2:A2']
+    assert sorted(entry['path'] for entry in table.query(active=True, priority=1)) == ['ALM:Zone1:A1', 'ALM:Zone2:A1']
+    assert [entry['path'] for entry in table.query(priority=2, alarmGroup=20)] == ['ALM:Zone1:A3']
+    assert len(table.query(siteGroup=2, priority=[1, 3])) == 2
+    assert [entry['path'] for entry in table.query(path=['ALM:Zone1:A2', 'ALM:Unknown'])] == ['ALM:Zone1:A2']
+    assert table.query(priority=99) == []
+    assert len(table.query()) == 5
+    with pytest.raises(ValueError):
+        table.query(text='alarm')
+
+    assert table.count('priority') == {1: 2, 2: 2, 3: 1}
+    assert table.count('priority', active=True) == {1: 2, 2: 1, 3: 1}
+    assert table.count('state') == {standin.ALARM_STATE_ON: 4, standin.ALARM_STATE_OFF: 1}
+    assert table.count('active') == {True: 4, False: 1}
+    with pytest.raises(ValueError):
+        table.count('screen')
+
+
+def test_incremental_refresh(table, make_client):
+    writer = make_client()
+    writer.dp_set('ALM:Zone2:A3', value=True)
+    writer.dp_set('ALM:Zone1:A1', value=False)
+    assert _wait_until(lambda: 'ALM:Zone2:A3' in table and table.get('ALM:Zone1:A1')['state'] == standin.ALARM_STATE_OFF)
+    assert table.get('ALM:Zone2:A3')['state'] == standin.ALARM_STATE_ON
+    assert table.count('priority', active=True) == {1: 1, 2: 1, 3: 2}
+    stats = table.get_stats()
+    assert stats['refreshes'] >= 2
+    assert stats['events'] >= 2
+
+    # other datapoints in tree don't disturb table
+    writer.dp_set('ALM:Zone1', value=1.0, type='double')
+    time.sleep(0.2)
+    assert len(table) == 6
+
+
+def test_rename_and_delete(table, make_client):
+    writer = make_client()
+    assert writer.dp_ren('ALM:Zone2', newPath='ALM:Zone3')[0]['code'] == 'ok'
+    assert _wait_until(lambda: 'ALM:Zone3:A1' in table)
+    assert 'ALM:Zone2:A1' not in table and 'ALM:Zone2:A2' not in table
+    assert table.get('ALM:Zone3:A2')['path'] == 'ALM:Zone3:A2'
+    assert sorted(entry['path'] for entry in table.query(siteGroup=2)) == ['ALM:Zone3:A1', 'ALM:Zone3:A2']
+
+    assert writer.dp_del('ALM:Zone1', recursive=True)[0]['code'] == 'ok'
+    assert _wait_until(lambda: len(table) == 2)
+    assert table.query(siteGroup=1) == []
+    assert table.count('priority') == {1: 1, 3: 1}
+
+
+def test_older_entry_is_ignored(table):
+    entry = dict(table.get('ALM:Zone1:A1'))
+    newer_entry = dict(entry, state='acknowledged')
+    assert table.update_entry(newer_entry)
+    older_entry = dict(entry, stamp=entry['stamp'].replace(year=2000), state=standin.ALARM_STATE_OFF)
+    assert not table.update_entry(older_entry)
+    assert table.get('ALM:Zone1:A1')['state'] == 'acknowledged'
+    # states not in ALARM_INACTIVE_STATES are active
+    assert table.count('state', active=True)['acknowledged'] == 1
+    assert table.remove('ALM:Zone1:A1') is newer_entry
+    assert table.remove('ALM:Zone1:A1') is None
+    assert 'acknowledged' not in table.count('state')
@@ -0,0 +1,47 @@
+# encoding: utf-8
+"""
+changelog entries: plain dictionaries by default, compact records with connector.CHANGELOG_RECORDS
+"""
+
+import json
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+ALARM_OBJS = [{'path': 'A:B', 'stamp': '2018-01-01T00:00:00+00:00', 'text': 'alarm', 'state': 'gone',
+               'priority': '1', 'priorityBACnet': 0, 'alarmGroup': 2, 'alarmCollectGroup': 0, 'siteGroup': 3}]
+
+
+@pytest.fixture
+def records():
+    connector.CHANGELOG_RECORDS = True
+    yield
+    connector.CHANGELOG_RECORDS = False
+
+
+def test_entries_are_dictionaries():
+    entry = connector.Changelog_Alarm(ALARM_OBJS)[0]
+    assert isinstance(entry, dict)
+    assert entry['priority'] == 1
+    copied = entry.copy()
+    copied['text'] = 'changed'
+    assert entry['text'] == 'alarm'
+    assert json.loads(json.dumps(entry, default=str))['siteGroup'] == 3
+
+
+def test_entries_as_records(records):
+    entry = connector.Changelog_Alarm(ALARM_OBJS)[0]
+    assert isinstance(entry, connector.Changelog_alarm_entry)
+    assert entry.priority == entry['priority'] == 1
+    copied = entry.copy()
+    assert isinstance(copied, dict) and copied == entry.as_dict()
+    assert json.loads(json.dumps(entry.as_dict(), default=str))['state'] == 'gone'
+
+
+def test_batch_roundtrip():
+    changelog = connector.Changelog_Alarm(ALARM_OBJS * 3)
+    batch = changelog.as_batch()
+    assert len(batch) == 3
+    assert batch[0] == changelog[0]
@@ -0,0 +1,93 @@
+# encoding: utf-8
+"""
+indexed search over text of changelog entries (changelog.ChangelogTextIndex)
+"""
+
+import datetime
+
+import pytest
+
+from visitoolkit_connector import changelog
+from visitoolkit_connector import connector
+from visitoolkit_connector import standin
+
+
+PROTOCOL_OBJS = [{'path': 'MSR01:Pump1', 'stamp': '2018-01-01T00:00:00+00:00', 'text': 'Störung Pumpe Halle 1'},
+                 {'path': 'MSR01:Pump2', 'stamp': '2018-01-01T01:00:00+00:00', 'text': 'Pumpe läuft'},
+                 {'path': 'MSR01:Pump1', 'stamp': '2018-01-01T02:00:00+00:00', 'text': 'Pumpe Störung quittiert'},
+                 {'path': 'MSR02:Fan', 'stamp': '2018-01-01T03:00:00+00:00', 'text': 'pumping station halle'}]
+
+
+@pytest.fixture
+def index():
+    text_index = changelog.ChangelogTextIndex()
+    text_index.add_batch(connector.ChangelogBatch.from_json(PROTOCOL_OBJS))
+    return text_index
+
+
+def _texts(batch):
+    return batch.columns['text']
+
+
+def test_terms_and_prefixes(index):
+    assert _texts(index.search('störung')) == ['Störung Pumpe Halle 1', 'Pumpe Störung quittiert']
+    assert _texts(index.search('STÖRUNG halle')) == ['Störung Pumpe Halle 1']
+    assert len(index.search('pump*')) == 4
+    assert len(index.search('unknown')) == 0
+
+
+def test_phrases(index):
+    assert _texts(index.search('"störung pumpe"')) == ['Störung Pumpe Halle 1']
+    assert _texts(index.search('"pumpe störung"')) == ['Pumpe Störung quittiert']
+
+
+def test_timeframe_and_path(index):
+    start = datetime.datetime(2018, 1, 1, 1, 0, tzinfo=datetime.timezone.utc)
+    assert _texts(index.search(start=start, end='2018-01-01T03:00:00+00:00')) == ['Pumpe läuft', 'Pumpe Störung quittiert']
+    assert _texts(index.search('pumpe', start=start)) == ['Pumpe läuft', 'Pumpe Störung quittiert']
+    assert len(index.search(path='MSR01')) == 0
+    assert len(index.search(path='MSR01', recursive=True)) == 3
+    assert len(index.search('pump*', path='MSR01:Pump1', limit=1)) == 1
+
+
+def test_duplicates_and_out_of_order_batches(index):
+    assert index.add_batch(connector.ChangelogBatch.from_json(PROTOCOL_OBJS)) == 0
+    older = [{'path': 'MSR03', 'stamp': '2017-12-31T00:00:00+00:00', 'text': 'old entry'}]
+    assert index.add_batch(connector.ChangelogBatch.from_json(older)) == 1
+    assert _texts(index.search(end='2018-01-01T00:30:00+00:00')) == ['old entry', 'Störung Pumpe Halle 1']
+    assert index.get_stats()['entries'] == 5
+
+
+def test_index_of_store():
+    with changelog.ChangelogStore(':memory:') as store:
+        store.append(connector.ChangelogBatch.from_json(PROTOCOL_OBJS))
+        index = changelog.ChangelogTextIndex.from_store(store, path='MSR01:Pump1')
+        assert len(index.search('störung')) == 2
+        assert len(index) == 2
+
+
+def test_index_updated_by_store(server, client):
+    start = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    paths = server.test_paths[:3]
+    for idx, path in enumerate(paths):
+        client.dp_set(path, value=100.0 + idx)
+    text_index = changelog.ChangelogTextIndex()
+    with changelog.ChangelogStore(':memory:', text_index=text_index) as store:
+        store.sync_group(client, standin.CHANGELOG_GROUP, start)
+        client.dp_set(paths[0], value=200.0)
+        # same entries again from changelog of datapoint: indexed only once
+        store.sync_path(client, paths[0], start)
+        assert text_index.search('"changed to 200"').columns['path'] == [paths[0]]
+        assert len(text_index.search('changed')) == 4
+
+
+def test_prefix_after_new_tokens(index):
+    assert len(index.search('pump*')) == 4
+    newer = [{'path': 'MSR04', 'stamp': '2018-01-02T00:00:00+00:00', 'text': 'Pumpwerk aaa zzz'}]
+    index.add_batch(connector.ChangelogBatch.from_json(newer))
+    assert len(index.search('pump*')) == 5
+    assert _texts(index.search('pump* zzz')) == ['Pumpwerk aaa zzz']
+    assert _texts(index.search('a*')) == ['Pumpwerk aaa zzz']
+    assert len(index.search('z*')) == 1
+    assert len(index.search('x*')) == 0
+    assert _texts(index.search('halle st*')) == ['Störung Pumpe Halle 1', 'pumping station halle']
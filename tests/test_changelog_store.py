@@ -0,0 +1,49 @@
+# encoding: utf-8
+"""
+local changelog store (changelog.ChangelogStore)
+"""
+
+import datetime
+
+import pytest
+
+from visitoolkit_connector import changelog
+from visitoolkit_connector import connector
+from visitoolkit_connector import standin
+
+
+PROTOCOL_OBJS = [{'path': 'MSR01:Pump1', 'stamp': '2018-01-01T00:00:00+00:00', 'text': 'Störung Pumpe Halle 1'},
+                 {'path': 'MSR01:Pump2', 'stamp': '2018-01-01T01:00:00+00:00', 'text': 'Pumpe läuft'},
+                 {'path': 'MSR01:Pump1', 'stamp': '2018-01-01T02:00:00+00:00', 'text': 'Pumpe Störung quittiert'},
+                 {'path': 'MSR02:Fan', 'stamp': '2018-01-01T03:00:00+00:00', 'text': 'pumping station halle'}]
+
+
+def test_store_query():
+    with changelog.ChangelogStore(':memory:') as store:
+        assert store.append(connector.ChangelogBatch.from_json(PROTOCOL_OBJS), group='test') == 4
+        # overlapping fetches are harmless
+        assert store.append(connector.ChangelogBatch.from_json(PROTOCOL_OBJS), group='test') == 0
+        assert len(store) == 4
+        assert len(store.query(path='MSR01', recursive=True)) == 3
+        assert len(store.query(start='2018-01-01T01:00:00+00:00', end='2018-01-01T03:00:00+00:00')) == 2
+        assert len(store.query(group='other')) == 0
+        assert len(store.query(limit=1)) == 1
+        assert store.get_newest_stamp(path='MSR01:Pump1') == datetime.datetime(2018, 1, 1, 2, 0, tzinfo=datetime.timezone.utc).timestamp()
+        with pytest.raises(ValueError):
+            store.query(unknown=1)
+
+
+def test_store_sync_with_standin(server, client):
+    start = datetime.datetime.now(tz=datetime.timezone.utc) - datetime.timedelta(minutes=1)
+    paths = server.test_paths[:3]
+    for idx, path in enumerate(paths):
+        client.dp_set(path, value=100.0 + idx)
+    with changelog.ChangelogStore(':memory:') as store:
+        assert store.sync_group(client, standin.CHANGELOG_GROUP, start) == 3
+        assert store.sync_group(client, standin.CHANGELOG_GROUP, start) == 0
+        assert store.sync_path(client, paths[0], start) == 1
+        client.dp_set(paths[0], value=200.0)
+        assert store.sync_path(client, paths[0], start) == 1
+        assert len(store.query(path=paths[0])) == 3
+        assert len(store.query(group=standin.CHANGELOG_GROUP)) == 3
+        assert store.query(path=paths[0], group=changelog.STORE_NO_GROUP).columns['text'][-1] == 'value changed to 200.0'
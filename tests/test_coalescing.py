@@ -0,0 +1,25 @@
+# encoding: utf-8
+"""
+single-flight reads: concurrent identical dp_get() calls share one DMS request (DMSClient(coalesce_gets=True))
+"""
+
+import concurrent.futures
+
+
+def test_identical_reads_share_requests(server, make_client):
+    dmsclient = make_client(coalesce_gets=True)
+    path = server.test_paths[0]
+    nof_commands = server.get_stats()['nof_commands']
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(lambda _: dmsclient.dp_get(path), range(200)))
+    assert all(result[0]['path'] == path and result[0]['code'] == 'ok' for result in results)
+    nof_sent = server.get_stats()['nof_commands'] - nof_commands
+    # every call was either sent or waited for an identical one in flight
+    assert nof_sent + dmsclient._msghandler.nof_coalesced_gets == 200
+
+
+def test_different_reads_are_not_coalesced(server, make_client):
+    dmsclient = make_client(coalesce_gets=True)
+    for path in server.test_paths[:10]:
+        assert dmsclient.dp_get(path)[0]['path'] == path
+    assert dmsclient._msghandler.nof_coalesced_gets == 0
@@ -0,0 +1,91 @@
+# encoding: utf-8
+"""
+WebSocket extension "permessage-deflate" between DMSClient and stand-in DMS
+"""
+
+import pytest
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import standin
+from visitoolkit_connector import wsserver
+
+
+BIG_TEXT = 'repetitive text of a big datapoint value ' * 2000
+
+
+def _roundtrip(server, dmsclient):
+    path = server.test_paths[0]
+    responses = dmsclient.dp_set(path, value=BIG_TEXT, type='string')
+    assert responses[0]['code'] == 'ok'
+    responses = dmsclient.dp_get(path)
+    assert responses[0]['value'] == BIG_TEXT
+
+
+def test_compression_is_negotiated(make_client):
+    dmsclient = make_client(compression=True)
+    dmsclient.dp_get(path='System:Time')
+    assert dmsclient.get_compression_stats()['is_active']
+
+
+def test_compression_ratios_of_big_roundtrip(server, make_client):
+    dmsclient = make_client(compression=True)
+    _roundtrip(server, dmsclient)
+
+    stats = dmsclient.get_compression_stats()
+    assert stats['is_active']
+    assert stats['msgs_tx_compressed'] > 0
+    assert stats['msgs_rx_compressed'] > 0
+    assert stats['ratio_tx'] > 1.0
+    assert stats['ratio_rx'] > 1.0
+
+
+def test_uncompressed_client(server, client):
+    # (compression is opt-in)
+    assert client.dp_get(path='System:Time')[0]['code'] == 'ok'
+    with pytest.raises(Exception):
+        client.get_compression_stats()
+    assert not server.get_connections()[0].use_deflate
+
+
+def test_window_bits_offered_by_client(server, make_client):
+    dmsclient = make_client(compression=True, client_max_window_bits=10, server_max_window_bits=10)
+    _roundtrip(server, dmsclient)
+    conn = server.get_connections()[0]
+    assert conn.server_wbits == 10
+    assert conn.client_wbits == 10
+    assert dmsclient._deflate._client_wbits == 10
+    assert dmsclient.get_compression_stats()['msgs_rx_compressed'] > 0
+
+
+def test_server_limits_window_of_client():
+    server = standin.StandInDMS(client_max_window_bits=9)
+    server.test_paths = server.populate(10)
+    server.start()
+    dmsclient = connector.DMSClient('pytest', 'pytest', dms_port_int=server.port, compression=True)
+    try:
+        assert dmsclient.ready_to_send.wait(timeout=10)
+        # (stand-in decompresses with 512 byte window, bigger window of client would break decompression)
+        _roundtrip(server, dmsclient)
+        assert dmsclient._deflate._client_wbits == 9
+        assert server.get_connections()[0].client_wbits == 9
+        assert dmsclient.get_compression_stats()['msgs_tx_compressed'] > 0
+    finally:
+        dmsclient.close()
+        server.stop()
+
+
+def test_smallest_server_window_means_uncompressed_messages(server, make_client):
+    # (zlib doesn't support raw deflate streams with 256 byte window)
+    dmsclient = make_client(compression=True, server_max_window_bits=8)
+    _roundtrip(server, dmsclient)
+    assert server.get_connections()[0].server_wbits == 8
+    stats = dmsclient.get_compression_stats()
+    assert stats['is_active']
+    assert stats['msgs_rx_compressed'] == 0
+    assert stats['msgs_tx_compressed'] > 0
+
+
+def test_parsing_of_offer():
+    offer = wsserver._parse_deflate_offer('x-webkit-deflate-frame, permessage-deflate; client_max_window_bits; server_max_window_bits="10"')
+    assert offer == {'client_max_window_bits': None, 'server_max_window_bits': '10'}
+    assert wsserver._parse_deflate_offer('x-webkit-deflate-frame') is None
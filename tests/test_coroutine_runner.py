@@ -0,0 +1,139 @@
+# encoding: utf-8
+"""
+coroutine callbacks of SubscriptionES objects (connector._CoroutineRunner)
+"""
+
+import asyncio
+import random
+import threading
+import time
+
+from visitoolkit_connector import connector
+
+
+class _Subscription(object):
+    """ stand-in for SubscriptionES: runner only needs it's tag """
+
+    def __init__(self, tag):
+        self._tag = tag
+
+    def get_tag(self):
+        return self._tag
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_ordered_per_subscription():
+    runner = connector._CoroutineRunner(max_concurrency=4, ordered=True)
+    runner.start()
+    rand = random.Random(3)
+    results = {'A': [], 'B': [], 'C': []}
+
+    async def handler(tag, idx):
+        await asyncio.sleep(rand.uniform(0.0, 0.01))
+        results[tag].append(idx)
+
+    try:
+        for idx in range(20):
+            for tag in results:
+                runner.schedule(_Subscription(tag), handler, handler(tag, idx))
+        assert _wait_until(lambda: all(len(values) == 20 for values in results.values()))
+    finally:
+        runner.stop()
+    for values in results.values():
+        assert values == list(range(20))
+
+
+def test_concurrency_limit():
+    runner = connector._CoroutineRunner(max_concurrency=3, ordered=False)
+    runner.start()
+    lock = threading.Lock()
+    counters = {'running': 0, 'max_running': 0, 'done': 0}
+
+    async def handler():
+        with lock:
+            counters['running'] += 1
+            counters['max_running'] = max(counters['max_running'], counters['running'])
+        await asyncio.sleep(0.02)
+        with lock:
+            counters['running'] -= 1
+            counters['done'] += 1
+
+    try:
+        sub = _Subscription('A')
+        for _ in range(15):
+            runner.schedule(sub, handler, handler())
+        assert _wait_until(lambda: counters['done'] == 15)
+    finally:
+        runner.stop()
+    assert counters['max_running'] == 3
+
+
+def test_limit_applies_across_ordered_subscriptions():
+    runner = connector._CoroutineRunner(max_concurrency=2, ordered=True)
+    runner.start()
+    counters = {'running': 0, 'max_running': 0, 'done': 0}
+
+    async def handler():
+        # (all coroutines run in the same eventloop thread, no lock needed)
+        counters['running'] += 1
+        counters['max_running'] = max(counters['max_running'], counters['running'])
+        await asyncio.sleep(0.02)
+        counters['running'] -= 1
+        counters['done'] += 1
+
+    try:
+        for idx in range(12):
+            runner.schedule(_Subscription('sub' + str(idx % 6)), handler, handler())
+        assert _wait_until(lambda: counters['done'] == 12)
+    finally:
+        runner.stop()
+    assert counters['max_running'] == 2
+
+
+def test_failing_coroutine_is_counted():
+    runner = connector._CoroutineRunner(max_concurrency=1, ordered=True)
+    runner.start()
+    values = []
+
+    async def failing():
+        raise ValueError('callback failed')
+
+    async def handler():
+        values.append(True)
+
+    try:
+        sub = _Subscription('A')
+        runner.schedule(sub, failing, failing())
+        runner.schedule(sub, handler, handler())
+        assert _wait_until(lambda: values)
+    finally:
+        runner.stop()
+    assert runner.nof_failed == 1
+    assert runner.nof_scheduled == 2
+
+
+def test_coroutine_callback_of_subscription(server, make_client):
+    dmsclient = make_client(async_concurrency=2, async_ordered=True)
+    path = server.test_paths[0]
+    values = []
+    done = threading.Event()
+
+    async def on_event(event):
+        await asyncio.sleep(0.001)
+        values.append(event['value'])
+        if event['value'] == 109.0:
+            done.set()
+
+    subES = dmsclient.get_dp_subscription(path, event=connector.ON_CHANGE)
+    subES += on_event
+    writer = make_client()
+    for idx in range(10):
+        writer.dp_set(path, value=100.0 + idx)
+    assert done.wait(timeout=5)
+    assert values == [100.0 + idx for idx in range(10)]
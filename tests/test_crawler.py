@@ -0,0 +1,55 @@
+# encoding: utf-8
+"""
+breadth-first crawler of datapoint trees (visitoolkit_connector.crawler)
+"""
+
+import json
+
+from visitoolkit_connector import crawler
+
+
+def _all_paths(dmsclient, root):
+    return sorted(response['path'] for response in crawler.TreeCrawler(dmsclient, root=root, depth=1, batch=7).crawl())
+
+
+def test_crawl_delivers_every_node_once(server, client):
+    paths = _all_paths(client, 'SIM')
+    assert len(paths) == len(set(paths))
+    assert set(server.test_paths) <= set(paths)
+    assert paths[0] == 'SIM'
+    # same result with other depth, batch and concurrency
+    tree_crawler = crawler.TreeCrawler(client, root='SIM', depth=3, batch=2, concurrency=2)
+    assert sorted(response['path'] for response in tree_crawler.crawl()) == paths
+    assert tree_crawler.is_done()
+    stats = tree_crawler.get_stats()
+    assert stats['nodes'] == len(paths)
+    assert stats['errors'] == 0
+
+
+def test_crawl_resumes_from_checkpoint(tmp_path, server, client):
+    checkpoint = str(tmp_path / 'crawl.json')
+    expected = _all_paths(client, 'SIM')
+
+    first = crawler.TreeCrawler(client, root='SIM', depth=1, batch=3, concurrency=2, checkpoint=checkpoint)
+    seen = set()
+    for response in first.crawl():
+        seen.add(response['path'])
+        if len(seen) >= 40:
+            first.stop()
+    assert not first.is_done()
+    with open(checkpoint) as f:
+        assert json.load(f)['frontier']
+
+    second = crawler.TreeCrawler(client, root='SIM', depth=1, batch=3, concurrency=2, checkpoint=checkpoint)
+    for response in second.crawl():
+        seen.add(response['path'])
+    assert second.get_stats()['resumed']
+    assert second.is_done()
+    assert sorted(seen) == expected
+
+
+def test_unknown_root_is_reported_as_failed(server, client):
+    tree_crawler = crawler.TreeCrawler(client, root='UNKNOWN', retries=2)
+    assert list(tree_crawler.crawl()) == []
+    assert tree_crawler.failed_paths == ['UNKNOWN']
+    assert tree_crawler.get_stats()['errors'] == 2
@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""
+decoding of received frames in websocket thread, background thread or worker processes (parameter "decode_mode" of DMSClient)
+"""
+
+import threading
+import pytest
+
+from visitoolkit_connector import connector
+
+NOF_VALUES = 30
+
+
+class _Collector(object):
+    """ callback of SubscriptionES: remembering values of DMS-events """
+
+    def __init__(self, expected):
+        self.values = []
+        self._expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, event):
+        self.values.append(event['value'])
+        if event['value'] == self._expected:
+            self.done.set()
+
+
+@pytest.fixture(params=[connector.DECODE_INLINE, connector.DECODE_THREAD, connector.DECODE_PROCESS])
+def decode_mode(request, monkeypatch):
+    if request.param == connector.DECODE_PROCESS:
+        # every frame is decoded in a worker process
+        monkeypatch.setattr(connector, 'DECODE_PROCESS_MINSIZE', 0)
+    return request.param
+
+
+def test_events_in_order_per_subscription(server, make_client, decode_mode):
+    dmsclient = make_client(decode_mode=decode_mode, decode_processes=3)
+    paths = server.test_paths[:3]
+    collectors = {}
+    for path in paths:
+        collectors[path] = _Collector(expected=1000.0 + NOF_VALUES - 1)
+        subES = dmsclient.get_dp_subscription(path, event=connector.ON_CHANGE)
+        subES += collectors[path]
+
+    # responses are decoded the same way
+    assert dmsclient.dp_get(paths[0])[0]['code'] == 'ok'
+
+    writer = make_client()
+    for idx in range(NOF_VALUES):
+        for path in paths:
+            writer.dp_set(path, value=1000.0 + idx)
+    for path in paths:
+        assert collectors[path].done.wait(timeout=10)
+        assert collectors[path].values == [1000.0 + idx for idx in range(NOF_VALUES)]
+
+
+@pytest.mark.parametrize('decode_mode', [connector.DECODE_THREAD, connector.DECODE_PROCESS])
+def test_decoder_exits_on_close(server, make_client, decode_mode):
+    dmsclient = make_client(decode_mode=decode_mode)
+    decoder_thread = dmsclient._decoder_thread
+    assert decoder_thread.is_alive()
+    dmsclient.close()
+    decoder_thread.join(timeout=5)
+    assert not decoder_thread.is_alive()
+    if decoder_thread._deliverer:
+        decoder_thread._deliverer.join(timeout=5)
+        assert not decoder_thread._deliverer.is_alive()
+
+
+def test_default_is_inline(client):
+    assert client._decode_mode == connector.DECODE_INLINE
+    assert client._decoder_thread is None
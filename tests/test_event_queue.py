@@ -0,0 +1,103 @@
+# encoding: utf-8
+"""
+bounded queue of DMS-events with overflow policies (DMSClient(event_queue_size=..., overflow_policy=...))
+"""
+
+import collections
+import queue
+import threading
+import time
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+_Event = collections.namedtuple('_Event', ['path', 'value'])
+
+
+class _Subscription(object):
+    """ stand-in for SubscriptionES: queue only needs it's tag """
+
+    def get_tag(self):
+        return 'sub'
+
+
+SUB = _Subscription()
+
+
+def _drain(event_queue):
+    result = []
+    while True:
+        try:
+            result.append(event_queue.get(block=False)[1].value)
+        except queue.Empty:
+            return result
+
+
+def test_unbounded_queue_keeps_everything():
+    event_queue = connector._EventQueue()
+    for idx in range(100):
+        event_queue.put((SUB, _Event('A', idx)))
+    assert _drain(event_queue) == list(range(100))
+
+
+@pytest.mark.parametrize('policy, expected, counter', [(connector.OVERFLOW_DROP_OLDEST, [2, 3, 4], 'dropped_oldest'),
+                                                        (connector.OVERFLOW_DROP_NEWEST, [0, 1, 2], 'dropped_newest')])
+def test_dropping(policy, expected, counter):
+    dropped = []
+    event_queue = connector._EventQueue(maxsize=3, overflow_policy=policy,
+                                        on_overflow=lambda policy, item: dropped.append(item[1].value))
+    for idx in range(5):
+        event_queue.put((SUB, _Event('A', idx)))
+    assert _drain(event_queue) == expected
+    assert sorted(dropped) == sorted(set(range(5)) - set(expected))
+    assert event_queue.get_stats()[counter] == 2
+
+
+def test_conflation_keeps_position_of_datapoint():
+    event_queue = connector._EventQueue(maxsize=2, overflow_policy=connector.OVERFLOW_CONFLATE)
+    event_queue.put((SUB, _Event('A', 1)))
+    event_queue.put((SUB, _Event('B', 1)))
+    event_queue.put((SUB, _Event('A', 2)))
+    event_queue.put((SUB, _Event('C', 1)))
+    # "A" was replaced in place, then oldest ("A") was dropped for new datapoint "C"
+    assert [(item[1].path, item[1].value) for item in (event_queue.get(), event_queue.get())] == [('B', 1), ('C', 1)]
+    stats = event_queue.get_stats()
+    assert stats['conflated'] == 1
+    assert stats['dropped_oldest'] == 1
+
+
+def test_stop_wakes_blocked_put():
+    event_queue = connector._EventQueue(maxsize=1, overflow_policy=connector.OVERFLOW_BLOCK)
+    event_queue.put((SUB, _Event('A', 0)))
+    results = []
+    producer = threading.Thread(target=lambda: results.append(event_queue.put((SUB, _Event('A', 1)))))
+    producer.start()
+    time.sleep(0.2)
+    # producer waits for free space
+    assert producer.is_alive()
+    event_queue.stop()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
+    assert results == [False]
+    # after stop every event gets dropped
+    assert not event_queue.put((SUB, _Event('B', 2)))
+    stats = event_queue.get_stats()
+    assert stats['blocked'] == 1
+    assert stats['dropped_stopped'] == 2
+    assert _drain(event_queue) == [0]
+
+
+def test_closing_client_releases_blocked_put(server, make_client):
+    dmsclient = make_client(event_queue_size=1, overflow_policy=connector.OVERFLOW_BLOCK)
+    event_queue = dmsclient._subAE_queue
+    # dispatcher doesn't take events anymore, queue gets full
+    dmsclient._subES_disp_thread.keep_running = False
+    dmsclient._subES_disp_thread.join(timeout=5)
+    event_queue.put((SUB, _Event('A', 0)))
+    producer = threading.Thread(target=event_queue.put, args=((SUB, _Event('A', 1)),))
+    producer.start()
+    dmsclient.close()
+    producer.join(timeout=5)
+    assert not producer.is_alive()
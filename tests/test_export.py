@@ -0,0 +1,91 @@
+# encoding: utf-8
+"""
+streaming export of trend data (visitoolkit_connector.export) against stand-in DMS
+"""
+
+import csv
+import datetime
+import math
+
+import pytest
+
+from visitoolkit_connector import export
+from visitoolkit_connector import standin
+
+
+def _timeframe(nof_trendpoints):
+    # start and end exactly on synthetic trendpoints (one every TREND_INTERVAL seconds)
+    now_secs = math.floor(datetime.datetime.now().timestamp() / standin.TREND_INTERVAL) * standin.TREND_INTERVAL
+    end = datetime.datetime.fromtimestamp(now_secs - standin.TREND_INTERVAL, tz=datetime.timezone.utc)
+    start = end - datetime.timedelta(seconds=(nof_trendpoints - 1) * standin.TREND_INTERVAL)
+    return start, end
+
+
+def test_windows_dont_duplicate_boundary_trendpoints(server, client):
+    start, end = _timeframe(60)
+    paths = server.test_paths[:3]
+    whole = list(export.TrendExporter(client, paths, start, end).iter_rows())
+    # boundaries of windows are exactly on trendpoints
+    windowed = list(export.TrendExporter(client, paths, start, end,
+                                         window=datetime.timedelta(seconds=7 * standin.TREND_INTERVAL)).iter_rows())
+    assert len(whole) == 3 * 60
+    assert windowed == whole
+    assert len(set((row[0], row[1]) for row in windowed)) == len(windowed)
+
+
+def test_csv(tmp_path, server, client):
+    start, end = _timeframe(10)
+    filename = str(tmp_path / 'trend.csv')
+    exporter = export.TrendExporter(client, server.test_paths[:2], start, end, format='detail', batch_size=7)
+    assert exporter.export(filename) == 20
+    with open(filename, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows[0] == ['path', 'stamp', 'value', 'state', 'rec']
+    assert len(rows) == 21
+    assert rows[1][0] == server.test_paths[0]
+    assert datetime.datetime.fromisoformat(rows[1][1]) == start
+
+
+def test_batches(server, client):
+    start, end = _timeframe(10)
+    batches = list(export.TrendExporter(client, server.test_paths[:3], start, end, batch_size=4).iter_batches())
+    assert [len(batch['value']) for batch in batches] == [4] * 7 + [2]
+    assert sorted(batches[0]) == ['path', 'stamp', 'value']
+
+
+@pytest.mark.parametrize('extension', ['.arrow', '.parquet'])
+def test_arrow_formats(tmp_path, server, client, extension):
+    pyarrow = pytest.importorskip('pyarrow')
+    import pyarrow.ipc
+    import pyarrow.parquet
+    start, end = _timeframe(10)
+    filename = str(tmp_path / ('trend' + extension))
+    exporter = export.TrendExporter(client, server.test_paths[:2], start, end, batch_size=3)
+    assert exporter.export(filename) == 20
+    if extension == '.arrow':
+        table = pyarrow.ipc.open_file(filename).read_all()
+    else:
+        table = pyarrow.parquet.read_table(filename)
+    assert table.num_rows == 20
+    assert table.column_names == ['path', 'stamp', 'value']
+    assert table.column('path')[0].as_py() == server.test_paths[0]
+
+
+def test_without_pyarrow(tmp_path, monkeypatch, server, client):
+    monkeypatch.setattr(export, 'pyarrow', None)
+    start, end = _timeframe(10)
+    exporter = export.TrendExporter(client, server.test_paths[:1], start, end)
+    for method in (exporter.to_arrow, exporter.to_parquet, exporter.export):
+        with pytest.raises(ImportError):
+            method(str(tmp_path / 'trend.parquet'))
+    assert not list(tmp_path.iterdir())
+
+
+def test_errors_of_last_export(server, client):
+    start, end = _timeframe(10)
+    exporter = export.TrendExporter(client, [server.test_paths[0], 'UNKNOWN:PATH'], start, end)
+    assert len(list(exporter.iter_rows())) == 10
+    assert [path for path, _ in exporter.errors] == ['UNKNOWN:PATH']
+    exporter.paths = server.test_paths[:1]
+    list(exporter.iter_rows())
+    assert exporter.errors == []
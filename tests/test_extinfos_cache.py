@@ -0,0 +1,50 @@
+# encoding: utf-8
+"""
+client-side cache of static extended infos (DMSClient(extinfos_cache_ttl=...))
+"""
+
+from visitoolkit_connector import connector
+
+
+def _as_tuples(responses):
+    return sorted((response['path'], tuple(sorted(response['extInfos'].as_dict().items()))) for response in responses)
+
+
+def test_single_datapoint_uses_cache(server, make_client):
+    dmsclient = make_client(extinfos_cache_ttl=60)
+    path = server.test_paths[0]
+    first = dmsclient.dp_get(path, showExtInfos=connector.INFO_UNIT | connector.INFO_STATE)
+    second = dmsclient.dp_get(path, showExtInfos=connector.INFO_UNIT | connector.INFO_STATE)
+    assert first[0]['extInfos']['unit'] == second[0]['extInfos']['unit'] == 'degC'
+    assert second[0]['extInfos']['state'] == 'ok'
+    assert dmsclient.get_extinfos_cache_stats()['hits'] == 1
+
+
+def test_query_fetches_static_fields_only_for_missing_paths(server, make_client):
+    plain_client = make_client()
+    dmsclient = make_client(extinfos_cache_ttl=60)
+    query = connector.Query(maxDepth=-1)
+    expected = _as_tuples(plain_client.dp_get('SIM', query=query, showExtInfos=connector.INFO_ALL))
+
+    nof_commands = server.get_stats()['nof_commands']
+    first = dmsclient.dp_get('SIM', query=query, showExtInfos=connector.INFO_ALL)
+    # cold cache: query and one "get" per path
+    assert server.get_stats()['nof_commands'] - nof_commands == 1 + len(first)
+    assert _as_tuples(first) == expected
+
+    nof_commands = server.get_stats()['nof_commands']
+    second = dmsclient.dp_get('SIM', query=query, showExtInfos=connector.INFO_ALL)
+    # warm cache: only the query
+    assert server.get_stats()['nof_commands'] - nof_commands == 1
+    assert _as_tuples(second) == expected
+
+
+def test_query_with_partially_cached_paths(server, make_client):
+    dmsclient = make_client(extinfos_cache_ttl=60)
+    dmsclient.dp_get(server.test_paths[0], showExtInfos=connector.INFO_ALL)
+    nof_commands = server.get_stats()['nof_commands']
+    responses = dmsclient.dp_get('SIM', query=connector.Query(maxDepth=-1), showExtInfos=connector.INFO_UNIT)
+    assert server.get_stats()['nof_commands'] - nof_commands == 1 + len(responses) - 1
+    by_path = {response['path']: response for response in responses}
+    assert by_path[server.test_paths[0]]['extInfos']['unit'] == 'degC'
+    assert by_path[server.test_paths[0]]['extInfos']['state'] is None
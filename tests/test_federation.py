@@ -0,0 +1,77 @@
+# encoding: utf-8
+"""
+fan-out of FederatedDMSClient over several stand-in DMS
+"""
+
+import socket
+import time
+
+import pytest
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import federation
+from visitoolkit_connector import standin
+
+
+class _SlowClient(object):
+    """ client object answering dp_get() after a fixed delay """
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    def dp_get(self, path, timeout=None, **kwargs):
+        time.sleep(self.delay)
+        return [{'code': 'ok', 'path': path}]
+
+
+@pytest.fixture
+def second_server():
+    srv = standin.StandInDMS()
+    srv.populate(10, prefix='OTHER')
+    srv.start()
+    yield srv
+    srv.stop()
+
+
+def test_fanout_over_added_hosts(server, second_server, make_client):
+    fed = federation.FederatedDMSClient({'a': make_client()}, 'pytest', 'pytest', timeout=10)
+    fed.add_host('b', make_client(port=second_server.port))
+    results = fed.dp_get('System:Time')
+    assert sorted(results) == ['a', 'b']
+    assert all(result.error is None for result in results.values())
+
+
+def test_pool_grows_with_added_hosts():
+    fed = federation.FederatedDMSClient({}, 'pytest', 'pytest', timeout=5)
+    for idx in range(6):
+        fed.add_host('slow' + str(idx), _SlowClient(0.5))
+    time_begin = time.time()
+    results = fed.dp_get('X')
+    # all hosts in parallel, not one after another
+    assert time.time() - time_begin < 2.0
+    assert all(result.error is None for result in results.values())
+
+
+def test_deadline_counts_from_start_of_request():
+    # one worker: second host waits in queue longer than it's timeout, but it's own request is fast enough
+    fed = federation.FederatedDMSClient({'a': _SlowClient(0.6), 'b': _SlowClient(0.6)}, 'pytest', 'pytest',
+                                        timeout=1.0, max_workers=1)
+    results = fed.dp_get('X')
+    assert results['a'].error is None
+    assert results['b'].error is None
+
+
+def test_unreachable_host_respects_timeout():
+    # free port without listener
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    fed = federation.FederatedDMSClient({'dead': ('127.0.0.1', port)}, 'pytest', 'pytest', timeout=1.0)
+    try:
+        time_begin = time.time()
+        results = fed.dp_get('System:Time')
+        assert results['dead'].error is not None
+        assert time.time() - time_begin < 5.0
+    finally:
+        fed.close()
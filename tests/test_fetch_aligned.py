@@ -0,0 +1,99 @@
+# encoding: utf-8
+"""
+trend data of many datapoints on a common timeline (DMSClient.fetch_aligned()),
+NumPy and pure Python give same results
+"""
+
+import datetime
+import math
+import random
+
+import pytest
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import standin
+
+
+TZINFO = datetime.timezone.utc
+
+
+def _grid_range(nof_steps, offset_secs=30):
+    # grid between two synthetic trendpoints (stand-in DMS writes one every TREND_INTERVAL seconds)
+    now_secs = math.floor(datetime.datetime.now().timestamp() / standin.TREND_INTERVAL) * standin.TREND_INTERVAL
+    start_secs = now_secs - (nof_steps + 1) * standin.TREND_INTERVAL + offset_secs
+    start = datetime.datetime.fromtimestamp(start_secs, tz=TZINFO)
+    end = start + datetime.timedelta(seconds=nof_steps * standin.TREND_INTERVAL)
+    return start, end
+
+
+def _random_trend(nof_points, seed=2):
+    # irregular trendpoints with some values which aren't numbers
+    rand = random.Random(seed)
+    secs = 1500000000.0
+    trendpoints = []
+    for _ in range(nof_points):
+        secs += rand.uniform(0.5, 120.0)
+        value = rand.choice([round(rand.uniform(-50.0, 50.0), 3), rand.randint(0, 10), 'text', None])
+        trendpoints.append(connector.Trendpoint_tuple(datetime.datetime.fromtimestamp(secs, tz=TZINFO), value))
+    return trendpoints
+
+
+def _assert_same(first, second):
+    assert len(first) == len(second)
+    for row_a, row_b in zip(first, second):
+        for val_a, val_b in zip(row_a, row_b):
+            if math.isnan(val_a):
+                assert math.isnan(val_b)
+            else:
+                assert val_a == pytest.approx(val_b, rel=1e-9, abs=1e-9)
+
+
+@pytest.mark.parametrize('fill', [connector.ALIGN_FILL_FFILL, connector.ALIGN_FILL_LINEAR, connector.ALIGN_FILL_NONE])
+def test_first_grid_point_is_seeded_by_trend_before_start(server, client, fill):
+    start, end = _grid_range(10)
+    aligned = client.fetch_aligned(server.test_paths[:3], start, end, standin.TREND_INTERVAL, fill=fill)
+    assert not aligned.errors
+    assert len(aligned) == 11
+    for path in aligned.paths:
+        assert not any(math.isnan(val) for val in aligned.column(path))
+
+
+def test_without_lookback_leading_grid_point_is_nan(server, client):
+    start, end = _grid_range(10)
+    aligned = client.fetch_aligned(server.test_paths[:1], start, end, standin.TREND_INTERVAL, lookback=0)
+    column = list(aligned.column(server.test_paths[0]))
+    assert math.isnan(column[0])
+    assert not any(math.isnan(val) for val in column[1:])
+
+
+@pytest.mark.parametrize('fill', [connector.ALIGN_FILL_FFILL, connector.ALIGN_FILL_LINEAR, connector.ALIGN_FILL_NONE])
+def test_resampling_parity(fill):
+    numpy = pytest.importorskip('numpy')
+    stamps, values = connector._trend_as_arrays(_random_trend(500))
+    step_secs = 45.0
+    # grid begins before first trendpoint and ends after last one
+    grid = [stamps[0] - 100.0 + idx * step_secs for idx in range(int((stamps[-1] - stamps[0] + 200.0) / step_secs))]
+    with_numpy = connector._resample_numpy(stamps, values, numpy.asarray(grid), step_secs, fill)
+    pure_python = connector._resample_python(stamps, values, grid, step_secs, fill)
+    _assert_same([with_numpy.tolist()], [pure_python])
+    assert math.isnan(pure_python[0])
+
+
+@pytest.mark.parametrize('fill', [connector.ALIGN_FILL_FFILL, connector.ALIGN_FILL_LINEAR, connector.ALIGN_FILL_NONE])
+def test_fetch_aligned_parity(server, client, monkeypatch, fill):
+    numpy = pytest.importorskip('numpy')
+    now = datetime.datetime.now(tz=TZINFO)
+    start = now - datetime.timedelta(hours=2, seconds=17)
+    end = now - datetime.timedelta(minutes=5)
+    paths = server.test_paths[:4]
+    # (grid is finer than synthetic trend data, every fill method has to interpolate)
+    assert standin.TREND_INTERVAL > 25
+    with_numpy = client.fetch_aligned(paths, start, end, 25, fill=fill)
+    assert isinstance(with_numpy.values, numpy.ndarray)
+    monkeypatch.setattr(connector, 'numpy', None)
+    pure_python = client.fetch_aligned(paths, start, end, 25, fill=fill)
+    assert isinstance(pure_python.values, list)
+    assert list(with_numpy.stamps) == pytest.approx(pure_python.stamps)
+    _assert_same(with_numpy.values.tolist(), pure_python.values)
+    assert pure_python.as_dict().keys() == with_numpy.as_dict().keys()
+    assert len(pure_python) == int((end - start).total_seconds() // 25) + 1
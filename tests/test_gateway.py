@@ -0,0 +1,96 @@
+# encoding: utf-8
+"""
+local multiplexing gateway (visitoolkit_connector.gateway)
+"""
+
+import json
+import threading
+
+import pytest
+import websocket
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import gateway
+
+
+class _Collector(object):
+    """ callback of SubscriptionES: remembering values of DMS-events """
+
+    def __init__(self, expected):
+        self.values = []
+        self._expected = expected
+        self.done = threading.Event()
+
+    def __call__(self, event):
+        self.values.append(event['value'])
+        if event['value'] == self._expected:
+            self.done.set()
+
+
+@pytest.fixture
+def gw(server):
+    """ gateway connected to stand-in DMS """
+    dms_gateway = gateway.DMSGateway(dms_port_int=server.port).start()
+    assert dms_gateway.dmsclient.ready_to_send.wait(timeout=10)
+    yield dms_gateway
+    dms_gateway.stop()
+
+
+def test_requests_are_routed_with_original_tags(server, gw, make_client):
+    local_clients = [make_client(port=gw.port) for _ in range(3)]
+    for idx, dmsclient in enumerate(local_clients):
+        path = server.test_paths[idx]
+        assert dmsclient.dp_set(path, value=float(idx))[0]['code'] == 'ok'
+        assert dmsclient.dp_get(path)[0]['value'] == float(idx)
+        responses = dmsclient.dp_get_multi([(path, {}), (server.test_paths[10], {})])
+        assert [response['path'] for response in responses[0] + responses[1]] == [path, server.test_paths[10]]
+    assert gw.get_stats()['pending_requests'] == 0
+
+
+def test_identical_subscriptions_share_one_upstream_subscription(server, gw, make_client):
+    path = server.test_paths[0]
+    collectors = []
+    for _ in range(3):
+        collector = _Collector(expected=12.5)
+        subES = make_client(port=gw.port).get_dp_subscription(path, event=connector.ON_CHANGE)
+        subES += collector
+        collectors.append(collector)
+    stats = gw.get_stats()
+    assert stats['upstream_subscriptions'] == 1
+    assert stats['local_subscriptions'] == 3
+    assert stats['collapsed_subscriptions'] == 2
+
+    make_client().dp_set(path, value=12.5)
+    for collector in collectors:
+        assert collector.done.wait(timeout=5)
+
+
+def test_mixed_frame_reaches_own_client(server, gw, make_client):
+    # DMS sends events of gateway subscription and of own subscription in the same frame
+    path = server.test_paths[0]
+    own_collector = _Collector(expected=7.0)
+    own_subES = gw.dmsclient.get_dp_subscription(path, event=connector.ON_CHANGE)
+    own_subES += own_collector
+    local_collector = _Collector(expected=7.0)
+    local_subES = make_client(port=gw.port).get_dp_subscription(path, event=connector.ON_CHANGE)
+    local_subES += local_collector
+
+    make_client().dp_set(path, value=7.0)
+    assert local_collector.done.wait(timeout=5)
+    assert own_collector.done.wait(timeout=5)
+    assert own_collector.values == [7.0]
+
+
+@pytest.mark.parametrize('frame', ['not json', '[1, 2]'])
+def test_malformed_frame_gets_error_frame(server, gw, make_client, frame):
+    ws = websocket.create_connection('ws://127.0.0.1:' + str(gw.port) + '/', timeout=5)
+    try:
+        ws.send(frame)
+        response = json.loads(ws.recv())
+    finally:
+        ws.close()
+    assert response['code'] == connector._Response.CODE_ERROR
+    assert gw.get_stats()['malformed_frames'] == 1
+    # gateway keeps serving other local clients
+    path = server.test_paths[0]
+    assert make_client(port=gw.port).dp_get(path)[0]['code'] == 'ok'
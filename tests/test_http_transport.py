@@ -0,0 +1,79 @@
+# encoding: utf-8
+"""
+retry behaviour of HTTP transport when server drops a keep-alive connection
+"""
+
+import http.client
+import http.server
+import json
+import threading
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+class _DroppingHandler(http.server.BaseHTTPRequestHandler):
+    """ answers first request of every connection, drops connection after receiving the second one """
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.received.append(json.loads(body))
+        self.nof_requests = getattr(self, 'nof_requests', 0) + 1
+        if self.nof_requests > 1:
+            # request was received (and maybe executed), then connection is lost
+            self.close_connection = True
+            return
+        data = b'{}'
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def dropping_server():
+    srv = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _DroppingHandler)
+    srv.received = []
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def _transport(server):
+    return connector._HttpTransport(host='127.0.0.1', port=server.server_address[1], basepath=connector.DMS_BASEPATH,
+                                    on_frame=lambda msg: None, pool_size=1, timeout=5)
+
+
+def test_read_only_request_is_retried(dropping_server):
+    transport = _transport(dropping_server)
+    transport.send('{"get": []}', read_only=True)
+    transport.send('{"get": []}', read_only=True)
+    assert len(dropping_server.received) == 3
+    assert transport.get_stats()['nof_retries'] == 1
+
+
+def test_writing_request_is_not_repeated(dropping_server):
+    transport = _transport(dropping_server)
+    transport.send('{"get": []}', read_only=True)
+    with pytest.raises((ConnectionError, http.client.HTTPException)):
+        transport.send('{"set": []}', read_only=False)
+    # server got "set" exactly once
+    assert [frame for frame in dropping_server.received if 'set' in frame] == [{'set': []}]
+    assert transport.get_stats()['nof_retries'] == 0
+
+
+def test_request_read_only_flag():
+    req = connector._Request(whois='a', user='b')
+    assert req.is_read_only()
+    req._cmd_dict['get'] = []
+    assert req.is_read_only()
+    req._cmd_dict['set'] = []
+    assert not req.is_read_only()
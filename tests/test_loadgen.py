@@ -0,0 +1,26 @@
+# encoding: utf-8
+"""
+load generator console script (visitoolkit_connector.loadgen)
+"""
+
+import json
+
+import pytest
+
+from visitoolkit_connector import loadgen
+
+
+def test_parse_mix():
+    assert loadgen.parse_mix('get=3,set=1') == {'get': 3.0, 'set': 1.0}
+    with pytest.raises(ValueError):
+        loadgen.parse_mix('unknown=1')
+
+
+def test_smoke_against_standin(tmp_path):
+    filename = tmp_path / 'report.json'
+    assert loadgen.main(['--standin', '100', '--duration', '1', '--output', str(filename)]) == 0
+    report = json.loads(filename.read_text())
+    assert report['server'] == 'stand-in'
+    assert report['config']['datapoints'] == 100
+    assert report['total']['operations'] > 0
+    assert report['total']['errors'] == 0
@@ -0,0 +1,104 @@
+# encoding: utf-8
+"""
+table of in-flight requests with expiry, cancellation and leak protection (connector._PendingResponseTable)
+"""
+
+import threading
+import time
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+def test_response_wakes_waiter():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1')
+    threading.Timer(0.05, table.set_response, args=('t1', ['response'])).start()
+    assert table.wait('t1', timeout=5) == ['response']
+    assert len(table) == 0
+
+
+def test_expired_request_is_removed():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1', timeout=0.05)
+    table.register('t2', timeout=60)
+    sweeper = connector._PendingSweeper(table, interval=0.02)
+    sweeper.start()
+    try:
+        deadline = time.time() + 5
+        while 't1' in table and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        sweeper.stop()
+    assert 't1' not in table
+    assert 't2' in table
+    assert table.get_stats()['expired'] == 1
+
+
+def test_waiting_request_is_not_swept():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1', timeout=0.01)
+    result = []
+    waiter = threading.Thread(target=lambda: result.append(table.wait('t1', timeout=5)))
+    waiter.start()
+    time.sleep(0.1)
+    assert table.sweep() == 0
+    table.set_response('t1', ['response'])
+    waiter.join()
+    assert result == [['response']]
+
+
+def test_cancelled_request_wakes_waiter_with_error():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1')
+    errors = []
+
+    def wait():
+        try:
+            table.wait('t1', timeout=10)
+        except Exception as ex:
+            errors.append(ex)
+
+    waiter = threading.Thread(target=wait)
+    time_begin = time.time()
+    waiter.start()
+    time.sleep(0.05)
+    assert table.cancel('t1')
+    waiter.join(timeout=5)
+    assert time.time() - time_begin < 5
+    assert len(errors) == 1 and 'cancelled' in str(errors[0])
+    assert not table.cancel('t1')
+    assert table.get_stats()['cancelled'] == 1
+
+
+def test_late_response_to_swept_tag_is_dropped():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1', timeout=0.0)
+    time.sleep(0.01)
+    assert table.sweep() == 1
+    assert not table.set_response('t1', ['late response'])
+    assert not table.set_response('unknown', ['orphaned response'])
+    stats = table.get_stats()
+    assert stats['late_responses'] == 1
+    assert stats['orphaned_responses'] == 1
+    assert stats['pending'] == 0
+    with pytest.raises(Exception):
+        table.wait('t1', timeout=1)
+
+
+def test_timeout_of_waiter():
+    table = connector._PendingResponseTable(default_timeout=connector.REQ_TIMEOUT)
+    table.register('t1')
+    with pytest.raises(Exception):
+        table.wait('t1', timeout=0.05)
+    assert len(table) == 0
+    assert not table.set_response('t1', ['late response'])
+    assert table.get_stats()['timeouts'] == 1
+
+
+def test_no_leaks_with_standin(server, client):
+    for path in server.test_paths[:20]:
+        client.dp_get(path)
+    client.dp_get_multi([(path, {}) for path in server.test_paths[:20]])
+    assert len(client._msghandler._pending_responses) == 0
@@ -0,0 +1,187 @@
+# encoding: utf-8
+"""
+operators between DMS-events and callbacks (connector.EventPipeline, SubscriptionES.pipeline())
+"""
+
+import threading
+import time
+
+from visitoolkit_connector import connector
+
+
+class _Output(object):
+    """ emit() of EventPipeline: remembering all passed items """
+
+    def __init__(self):
+        self.items = []
+
+    def __call__(self, subES, item):
+        self.items.append(item)
+
+
+def _pipeline():
+    output = _Output()
+    return connector.EventPipeline(subES=None, emit=output), output
+
+
+def _wait_until(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_filter_and_map():
+    pipeline, output = _pipeline()
+    pipeline.filter(lambda item: item % 2 == 0).map(lambda item: item * 10)
+    for idx in range(6):
+        pipeline.push(idx)
+    assert output.items == [0, 20, 40]
+    stats = pipeline.get_stats()
+    assert stats['in'] == 6 and stats['out'] == 3
+    assert stats['operators'] == ['FilterStage()', 'MapStage()']
+
+
+def test_deadband():
+    pipeline, output = _pipeline()
+    pipeline.deadband(1.0)
+    for value in (10.0, 10.5, 11.0, 11.5, 9.9, 'text', 'text', None):
+        pipeline.push({'value': value})
+    assert [item['value'] for item in output.items] == [10.0, 11.0, 9.9, 'text', None]
+
+
+def test_relative_deadband():
+    pipeline, output = _pipeline()
+    pipeline.deadband(0.1, relative=True)
+    for value in (100.0, 105.0, 111.0, 115.0, 99.0):
+        pipeline.push(value)
+    assert output.items == [100.0, 111.0, 99.0]
+
+
+def test_debounce():
+    pipeline, output = _pipeline()
+    pipeline.debounce(0.1)
+    for idx in range(5):
+        pipeline.push(idx)
+        time.sleep(0.01)
+    assert output.items == []
+    assert _wait_until(lambda: output.items)
+    time.sleep(0.15)
+    assert output.items == [4]
+
+
+def test_throttle():
+    pipeline, output = _pipeline()
+    pipeline.throttle(0.2)
+    for idx in range(5):
+        pipeline.push(idx)
+    # first item passes at once, newest suppressed item at end of interval
+    assert output.items == [0]
+    assert _wait_until(lambda: len(output.items) == 2)
+    assert output.items == [0, 4]
+
+
+def test_throttle_without_trailing_item():
+    pipeline, output = _pipeline()
+    pipeline.throttle(0.1, trailing=False)
+    for idx in range(5):
+        pipeline.push(idx)
+    time.sleep(0.2)
+    pipeline.push(5)
+    assert output.items == [0, 5]
+
+
+def test_tumbling_window():
+    pipeline, output = _pipeline()
+    pipeline.tumbling_window(count=3)
+    for idx in range(7):
+        pipeline.push(idx)
+    assert output.items == [[0, 1, 2], [3, 4, 5]]
+
+    pipeline, output = _pipeline()
+    pipeline.tumbling_window(secs=0.1, count=10)
+    for idx in range(3):
+        pipeline.push(idx)
+    assert output.items == []
+    assert _wait_until(lambda: output.items)
+    assert output.items == [[0, 1, 2]]
+
+
+def test_sliding_window():
+    pipeline, output = _pipeline()
+    pipeline.sliding_window(count=2)
+    for idx in range(4):
+        pipeline.push(idx)
+    assert output.items == [[0], [0, 1], [1, 2], [2, 3]]
+
+    pipeline, output = _pipeline()
+    pipeline.sliding_window(secs=0.1)
+    pipeline.push(0)
+    time.sleep(0.15)
+    pipeline.push(1)
+    pipeline.push(2)
+    assert output.items == [[0], [1], [1, 2]]
+
+
+def test_clear_and_close():
+    pipeline, output = _pipeline()
+    pipeline.filter(lambda item: False)
+    pipeline.push(1)
+    pipeline.clear()
+    pipeline.push(2)
+    assert output.items == [2]
+    pipeline.close()
+    pipeline.push(3)
+    assert output.items == [2]
+
+
+def test_stage_without_push_passes_items():
+    pipeline, output = _pipeline()
+    pipeline._add(connector._PipelineStage(pipeline))
+    pipeline.push(1)
+    assert output.items == [1]
+
+
+def test_blocked_emit_does_not_hold_lock():
+    # e.g. full event queue with OVERFLOW_BLOCK: timer thread waits in emit()
+    released = threading.Event()
+    items = []
+
+    def emit(subES, item):
+        if item == 'debounced':
+            assert released.wait(timeout=5)
+        items.append(item)
+
+    pipeline = connector.EventPipeline(subES=None, emit=emit)
+    pipeline.map(lambda item: 'debounced' if item == 0 else item)
+    pipeline.debounce(0.01)
+    pipeline.push(0)
+    assert _wait_until(lambda: pipeline.get_stats()['out'] == 1)
+
+    # pushing from another thread returns while timer thread is blocked
+    pusher = threading.Thread(target=lambda: [pipeline.push(1), pipeline._run_timed(lambda: None)])
+    pusher.start()
+    pusher.join(timeout=2)
+    assert not pusher.is_alive()
+    released.set()
+    assert _wait_until(lambda: items == ['debounced', 1])
+
+
+def test_pipeline_of_subscription(server, client, make_client):
+    path = server.test_paths[0]
+    values = []
+    done = threading.Event()
+
+    def on_event(event):
+        values.append(event['value'])
+        if event['value'] == 110.0:
+            done.set()
+
+    subES = client.get_dp_subscription(path, event=connector.ON_CHANGE)
+    subES.pipeline().deadband(5.0)
+    subES += on_event
+    writer = make_client()
+    for value in (100.0, 101.0, 104.0, 105.0, 107.0, 110.0):
+        writer.dp_set(path, value=value)
+    assert done.wait(timeout=5)
+    assert values == [100.0, 105.0, 110.0]
@@ -0,0 +1,65 @@
+# encoding: utf-8
+"""
+periodic polling scheduler (DMSClient.poll()): all reads due in one tick share one frame
+"""
+
+import threading
+import time
+
+
+def test_reads_of_one_tick_are_batched(server, client):
+    paths = server.test_paths[:50]
+    lock = threading.Lock()
+    values = {}
+
+    def on_read(responses):
+        with lock:
+            for response in responses:
+                values.setdefault(response['path'], []).append(response['value'])
+
+    nof_requests = server.get_stats()['nof_requests']
+    jobs = [client.poll(path, period=0.2, callback=on_read) for path in paths]
+    deadline = time.time() + 10.0
+    while not all(job.nof_polls >= 3 for job in jobs) and time.time() < deadline:
+        time.sleep(0.05)
+    for job in jobs:
+        job.cancel()
+
+    stats = client.get_poll_stats()
+    assert stats['errors'] == 0
+    assert sorted(values) == sorted(paths)
+    assert all(job.nof_polls >= 3 for job in jobs)
+    # one frame (one request to DMS) per tick instead of one per datapoint and period
+    assert stats['commands'] >= 50 * 3
+    assert stats['frames'] * 10 <= stats['commands']
+    assert server.get_stats()['nof_requests'] - nof_requests <= stats['frames'] + 1
+
+
+def test_cancelled_job_is_not_read(server, client):
+    job = client.poll(server.test_paths[0], period=0.1, callback=lambda responses: None)
+    time.sleep(0.35)
+    job.cancel()
+    time.sleep(0.15)
+    nof_polls = job.nof_polls
+    time.sleep(0.3)
+    assert nof_polls >= 2
+    assert job.nof_polls == nof_polls
+    assert client.get_poll_stats()['jobs'] == 0
+
+
+
+def test_counters_of_concurrent_batches(server, client):
+    # many small batches in parallel worker threads: no lost updates of shared counters
+    paths = server.test_paths[:40]
+    jobs = [client.poll(path, period=0.1, callback=lambda responses: None) for path in paths]
+    client._poll_scheduler.max_batch = 1
+    deadline = time.time() + 10.0
+    while not all(job.nof_polls >= 5 for job in jobs) and time.time() < deadline:
+        time.sleep(0.05)
+    for job in jobs:
+        job.cancel()
+    # (reads in flight are still counted)
+    time.sleep(0.3)
+    stats = client.get_poll_stats()
+    assert stats['commands'] == sum(job.nof_polls for job in jobs)
+    assert stats['frames'] >= sum(job.nof_polls for job in jobs) / 2
@@ -0,0 +1,53 @@
+# encoding: utf-8
+"""
+execution statistics of callbacks (DMSClient(profile_handlers=True))
+"""
+
+import threading
+import time
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+def test_slow_callback_ranks_first(server, make_client):
+    dmsclient = make_client(profile_handlers=True)
+    path = server.test_paths[0]
+    done = threading.Event()
+
+    def fast_handler(event):
+        pass
+
+    def slow_handler(event):
+        time.sleep(0.05)
+
+    def last_handler(event):
+        if event['value'] == 103.0:
+            done.set()
+
+    subES = dmsclient.get_dp_subscription(path, event=connector.ON_CHANGE)
+    subES += fast_handler
+    subES += slow_handler
+    subES += last_handler
+    writer = make_client()
+    for idx in range(4):
+        writer.dp_set(path, value=100.0 + idx)
+    assert done.wait(timeout=5)
+
+    top_handlers = dmsclient.top_slow_handlers(n=3)
+    assert len(top_handlers) == 3
+    assert top_handlers[0]['handler'].endswith('slow_handler')
+    assert top_handlers[0]['path'] == path
+    assert top_handlers[0]['max_secs'] >= 0.05
+    assert dmsclient.top_slow_handlers(n=1, sort_by='total_secs')[0]['handler'].endswith('slow_handler')
+
+    sub_stats = dmsclient.get_subscription_stats()
+    assert len(sub_stats) == 1
+    assert sub_stats[0]['path'] == path
+    assert sub_stats[0]['events'] >= 4
+
+
+def test_profiling_is_disabled_by_default(client):
+    with pytest.raises(Exception):
+        client.top_slow_handlers()
@@ -0,0 +1,75 @@
+# encoding: utf-8
+"""
+recording of raw websocket frames and offline replay (visitoolkit_connector.recorder)
+"""
+
+import threading
+
+import pytest
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import recorder
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_recording_roundtrip(tmp_path, server, make_client, compress):
+    filename = str(tmp_path / 'traffic.rec')
+    frame_recorder = recorder.FrameRecorder(filename, compress=compress)
+    dmsclient = make_client(recorder=frame_recorder)
+    path = server.test_paths[0]
+
+    received = threading.Event()
+
+    def on_event(event):
+        if event['value'] == 99.5:
+            received.set()
+
+    subES = dmsclient.get_dp_subscription(path, event=connector.ON_CHANGE)
+    subES += on_event
+    dmsclient.dp_get_multi([(path, {}) for path in server.test_paths[:5]])
+    make_client().dp_set(path, value=99.5)
+    assert received.wait(timeout=5)
+    frame_recorder.close()
+
+    frames = list(recorder.FrameReplayer(filename).frames())
+    assert len(frames) == frame_recorder.nof_frames
+    directions = [direction for _, direction, _ in frames]
+    assert directions.count(recorder.DIR_TX) == 2
+    assert directions.count(recorder.DIR_RX) >= 3
+    assert [stamp for stamp, _, _ in frames] == sorted(stamp for stamp, _, _ in frames)
+
+    replayed = []
+    stats = recorder.FrameReplayer(filename).replay(speed=None, handlers=[lambda event: replayed.append(event['value'])])
+    assert stats['frames_tx'] == 2
+    assert stats['subscriptions'] == 1
+    # (one subscription plus five reads in one frame)
+    assert stats['responses'] == 6
+    assert 99.5 in replayed
+
+
+def test_appending_to_compressed_recording(tmp_path):
+    filename = str(tmp_path / 'traffic.rec')
+    for idx in range(2):
+        with recorder.FrameRecorder(filename, compress=True) as frame_recorder:
+            frame_recorder.record_rx('{"event": []}')
+            frame_recorder.record_tx('{"get": [{"path": "A", "tag": "' + str(idx) + '"}]}')
+    frames = list(recorder.FrameReplayer(filename).frames())
+    assert [direction for _, direction, _ in frames] == [recorder.DIR_RX, recorder.DIR_TX] * 2
+
+
+def test_no_recording(tmp_path):
+    filename = tmp_path / 'other.bin'
+    filename.write_bytes(b'something else')
+    with pytest.raises(ValueError):
+        list(recorder.FrameReplayer(str(filename)).frames())
+
+
+def test_replay_of_value_containing_subscribe(tmp_path):
+    filename = str(tmp_path / 'traffic.rec')
+    with recorder.FrameRecorder(filename) as frame_recorder:
+        frame_recorder.record_tx('{"get": [{"path": "A", "tag": "t1"}, {"path": "B", "tag": "t2"}]}')
+        frame_recorder.record_rx('{"get": [{"code": "ok", "path": "A", "value": "\\"subscribe\\"", "type": "string", "tag": "t1"}]}')
+        frame_recorder.record_rx('{"get": [{"code": "ok", "path": "B", "value": 1, "type": "int", "tag": "t2"}]}')
+    stats = recorder.FrameReplayer(filename).replay(speed=None)
+    assert stats['subscriptions'] == 0
+    assert stats['responses'] == 2
@@ -0,0 +1,72 @@
+# encoding: utf-8
+"""
+shared-memory table of current datapoint values (visitoolkit_connector.sharedtable)
+"""
+
+import time
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import sharedtable
+
+
+def test_values_of_all_kinds(tmp_path):
+    filename = str(tmp_path / 'table.shm')
+    with sharedtable.SharedValuePublisher(filename, capacity=16) as publisher:
+        values = {'A:float': 1.5, 'A:int': -7, 'A:bool': True, 'A:str': 'hello', 'A:none': None}
+        for path, value in values.items():
+            assert publisher.publish(path, value, stamp=1000.0)
+        with sharedtable.SharedValueReader(filename) as reader:
+            for path, value in values.items():
+                result = reader.get(path)
+                assert result.value == value and type(result.value) == type(value)
+                assert result.stamp == 1000.0
+            assert reader.get('A:unknown') is None
+            assert sorted(reader.get_paths()) == sorted(values)
+
+
+def test_restarted_publisher_replaces_table(tmp_path):
+    filename = str(tmp_path / 'table.shm')
+    first = sharedtable.SharedValuePublisher(filename, capacity=16)
+    first.publish('A:old', 1.0)
+    reader = sharedtable.SharedValueReader(filename)
+    assert reader.get_value('A:old') == 1.0
+    first.close()
+
+    # new publisher: other slots, other capacity (old file must not be truncated under the mapping of reader)
+    second = sharedtable.SharedValuePublisher(filename, capacity=4)
+    second.publish('A:new', 2.0)
+    assert reader.get_value('A:new') == 2.0
+    assert reader.get('A:old') is None
+    assert reader.nof_reopens == 1
+    assert reader.capacity == 4
+    assert reader.get_publisher_info()['generation'] == second.generation
+    reader.close()
+    second.close(unlink=True)
+    assert not list(tmp_path.iterdir())
+
+
+def test_heartbeat_while_publishing(tmp_path):
+    filename = str(tmp_path / 'table.shm')
+    with sharedtable.SharedValuePublisher(filename, heartbeat_secs=0.05) as publisher:
+        with sharedtable.SharedValueReader(filename) as reader:
+            first_heartbeat = reader.get_publisher_info()['heartbeat']
+            for idx in range(10):
+                publisher.publish('A:B', float(idx))
+            time.sleep(0.3)
+            info = reader.get_publisher_info()
+            assert info['updates'] == 10
+            assert info['heartbeat'] > first_heartbeat
+
+
+def test_subscription_of_standin(tmp_path, server, client):
+    filename = str(tmp_path / 'table.shm')
+    path = server.test_paths[0]
+    with sharedtable.SharedValuePublisher(filename) as publisher:
+        publisher.subscribe(client, path)
+        with sharedtable.SharedValueReader(filename) as reader:
+            assert reader.get_value(path) == client.dp_get(path)[0]['value']
+            client.dp_set(path, value=42.5)
+            deadline = time.time() + 5.0
+            while reader.get_value(path) != 42.5 and time.time() < deadline:
+                time.sleep(0.01)
+            assert reader.get_value(path) == 42.5
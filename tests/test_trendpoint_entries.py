@@ -0,0 +1,40 @@
+# encoding: utf-8
+"""
+trendpoints of HistData_detail(): Trendpoint_dict by default, compact records with connector.TREND_RECORDS
+"""
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+HIST_OBJS = [{'stamp': '2018-01-01T00:00:00+00:00', 'value': 1.5, 'state': 'ok', 'rec': 'Trend'},
+             {'stamp': '2018-01-01T00:01:00+00:00', 'value': 2.5, 'state': 'ok', 'rec': 'Trend'}]
+
+
+@pytest.fixture
+def records():
+    connector.TREND_RECORDS = True
+    yield
+    connector.TREND_RECORDS = False
+
+
+def test_trendpoints_accept_additional_keys():
+    trendpoint = connector.HistData_detail(HIST_OBJS)[0]
+    assert isinstance(trendpoint, connector.Trendpoint_dict)
+    assert trendpoint.value == trendpoint['value'] == 1.5
+    trendpoint['comment'] = 'checked'
+    assert trendpoint.comment == 'checked'
+    assert trendpoint.as_dict()['state'] == 'ok'
+
+
+def test_trendpoints_as_records(records):
+    histdata = connector.HistData_detail(HIST_OBJS)
+    trendpoint = histdata[1]
+    assert isinstance(trendpoint, connector.Trendpoint_entry)
+    assert trendpoint.value == trendpoint['value'] == 2.5
+    assert trendpoint.stamp.minute == 1
+    with pytest.raises(KeyError):
+        trendpoint['comment'] = 'checked'
+    # state and rec are shared strings
+    assert histdata[0].rec is trendpoint.rec
@@ -0,0 +1,109 @@
+# encoding: utf-8
+"""
+blocking condition API on datapoints (DMSClient.wait_for())
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from visitoolkit_connector import connector
+
+
+def test_condition_already_fulfilled(server, client):
+    path = server.test_paths[0]
+    client.dp_set(path, value=5.0)
+    result = client.wait_for(path, 5.0, timeout=5)
+    assert isinstance(result, connector.RespGet)
+    assert result['value'] == 5.0
+
+
+def test_condition_fulfilled_by_event(server, client, make_client):
+    path = server.test_paths[0]
+    other_client = make_client()
+
+    def set_values():
+        for value in (10.0, 20.0, 60.0):
+            time.sleep(0.1)
+            other_client.dp_set(path, value=value)
+
+    setter = threading.Thread(target=set_values)
+    setter.start()
+    result = client.wait_for(path, lambda val: val > 50.0, timeout=5)
+    setter.join()
+    assert isinstance(result, connector.DMSEvent)
+    assert result['value'] == 60.0
+
+
+def test_condition_timeout(server, client):
+    path = server.test_paths[0]
+    time_begin = time.time()
+    with pytest.raises(TimeoutError):
+        client.wait_for(path, lambda val: val > 1000.0, timeout=0.5)
+    assert time.time() - time_begin < 3.0
+
+
+def test_error_in_predicate(server, client):
+    def predicate(val):
+        raise ValueError('broken predicate')
+
+    with pytest.raises(ValueError):
+        client.wait_for(server.test_paths[0], predicate, timeout=5)
+
+
+def test_async_condition_fulfilled_by_event(server, client, make_client):
+    path = server.test_paths[0]
+    other_client = make_client()
+
+    async def main():
+        async def set_values():
+            while client._condition_waiters.get_stats()['waiters'] < 2:
+                await asyncio.sleep(0.01)
+            # (values set before both waiters read current value would get lost for an exact match)
+            await asyncio.sleep(0.2)
+            for value in (10.0, 20.0, 60.0):
+                await asyncio.sleep(0.1)
+                await asyncio.get_running_loop().run_in_executor(None, lambda: other_client.dp_set(path, value=value))
+
+        # both waiters share one subscription, eventloop isn't blocked while waiting
+        return await asyncio.gather(client.wait_for_async(path, lambda val: val > 50.0, timeout=5),
+                                    client.wait_for_async(path, 20.0, timeout=5),
+                                    set_values())
+
+    first, second, _ = asyncio.run(main())
+    assert isinstance(first, connector.DMSEvent)
+    assert first['value'] == 60.0
+    assert second['value'] == 20.0
+    stats = client._condition_waiters.get_stats()
+    assert stats['subscriptions_total'] == 1
+    assert stats['paths'] == 0
+
+
+def test_async_condition_already_fulfilled(server, client):
+    path = server.test_paths[0]
+    client.dp_set(path, value=5.0)
+    result = asyncio.run(client.wait_for_async(path, 5.0, timeout=5))
+    assert isinstance(result, connector.RespGet)
+
+
+def test_async_condition_timeout(server, client):
+    path = server.test_paths[0]
+
+    async def main():
+        ticks = 0
+        waiting = asyncio.ensure_future(client.wait_for_async(path, lambda val: val > 1000.0, timeout=0.5))
+        while not waiting.done():
+            await asyncio.sleep(0.05)
+            ticks += 1
+        return waiting, ticks
+
+    time_begin = time.time()
+    waiting, ticks = asyncio.run(main())
+    with pytest.raises(TimeoutError):
+        waiting.result()
+    assert time.time() - time_begin < 3.0
+    # (eventloop kept running while waiting)
+    assert ticks >= 5
+    assert client._condition_waiters.get_stats()['paths'] == 0
@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\alarms.py
+
+Table of current alarm states: bootstrapped once from changelogs of all alarm datapoints in a tree,
+afterwards kept up to date by DMS-events, with indexes for fast queries
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>every alarm datapoint has one row: it's newest changelog entry
+=>indexes "state", "priority", "alarmGroup", "siteGroup" and "active" are dictionaries value -> set of paths,
+  a query intersects the sets of it's criteria (beginning with the smallest), it never scans the whole table
+=>on DMS-events only the changed datapoints are read again (changelog since their last known entry),
+  this is done in a background thread, so callbacks of other subscriptions are never blocked
+=>naming of alarm states depends on DMS version and project, look in ALARM_INACTIVE_STATES
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import datetime
+import threading
+
+from visitoolkit_connector import connector
+
+
+# alarm states of alarms which are no longer active (all other states count as active)
+ALARM_INACTIVE_STATES = ('gone', )
+
+# indexed fields of changelog entry
+ALARM_INDEX_FIELDS = ('state', 'priority', 'alarmGroup', 'siteGroup')
+
+# events triggering a new read of changelog
+ALARM_EVENTS = connector.ON_CHANGE | connector.ON_SET | connector.ON_RENAME | connector.ON_DELETE
+
+
+
+class AlarmTable(object):
+    """ current alarm of every alarm datapoint in a tree, indexed by state, priority, alarmGroup, siteGroup and path """
+
+    def __init__(self, dmsclient, path, start=None, inactive_states=ALARM_INACTIVE_STATES, timeout=connector.REQ_TIMEOUT):
+        # dmsclient: connected DMSClient
+        # path: root of observed tree
+        # start: begin of changelog for bootstrap (datetime.datetime or ISO 8601 string, default: 30 days ago)
+        self._dmsclient = dmsclient
+        self.path = path
+        self.timeout = timeout
+        self._inactive_states = frozenset(inactive_states)
+        if start is None:
+            start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=30)
+        self._start = start
+
+        # path -> newest changelog entry
+        self._rows = {}
+        # field -> (value -> set of paths), additional index "active" (True/False -> set of paths)
+        self._indexes = {field: {} for field in ALARM_INDEX_FIELDS + ('active', )}
+        self._lock = threading.RLock()
+
+        # paths waiting for a new read of their changelog (set: many events of one datapoint are collapsed)
+        self._dirty_paths = set()
+        self._dirty_cond = threading.Condition()
+        self._keep_running = True
+
+        self._subscription = None
+        self._worker = None
+        self._nof_events = 0
+        self._nof_refreshes = 0
+        self._nof_updates = 0
+
+
+    def start(self):
+        """ subscribing DMS-events, then bootstrapping table from changelogs, returns self """
+        # (subscription before bootstrap: changes during bootstrap are read again afterwards)
+        self._subscription = self._dmsclient.get_dp_subscription(self.path,
+                                                                 timeout=self.timeout,
+                                                                 query=connector.Query(hasAlarmData=True, maxDepth=-1),
+                                                                 event=ALARM_EVENTS)
+        self._subscription += self._cb_event
+        self.bootstrap()
+        self._worker = threading.Thread(target=self._run_worker, name='AlarmTable worker')
+        self._worker.daemon = True
+        self._worker.start()
+        return self
+
+
+    def stop(self):
+        """ stopping updates by DMS-events (table content stays available) """
+        self._keep_running = False
+        with self._dirty_cond:
+            self._dirty_cond.notify_all()
+        if self._subscription:
+            self._subscription.unsubscribe()
+            self._subscription = None
+        if self._worker:
+            self._worker.join()
+            self._worker = None
+
+
+    def bootstrap(self):
+        """ reading changelogs of all alarm datapoints in tree (one request), returns number of rows """
+        responses = self._dmsclient.dp_get(self.path,
+                                           timeout=self.timeout,
+                                           query=connector.Query(hasAlarmData=True, maxDepth=-1),
+                                           changelog=connector.Changelog(start=self._start))
+        self._apply_responses(responses)
+        return len(self)
+
+
+    def _refresh(self, paths):
+        # reading changelog of changed datapoints since their newest entry
+        for path in paths:
+            with self._lock:
+                row = self._rows.get(path)
+            start = row['stamp'] if row is not None and row['stamp'] is not None else self._start
+            try:
+                responses = self._dmsclient.dp_get(path,
+                                                   timeout=self.timeout,
+                                                   changelog=connector.Changelog(start=start))
+            except Exception as ex:
+                connector.logger.warning('AlarmTable: reading changelog of "' + path + '" failed: ' + repr(ex))
+                continue
+            self._apply_responses(responses)
+            self._nof_refreshes += 1
+
+
+    def _apply_responses(self, responses):
+        for response in responses:
+            if response['code'] != 'ok':
+                continue
+            changelog = response.get('changelog', None)
+            if not isinstance(changelog, connector.Changelog_Alarm):
+                # only protocol without alarm data
+                continue
+            # newest entry is current alarm state
+            newest = None
+            for entry in changelog:
+                if newest is None or (entry['stamp'] is not None and
+                                      (newest['stamp'] is None or entry['stamp'] >= newest['stamp'])):
+                    newest = entry
+            if newest is not None:
+                if newest['path'] is None:
+                    # path is optional when only one datapoint was requested
+                    newest['path'] = response['path']
+                self.update_entry(newest)
+
+
+    def update_entry(self, entry):
+        """ inserting or replacing row of a changelog entry (older entries than current row are ignored) """
+        path = entry['path']
+        with self._lock:
+            old_entry = self._rows.get(path)
+            if old_entry is not None:
+                if old_entry['stamp'] is not None and entry['stamp'] is not None and entry['stamp'] < old_entry['stamp']:
+                    return False
+                self._unindex(path, old_entry)
+            self._rows[path] = entry
+            self._index(path, entry)
+            self._nof_updates += 1
+        return True
+
+
+    def remove(self, path):
+        """ removing row of datapoint, returns removed changelog entry or None """
+        with self._lock:
+            entry = self._rows.pop(path, None)
+            if entry is not None:
+                self._unindex(path, entry)
+        return entry
+
+
+    def _index(self, path, entry):
+        for field in ALARM_INDEX_FIELDS:
+            self._indexes[field].setdefault(entry[field], set()).add(path)
+        self._indexes['active'].setdefault(self.is_active(entry), set()).add(path)
+
+
+    def _unindex(self, path, entry):
+        for field in ALARM_INDEX_FIELDS:
+            self._discard(self._indexes[field], entry[field], path)
+        self._discard(self._indexes['active'], self.is_active(entry), path)
+
+
+    @staticmethod
+    def _discard(index_dict, value, path):
+        paths = index_dict.get(value)
+        if paths is not None:
+            paths.discard(path)
+            if not paths:
+                # no empty sets: number of keys stays bounded by existing values
+                del index_dict[value]
+
+
+    def is_active(self, entry):
+        return entry['state'] not in self._inactive_states
+
+
+    def query(self, **criteria):
+        """ returns list of changelog entry matching all criteria """
+        # e.g. query(active=True, priority=1, siteGroup=3)
+        # (criteria: state, priority, alarmGroup, siteGroup, active and path,
+        #  value can be a list, tuple or set of allowed values)
+        with self._lock:
+            candidates = []
+            for field, value in criteria.items():
+                if field == 'path':
+                    values = value if isinstance(value, (list, tuple, set, frozenset)) else (value, )
+                    paths = set(path for path in values if path in self._rows)
+                elif field in self._indexes:
+                    index_dict = self._indexes[field]
+                    if isinstance(value, (list, tuple, set, frozenset)):
+                        paths = set()
+                        for val in value:
+                            paths.update(index_dict.get(val, ()))
+                    else:
+                        paths = index_dict.get(value, set())
+                else:
+                    raise ValueError('AlarmTable.query(): field "' + field + '" is not indexed')
+                if not paths:
+                    return []
+                candidates.append(paths)
+
+            if not candidates:
+                result_paths = self._rows.keys()
+            else:
+                # beginning with smallest set, then every step costs at most size of result
+                candidates.sort(key=len)
+                result_paths = candidates[0]
+                for paths in candidates[1:]:
+                    result_paths = result_paths.intersection(paths)
+                    if not result_paths:
+                        return []
+            return [self._rows[path] for path in result_paths]
+
+
+    def get_active(self, **criteria):
+        """ returns list of changelog entry of all active alarms matching criteria """
+        return self.query(active=True, **criteria)
+
+
+    def count(self, field, active=None):
+        """ returns dictionary value -> number of alarms (e.g. count('priority', active=True)) """
+        with self._lock:
+            if field not in self._indexes:
+                raise ValueError('AlarmTable.count(): field "' + field + '" is not indexed')
+            active_paths = None
+            if active is not None:
+                active_paths = self._indexes['active'].get(active, set())
+            result = {}
+            for value, paths in self._indexes[field].items():
+                if active_paths is None:
+                    result[value] = len(paths)
+                else:
+                    nof = len(paths & active_paths)
+                    if nof:
+                        result[value] = nof
+            return result
+
+
+    def get(self, path):
+        """ returns current changelog entry of datapoint or None """
+        with self._lock:
+            return self._rows.get(path)
+
+
+    def _cb_event(self, event):
+        # runs in dispatcher thread of DMSClient: only marking datapoint, reading is done by worker thread
+        self._nof_events += 1
+        if event['code'] == connector.DMSEvent.CODE_DELETE:
+            self._remove_tree(event['path'])
+        elif event['code'] == connector.DMSEvent.CODE_RENAME:
+            self._rename_tree(event['path'], event['newPath'])
+        else:
+            with self._dirty_cond:
+                self._dirty_paths.add(event['path'])
+                self._dirty_cond.notify()
+
+
+    def _remove_tree(self, path):
+        with self._lock:
+            for row_path in [p for p in self._rows if p == path or p.startswith(path + ':')]:
+                self.remove(row_path)
+
+
+    def _rename_tree(self, path, newPath):
+        with self._lock:
+            for row_path in [p for p in self._rows if p == path or p.startswith(path + ':')]:
+                entry = self.remove(row_path)
+                entry['path'] = connector.intern_str(newPath + row_path[len(path):])
+                self.update_entry(entry)
+
+
+    def _run_worker(self):
+        while self._keep_running:
+            with self._dirty_cond:
+                while self._keep_running and not self._dirty_paths:
+                    self._dirty_cond.wait()
+                paths = self._dirty_paths
+                self._dirty_paths = set()
+            if paths and self._keep_running:
+                self._refresh(sorted(paths))
+
+
+    def get_stats(self):
+        """ returns dictionary with size of table and event counters """
+        with self._lock:
+            nof_active = len(self._indexes['active'].get(True, ()))
+            return {'rows': len(self._rows),
+                    'active': nof_active,
+                    'events': self._nof_events,
+                    'refreshes': self._nof_refreshes,
+                    'updates': self._nof_updates,
+                    'pending': len(self._dirty_paths)}
+
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, path):
+        return path in self._rows
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'AlarmTable(path=' + repr(self.path) + ', rows=' + repr(len(self)) + ')'
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\benchmark.py
+
+Benchmarks without DMS: memory usage of decoded responses, DMS-events, trend data and changelog entries
+of a synthetic datapoint tree (default: 500000 datapoints)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>synthetic frames are decoded by the same code as frames received from DMS (connector._decode_frame()),
+  memory is measured with module "tracemalloc" (retained memory of all decoded objects)
+=>usage: python -m visitoolkit_connector.benchmark --datapoints 500000
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import datetime
+import gc
+import json
+import time
+import tracemalloc
+
+from visitoolkit_connector import connector
+
+
+# size of synthetic tree
+BENCH_NOF_DATAPOINTS = 500000
+
+# number of responses (or events) in one synthetic frame
+BENCH_FRAME_SIZE = 1000
+
+
+
+def synthetic_paths(nof_datapoints):
+    """ list of paths in a tree similar to real building automation projects """
+    # =>e.g. "MSR03_B:Allg:Grp017:Dp0042:Istwert"
+    paths = []
+    for idx in range(nof_datapoints):
+        site, rest = divmod(idx, 50000)
+        plant, rest = divmod(rest, 10000)
+        group, dp = divmod(rest, 100)
+        paths.append('MSR%02d_%s:Allg:Grp%03d:Dp%04d:Istwert' % (site, 'ABCDE'[plant % 5], group, dp))
+    return paths
+
+
+def _stamp_str(idx):
+    stamp = datetime.datetime(2018, 1, 1, tzinfo=datetime.timezone.utc) + datetime.timedelta(seconds=idx)
+    return stamp.isoformat()
+
+
+def _chunks(items, size):
+    for idx in range(0, len(items), size):
+        yield idx, items[idx:idx + size]
+
+
+def frames_get(paths):
+    """ generator: JSON frames with responses to "get" with query (browsing whole tree) """
+    for offset, chunk in _chunks(paths, BENCH_FRAME_SIZE):
+        responses = []
+        for idx, path in enumerate(chunk, start=offset):
+            responses.append({'code': 'ok',
+                              'path': path,
+                              'value': float(idx),
+                              'type': 'double',
+                              'hasChild': False,
+                              'stamp': _stamp_str(idx),
+                              'tag': 'browse'})
+        yield json.dumps({'get': responses})
+
+
+def frames_events(paths):
+    """ generator: JSON frames with one DMS-event per datapoint """
+    for offset, chunk in _chunks(paths, BENCH_FRAME_SIZE):
+        events = []
+        for idx, path in enumerate(chunk, start=offset):
+            events.append({'code': 'onChange',
+                           'path': path,
+                           'value': float(idx),
+                           'type': 'double',
+                           'stamp': _stamp_str(idx),
+                           'tag': 'subscription-' + str(offset)})
+        yield json.dumps({'event': events})
+
+
+def frames_changelog(paths):
+    """ generator: JSON frames with one alarm changelog entry per datapoint """
+    for offset, chunk in _chunks(paths, BENCH_FRAME_SIZE):
+        entries = []
+        for idx, path in enumerate(chunk, start=offset):
+            entries.append({'path': path,
+                            'stamp': _stamp_str(idx),
+                            'text': 'alarm',
+                            'state': 'gone',
+                            'priority': idx % 4,
+                            'priorityBACnet': 0,
+                            'alarmGroup': idx % 16,
+                            'alarmCollectGroup': 0,
+                            'siteGroup': idx % 8})
+        yield json.dumps({'get': [{'code': 'ok', 'path': chunk[0], 'changelog': entries, 'tag': 'changelog'}]})
+
+
+def frames_histdata(paths):
+    """ generator: JSON frames with one detailed trendpoint per datapoint """
+    for offset, chunk in _chunks(paths, BENCH_FRAME_SIZE):
+        trend = [{'stamp': _stamp_str(idx), 'value': float(idx), 'state': 'ok', 'rec': 'STD'}
+                 for idx in range(offset, offset + len(chunk))]
+        yield json.dumps({'get': [{'code': 'ok', 'path': chunk[0], 'histData': trend, 'tag': 'trend'}]})
+
+
+def _decode_all(frame_generators):
+    # keeping all decoded responses and events in memory
+    kept = []
+    for frames in frame_generators:
+        for msg in frames:
+            responses_list, events_list = connector._decode_frame(msg)
+            kept.append(responses_list)
+            kept.append(events_list)
+    return kept
+
+
+def _copy_entries(kept, as_dicts):
+    # copying all trendpoints and changelog entries (values are shared, only containers are new)
+    # =>as_dicts=True: baseline for comparison, one dictionary per entry
+    copies = []
+    for responses_list in kept:
+        for item in responses_list:
+            if isinstance(item, tuple):
+                for response in item[1]:
+                    for field in ('histData', 'changelog'):
+                        if response.get(field):
+                            if as_dicts:
+                                copies.append([entry.as_dict() for entry in response[field]])
+                            else:
+                                copies.append([entry.__class__(**entry) for entry in response[field]])
+    return copies
+
+
+def measure(label, build_fn, nof_items):
+    """ executing build_fn(), returns dictionary with retained memory and duration """
+    gc.collect()
+    tracemalloc.start()
+    time_begin = time.time()
+    result = build_fn()
+    duration_secs = time.time() - time_begin
+    gc.collect()
+    retained_bytes, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # help garbage collector
+    result = None
+    return {'label': label,
+            'retained_bytes': retained_bytes,
+            'peak_bytes': peak_bytes,
+            'bytes_per_item': retained_bytes / nof_items if nof_items else None,
+            'duration_secs': duration_secs}
+
+
+def memory_benchmark(nof_datapoints=BENCH_NOF_DATAPOINTS):
+    """ comparing memory usage with and without interning of strings and with plain dictionaries, returns list of results """
+    paths = synthetic_paths(nof_datapoints)
+    results = []
+
+    # responses and DMS-events of whole tree, with and without intern table
+    intern_table = connector._path_intern_table
+    orig_maxsize = intern_table.maxsize
+    for label, maxsize in (('tree without interning', 0),
+                           ('tree with interning', orig_maxsize or connector.PATH_INTERN_TABLE_SIZE)):
+        intern_table.clear()
+        intern_table.maxsize = maxsize
+        results.append(measure(label,
+                               lambda: _decode_all([frames_get(paths), frames_events(paths)]),
+                               2 * nof_datapoints))
+    intern_table.maxsize = orig_maxsize
+    intern_table.clear()
+
+    # trendpoints and changelog entries: compact records compared to one dictionary per entry
+    orig_records = connector.CHANGELOG_RECORDS, connector.TREND_RECORDS
+    connector.CHANGELOG_RECORDS = connector.TREND_RECORDS = True
+    kept = _decode_all([frames_histdata(paths), frames_changelog(paths)])
+    connector.CHANGELOG_RECORDS, connector.TREND_RECORDS = orig_records
+    results.append(measure('trend and changelog entries as records', lambda: _copy_entries(kept, as_dicts=False), 2 * nof_datapoints))
+    results.append(measure('trend and changelog entries as dictionaries', lambda: _copy_entries(kept, as_dicts=True), 2 * nof_datapoints))
+    kept = None
+    return results
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='memory benchmark of visitoolkit_connector with a synthetic datapoint tree')
+    parser.add_argument('--datapoints', type=int, default=BENCH_NOF_DATAPOINTS)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    results = memory_benchmark(args.datapoints)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for result in results:
+            print('%-52s %10.1f MB %8.1f bytes/item %8.1f s' % (result['label'],
+                                                               result['retained_bytes'] / 1e6,
+                                                               result['bytes_per_item'],
+                                                               result['duration_secs']))
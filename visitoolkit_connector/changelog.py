@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\changelog.py
+
+Local on-disk store of changelog and protocol entries (SQLite database file),
+indexed by timestamp and path for auditing without fetching and parsing again
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>entries are appended as connector.ChangelogBatch (columnar, decoded in one pass),
+  duplicates (same stamp, path, text and group) are ignored, overlapping fetches are harmless
+=>sync_group() and sync_path() fetch only entries newer than the newest stored entry
+=>timestamps are stored as seconds since epoch (UTC)
+=>optional ChangelogTextIndex: inverted index over protocol text (token postings plus time index),
+  updated with every appended batch, term, phrase and time-range queries without scanning all entries
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import array
+import bisect
+import datetime
+import math
+import re
+import sqlite3
+import threading
+
+from visitoolkit_connector import connector
+
+
+# columns of table "changelog" (same order as in ChangelogBatch.iter_rows() of alarm batches, plus "grp")
+STORE_COLUMNS = ('stamp', 'path', 'text',
+                 'state', 'priority', 'priorityBACnet', 'alarmGroup', 'alarmCollectGroup', 'siteGroup', 'screen',
+                 'grp')
+
+# group name of entries fetched by dp_get() (changelog of a datapoint, not of a changelog group)
+STORE_NO_GROUP = ''
+
+# words in protocol text (unicode aware: "Störung" is one token)
+_TOKEN_RE = re.compile(r'\w+')
+
+# query syntax of ChangelogTextIndex.search(): "quoted phrase" or single term (optional "*" for prefix)
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS changelog (
+    stamp REAL,
+    path TEXT,
+    text TEXT,
+    state TEXT,
+    priority INTEGER,
+    priorityBACnet INTEGER,
+    alarmGroup INTEGER,
+    alarmCollectGroup INTEGER,
+    siteGroup INTEGER,
+    screen TEXT,
+    grp TEXT NOT NULL,
+    UNIQUE (stamp, path, text, grp) ON CONFLICT IGNORE
+);
+CREATE INDEX IF NOT EXISTS changelog_stamp ON changelog (stamp);
+CREATE INDEX IF NOT EXISTS changelog_path_stamp ON changelog (path, stamp);
+'''
+
+
+
+def tokenize(text):
+    """ returns list of lowercase words in text """
+    if not text:
+        return []
+    return _TOKEN_RE.findall(text.casefold())
+
+
+def _as_secs(tstamp):
+    # datetime.datetime, ISO 8601 string or seconds since epoch -> seconds since epoch
+    if tstamp is None or isinstance(tstamp, (int, float)):
+        return tstamp
+    if isinstance(tstamp, str):
+        tstamp = connector.parse_stamp(tstamp)
+    return tstamp.timestamp()
+
+
+
+class ChangelogStore(object):
+    """ SQLite database with changelog entries, indexed by stamp and path """
+
+    def __init__(self, filename, text_index=None):
+        # filename: database file (":memory:" for a temporary store)
+        # text_index: optional ChangelogTextIndex, every appended batch is added to it
+        self.filename = filename
+        self.text_index = text_index
+        # (one connection shared by all threads, access is serialized)
+        self._conn = sqlite3.connect(filename, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+
+    def append(self, batch, group=STORE_NO_GROUP):
+        """ storing all entries of a ChangelogBatch, returns number of new entries """
+        # (NULL instead of NaN for unknown timestamps)
+        extra_values = (group, )
+        if not batch.is_alarm:
+            # protocol entries have no alarm data
+            extra_values = (None, ) * len(connector.ChangelogBatch._alarm_fields) + extra_values
+        rows = ((None if math.isnan(row[0]) else row[0], ) + row[1:] + extra_values for row in batch.iter_rows())
+        with self._lock:
+            nof_before = self._conn.total_changes
+            with self._conn:
+                self._conn.executemany('INSERT INTO changelog (' + ', '.join(STORE_COLUMNS) + ') VALUES (' +
+                                       ', '.join('?' * len(STORE_COLUMNS)) + ')', rows)
+            nof_new = self._conn.total_changes - nof_before
+        if self.text_index is not None:
+            self.text_index.add_batch(batch)
+        return nof_new
+
+
+    def append_response(self, response):
+        """ storing changelog of a RespGet or RespChangelogRead, returns number of new entries """
+        changelog = response.get('changelog', None)
+        if not changelog:
+            return 0
+        group = response.get('group', None) or STORE_NO_GROUP
+        return self.append(changelog.as_batch(path=response.get('path', None)), group=group)
+
+
+    def query(self, start=None, end=None, path=None, recursive=False, group=None, limit=None, **criteria):
+        """ returns ChangelogBatch with stored entries in timeframe, ordered by stamp """
+        # start, end: datetime.datetime, ISO 8601 string or seconds since epoch (end is exclusive)
+        # path: only entries of this datapoint (recursive=True: and all it's children)
+        # criteria: equality of alarm fields (e.g. state='active', siteGroup=3)
+        conditions = []
+        params = []
+        if start is not None:
+            conditions.append('stamp >= ?')
+            params.append(_as_secs(start))
+        if end is not None:
+            conditions.append('stamp < ?')
+            params.append(_as_secs(end))
+        if path is not None:
+            if recursive:
+                # range query on index instead of LIKE (works with every character in path)
+                conditions.append('(path = ? OR (path >= ? AND path < ?))')
+                params.extend([path, path + ':', path + ';'])
+            else:
+                conditions.append('path = ?')
+                params.append(path)
+        if group is not None:
+            conditions.append('grp = ?')
+            params.append(group)
+        for field, val in criteria.items():
+            if field not in connector.ChangelogBatch._alarm_fields:
+                raise ValueError('ChangelogStore.query(): field "' + field + '" is unknown')
+            conditions.append(field + ' = ?')
+            params.append(val)
+
+        sql = 'SELECT ' + ', '.join(STORE_COLUMNS[:-1]) + ' FROM changelog'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY stamp'
+        if limit is not None:
+            sql += ' LIMIT ' + str(int(limit))
+
+        batch = connector.ChangelogBatch(is_alarm=True)
+        columns = [batch.columns[field] for field in batch.fields]
+        with self._lock:
+            for row in self._conn.execute(sql, params):
+                batch.stamps.append(math.nan if row[0] is None else row[0])
+                for column, val in zip(columns, row[1:]):
+                    column.append(val)
+        return batch
+
+
+    def get_newest_stamp(self, path=None, group=None):
+        """ returns newest stored timestamp (seconds since epoch) of datapoint or group, None when nothing is stored """
+        sql = 'SELECT MAX(stamp) FROM changelog'
+        conditions = []
+        params = []
+        if path is not None:
+            conditions.append('path = ?')
+            params.append(path)
+        if group is not None:
+            conditions.append('grp = ?')
+            params.append(group)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+
+    def _get_sync_start(self, start, path=None, group=None):
+        # continuing at newest stored entry (same entry is fetched again, duplicates are ignored)
+        newest = self.get_newest_stamp(path=path, group=group)
+        if newest is None:
+            return start
+        return datetime.datetime.fromtimestamp(newest, tz=datetime.timezone.utc)
+
+
+    def sync_group(self, dmsclient, group, start, timeout=connector.REQ_TIMEOUT):
+        """ fetching new entries of a changelog group (changelogRead), returns number of new entries """
+        nof_new = 0
+        for response in dmsclient.changelog_Read(group, self._get_sync_start(start, group=group), timeout=timeout):
+            if response['code'] == 'ok':
+                nof_new += self.append_response(response)
+            else:
+                connector.logger.warning('ChangelogStore.sync_group(): reading group "' + str(group) + '" failed with code "' + str(response['code']) + '"')
+        return nof_new
+
+
+    def sync_path(self, dmsclient, path, start, timeout=connector.REQ_TIMEOUT):
+        """ fetching new changelog entries of a datapoint (get with changelog), returns number of new entries """
+        nof_new = 0
+        responses = dmsclient.dp_get(path,
+                                     timeout=timeout,
+                                     changelog=connector.Changelog(start=self._get_sync_start(start, path=path, group=STORE_NO_GROUP)))
+        for response in responses:
+            if response['code'] == 'ok':
+                nof_new += self.append_response(response)
+            else:
+                connector.logger.warning('ChangelogStore.sync_path(): reading "' + path + '" failed with code "' + str(response['code']) + '"')
+        return nof_new
+
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM changelog').fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'ChangelogStore(filename=' + repr(self.filename) + ')'
+
+
+
+class ChangelogTextIndex(object):
+    """ inverted index over text of changelog entries: token postings plus time index """
+    # =>entries get consecutive numbers, postings are array.array('I') of entry numbers (sorted by construction)
+    # =>search copies only postings of rarest term, other terms are checked by binary search in their postings
+    # =>prefix terms: binary search in sorted list of all tokens (sorting is only done again after new tokens)
+    # =>time index: entry numbers sorted by stamp, sorting is only done again when a batch arrives out of order
+    # =>phrases: entries containing all tokens of a phrase are candidates, their text is checked for the exact phrase
+
+    def __init__(self, dedupe=True):
+        # dedupe=True: entries with same stamp, path and text are only indexed once
+        #              (e.g. overlapping fetches, costs one tuple per entry)
+        self._stamps = array.array('d')
+        self._paths = []
+        self._texts = []
+        # token -> array of entry numbers
+        self._postings = {}
+        # all tokens, sorted for prefix lookups
+        self._tokens = []
+        self._tokens_sorted = True
+        # entry numbers sorted by stamp (entries without timestamp are not in time index)
+        self._time_order = array.array('I')
+        self._time_keys = array.array('d')
+        self._time_sorted = True
+        self._keys = set() if dedupe else None
+        self._lock = threading.RLock()
+
+
+    def add_batch(self, batch):
+        """ indexing all entries of a ChangelogBatch, returns number of new entries """
+        nof_new = 0
+        with self._lock:
+            paths = batch.columns['path']
+            texts = batch.columns['text']
+            for idx, secs in enumerate(batch.stamps):
+                path = paths[idx]
+                text = texts[idx]
+                if self._keys is not None:
+                    key = (secs, path, text)
+                    if key in self._keys:
+                        continue
+                    self._keys.add(key)
+                self._add_entry(secs, path, text)
+                nof_new += 1
+        return nof_new
+
+
+    def add_response(self, response):
+        """ indexing changelog of a RespGet or RespChangelogRead, returns number of new entries """
+        changelog = response.get('changelog', None)
+        if not changelog:
+            return 0
+        return self.add_batch(changelog.as_batch(path=response.get('path', None)))
+
+
+    def _add_entry(self, secs, path, text):
+        entry_id = len(self._stamps)
+        self._stamps.append(secs)
+        self._paths.append(path)
+        self._texts.append(text)
+        for token in set(tokenize(text)):
+            postings = self._postings.get(token)
+            if postings is None:
+                postings = self._postings[token] = array.array('I')
+                self._tokens.append(token)
+                self._tokens_sorted = False
+            postings.append(entry_id)
+        if not math.isnan(secs):
+            if self._time_keys and secs < self._time_keys[-1]:
+                # out of order: sorting on next time-range query
+                self._time_sorted = False
+            self._time_order.append(entry_id)
+            self._time_keys.append(secs)
+
+
+    def _sort_time_index(self):
+        if not self._time_sorted:
+            order = sorted(self._time_order, key=self._stamps.__getitem__)
+            self._time_order = array.array('I', order)
+            self._time_keys = array.array('d', (self._stamps[entry_id] for entry_id in order))
+            self._time_sorted = True
+
+
+    def _term_postings(self, term):
+        # list of postings containing term ("pump*": postings of all tokens beginning with "pump")
+        # (postings are no copies, caller must not change them)
+        if term.endswith('*'):
+            prefix = term[:-1]
+            if not self._tokens_sorted:
+                self._tokens.sort()
+                self._tokens_sorted = True
+            postings_list = []
+            idx = bisect.bisect_left(self._tokens, prefix)
+            while idx < len(self._tokens) and self._tokens[idx].startswith(prefix):
+                postings_list.append(self._postings[self._tokens[idx]])
+                idx += 1
+            return postings_list
+        postings = self._postings.get(term, None)
+        return [postings] if postings is not None else []
+
+
+    @staticmethod
+    def _is_in_postings(postings_list, entry_id):
+        # binary search in sorted postings
+        for postings in postings_list:
+            idx = bisect.bisect_left(postings, entry_id)
+            if idx < len(postings) and postings[idx] == entry_id:
+                return True
+        return False
+
+
+    def _time_range(self, start_secs, end_secs):
+        # set of entry numbers in timeframe (end is exclusive)
+        self._sort_time_index()
+        begin_idx = 0 if start_secs is None else bisect.bisect_left(self._time_keys, start_secs)
+        end_idx = len(self._time_keys) if end_secs is None else bisect.bisect_left(self._time_keys, end_secs)
+        return self._time_order[begin_idx:end_idx]
+
+
+    @staticmethod
+    def _contains_phrase(tokens, phrase_tokens):
+        size = len(phrase_tokens)
+        for idx in range(len(tokens) - size + 1):
+            if tokens[idx:idx + size] == phrase_tokens:
+                return True
+        return False
+
+
+    def search(self, query=None, start=None, end=None, path=None, recursive=False, limit=None):
+        """ returns ChangelogBatch with all entries matching query and timeframe, ordered by stamp """
+        # query: terms and "quoted phrases", all of them have to match (e.g. '"Störung Pumpe" halle pump*')
+        # start, end: datetime.datetime, ISO 8601 string or seconds since epoch (end is exclusive)
+        # path: only entries of this datapoint (recursive=True: and all it's children)
+        terms = []
+        phrases = []
+        for phrase, term in _QUERY_RE.findall(query or ''):
+            if phrase:
+                phrase_tokens = tokenize(phrase)
+                if len(phrase_tokens) == 1:
+                    terms.append(phrase_tokens[0])
+                elif phrase_tokens:
+                    phrases.append(phrase_tokens)
+                    terms.extend(phrase_tokens)
+            elif term.endswith('*'):
+                prefix_tokens = tokenize(term[:-1])
+                if prefix_tokens:
+                    terms.append(prefix_tokens[-1] + '*')
+            else:
+                terms.extend(tokenize(term))
+        start_secs = _as_secs(start)
+        end_secs = _as_secs(end)
+
+        with self._lock:
+            if terms:
+                # beginning with rarest term, checking it's entries against postings of the others
+                postings_lists = sorted((self._term_postings(term) for term in set(terms)),
+                                        key=lambda postings_list: sum(len(postings) for postings in postings_list))
+                candidates = set()
+                for postings in postings_lists[0]:
+                    candidates.update(postings)
+                for postings_list in postings_lists[1:]:
+                    if not candidates:
+                        break
+                    candidates = [entry_id for entry_id in candidates if self._is_in_postings(postings_list, entry_id)]
+                if start_secs is not None or end_secs is not None:
+                    candidates = [entry_id for entry_id in candidates
+                                  if (start_secs is None or self._stamps[entry_id] >= start_secs) and
+                                     (end_secs is None or self._stamps[entry_id] < end_secs)]
+                for phrase_tokens in phrases:
+                    candidates = [entry_id for entry_id in candidates
+                                  if self._contains_phrase(tokenize(self._texts[entry_id]), phrase_tokens)]
+                entry_ids = sorted(candidates, key=self._stamps.__getitem__)
+            else:
+                entry_ids = self._time_range(start_secs, end_secs)
+
+            if path is not None:
+                entry_ids = [entry_id for entry_id in entry_ids
+                             if self._paths[entry_id] == path or
+                             (recursive and self._paths[entry_id] and self._paths[entry_id].startswith(path + ':'))]
+            if limit is not None:
+                entry_ids = entry_ids[:limit]
+
+            batch = connector.ChangelogBatch()
+            batch.stamps.extend(self._stamps[entry_id] for entry_id in entry_ids)
+            batch.columns['path'] = [self._paths[entry_id] for entry_id in entry_ids]
+            batch.columns['text'] = [self._texts[entry_id] for entry_id in entry_ids]
+        return batch
+
+
+    @classmethod
+    def from_store(cls, store, start=None, end=None, **kwargs):
+        """ building index of all entries in a ChangelogStore (optional timeframe and filters of ChangelogStore.query()) """
+        index = cls()
+        index.add_batch(store.query(start=start, end=end, **kwargs))
+        return index
+
+
+    def get_stats(self):
+        """ returns dictionary with number of entries, tokens and postings """
+        with self._lock:
+            return {'entries': len(self._stamps),
+                    'tokens': len(self._postings),
+                    'postings': sum(len(postings) for postings in self._postings.values())}
+
+    def __len__(self):
+        return len(self._stamps)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'ChangelogTextIndex(entries=' + repr(len(self)) + ', tokens=' + repr(len(self._postings)) + ')'
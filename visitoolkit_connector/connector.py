@@ -61,21 +61,49 @@ If not, see <http://www.gnu.org/licenses/>.
 
 
 
+import array
 import json
 import time
 import uuid
 import websocket
 import _thread
 import threading
+import collections
 import collections.abc
+import concurrent.futures
 from collections import namedtuple
 import dateutil.parser
 import logging
 import queue
+import datetime
+import asyncio
+import math
 
 # lightweight event handling with homegrew EventSystem()
 from visitoolkit_eventsystem import eventsystem
 
+# parts of DMSClient in own modules
+# (imported names are kept in this module for compatibility with older code)
+from visitoolkit_connector.profiler import _HandlerStats, _HandlerProfiler
+from visitoolkit_connector.profiler import PROFILER_MIN_SECS, PROFILER_BUCKET_FACTOR, PROFILER_NOF_BUCKETS
+from visitoolkit_connector.coroutines import _CoroutineRunner, ASYNC_CALLBACK_CONCURRENCY
+from visitoolkit_connector.deflate import _PerMessageDeflate
+from visitoolkit_connector.deflate import DEFLATE_COMPRESSION_LEVEL, DEFLATE_MIN_SIZE, DEFLATE_MIN_WEBSOCKET_VERSION
+from visitoolkit_connector.transport import _WebSocketTransport, _HttpTransport, HTTP_POOL_SIZE
+from visitoolkit_connector.extinfos import _ExtInfosCache, EXTINFOS_CACHE_SIZE
+from visitoolkit_connector.pipeline import EventPipeline, _PipelineTimer, _PipelineStage
+from visitoolkit_connector.poll import PollJob, _PollScheduler, POLL_TICK_SECS, POLL_MAX_BATCH, POLL_WORKERS
+from visitoolkit_connector.pending import _PendingResponseTable, _PendingSweeper
+from visitoolkit_connector.pending import PENDING_SWEEP_INTERVAL, PENDING_FINISHED_TAGS_SIZE
+from visitoolkit_connector.eventqueue import _EventQueue, EVENTQUEUE_PUT_TIMEOUT
+from visitoolkit_connector.eventqueue import OVERFLOW_BLOCK, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST, OVERFLOW_CONFLATE
+
+# optional dependency for vectorized processing of trend data
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
 
 DEBUGGING = False
 
@@ -114,6 +142,38 @@ DMS_BASEPATH = "/json_data" # default for HTTP and WebSocket
 # default timeout in seconds for DMS JSON Data Exchange requests
 REQ_TIMEOUT = 300
 
+# maximum seconds a request waits for establishment of WebSocket connection (shorter request timeouts win)
+WS_CONNECT_TIMEOUT = 60
+
+# changelog entries as compact records (Changelog_entry, Changelog_alarm_entry) instead of dictionaries
+# =>records need much less memory with huge changelogs, but they are no dict:
+#   json.dumps() needs entry.as_dict(), isinstance(entry, dict) is False
+#   (set it before creating DMSClient: decoder processes of DECODE_PROCESS get a copy of it)
+CHANGELOG_RECORDS = False
+
+# trendpoints of HistData_detail() as compact records (Trendpoint_entry) instead of Trendpoint_dict objects
+# =>same trade-off as CHANGELOG_RECORDS, additionally records have fixed fields: they reject unknown keys
+TREND_RECORDS = False
+
+# decoding of frames received from DMS (parameter "decode_mode" of DMSClient):
+DECODE_INLINE  = 'inline'   # in websocket thread (no other frames are received while decoding)
+DECODE_THREAD  = 'thread'   # in a background thread
+DECODE_PROCESS = 'process'  # big frames in a pool of worker processes (e.g. for huge "histData" responses)
+# in mode DECODE_PROCESS: smaller frames (number of characters) are decoded in background thread,
+# sending them to a worker process would cost more than decoding
+DECODE_PROCESS_MINSIZE = 65536
+
+# shared copies of path strings and other repeated strings in responses and DMS-events:
+# maximum number of strings in intern table (table starts over when it's full, 0 disables interning)
+PATH_INTERN_TABLE_SIZE = 1048576
+
+# alignment of trend data (DMSClient.fetch_aligned()): number of concurrent "histData" requests
+ALIGN_MAX_WORKERS = 8
+# filling methods of grid points between trendpoints
+ALIGN_FILL_FFILL = 'ffill'      # last trendpoint before grid point (step function, like DMS trend viewer)
+ALIGN_FILL_LINEAR = 'linear'    # linear interpolation between neighbouring trendpoints
+ALIGN_FILL_NONE = None          # last trendpoint in interval (grid point - step, grid point], otherwise NaN
+
 # Python callbacks fired by monitored DMS datapoints (DMS-Events),
 # via thread _SubscriptionES_Dispatcher:
 # log a warning if callback execution duration is too long
@@ -122,7 +182,8 @@ CALLBACK_DURATION_WARNLEVEL = 10
 # log a warning if too many unprocessed events are waiting
 # (number of queue elements)
 EVENTQUEUE_WARNSIZE = 100
-
+# maximum time in seconds the dispatcher waits on event queue before checking it's exit flag
+DISPATCHER_GET_TIMEOUT = 0.1
 
 
 # constants for retrieving extended infos ("extInfos")
@@ -186,11 +247,12 @@ class _Mydict(collections.abc.MutableMapping):
         # get's called when attribute isn't found
         # =>convenient way for retrieving element from dictionary!
         # https://stackoverflow.com/questions/2405590/how-do-i-override-getattr-in-python-without-breaking-the-default-behavior
+        # (lookup in __dict__: during unpickling "_values_dict" doesn't exist yet, this would lead to endless recursion)
         try:
-            return self._values_dict[name]
+            return self.__dict__['_values_dict'][name]
         except KeyError:
             # Default behaviour
-            raise AttributeError
+            raise AttributeError(name)
 
     def __repr__(self):
         """ developer representation of this object """
@@ -231,8 +293,104 @@ class _Mylist(collections.abc.Sequence):
         return self._values_list
 
 
+class _InternTable(object):
+    """ bounded table of shared string objects """
+    # =>every response and DMS-event gets it's own copy of path strings from JSON decoder,
+    #   with a shared copy all equal strings in memory are one object
+    # =>unlike sys.intern() memory is bounded: when table is full it starts over
+    #   (strings already shared stay shared, only new strings get a new shared copy)
+
+    def __init__(self, maxsize=PATH_INTERN_TABLE_SIZE):
+        self.maxsize = maxsize
+        self._table = {}
+        self.nof_resets = 0
+
+    def intern(self, val):
+        shared = self._table.get(val, None)
+        if shared is None:
+            if not self.maxsize:
+                return val
+            if len(self._table) >= self.maxsize:
+                self._table = {}
+                self.nof_resets += 1
+            # (another thread could have inserted same string meanwhile, both copies are valid)
+            shared = self._table.setdefault(val, val)
+        return shared
+
+    def clear(self):
+        self._table = {}
+
+    def get_stats(self):
+        """ returns dictionary with size and number of resets """
+        return {'size': len(self._table),
+                'maxsize': self.maxsize,
+                'resets': self.nof_resets}
+
+
+_path_intern_table = _InternTable()
+
+
+def intern_str(val):
+    """ returns shared copy of a string (other objects are returned unchanged) """
+    if val.__class__ is str:
+        return _path_intern_table.intern(val)
+    return val
+
+
+
+class _Record(collections.abc.MutableMapping):
+    """ superclass of compact records with fixed fields """
+    # =>subclasses define their fields in "_fields" and "__slots__": instances have no dictionary,
+    #   all of them share one memory layout (important for huge amount of trendpoints and changelog entries)
+    # =>access is possible like a dictionary and with attributes, as in _Mydict
+    __slots__ = ()
+    _fields = ()
+
+    def __init__(self, **kwargs):
+        for field in self._fields:
+            setattr(self, field, kwargs.get(field, None))
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, val):
+        if key in self._fields:
+            setattr(self, key, val)
+        else:
+            raise KeyError('field "' + str(key) + '" is illegal in ' + self.__class__.__name__)
+
+    def __delitem__(self, key):
+        raise TypeError('fields of ' + self.__class__.__name__ + ' are fixed')
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return self.__class__.__name__ + '(' + ', '.join('%s=%s' % (k, repr(getattr(self, k))) for k in self._fields) + ')'
+
+    def __str__(self):
+        return str(self.as_dict())
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in self._fields}
+
+    def copy(self):
+        """ shallow copy as dictionary (as dict.copy() of plain dictionaries) """
+        return self.as_dict()
+
+
+
 class _Request(object):
     """ one JSON request containing DMS commands """
+    # command types without side effects in DMS (request can be repeated safely)
+    READ_ONLY_CMD_TYPES = ('get', 'changelogGetGroups', 'changelogRead')
+
     def __init__(self, whois, user):
         self.whois = '' + whois
         self.user = '' + user
@@ -253,6 +411,9 @@ class _Request(object):
             self._cmd_tags_list.append(cmd.tag)
         return self
 
+    def is_read_only(self):
+        return all(cmd_type in _Request.READ_ONLY_CMD_TYPES for cmd_type in self._cmd_dict)
+
     def as_dict(self):
         # building complete request
         # (all request commands contain a list of commands,
@@ -406,9 +567,9 @@ class _CmdGet(object):
                     showExtInfos_int = int(showExtInfos)
                     assert showExtInfos_int > 0 and showExtInfos_int <= INFO_ALL, 'field "showExtInfos" excepts integer constant, got illegal value "' + str(showExtInfos_int) + '"'
                     self.showExtInfos = self.showExtInfos_as_strlist(showExtInfos_int)
-                except ValueError:
+                except (TypeError, ValueError):
                     # assumption: it's already a list of strings
-                    self.showExtInfos = [].extend(showExtInfos)
+                    self.showExtInfos = list(showExtInfos)
             elif key == 'query':
                 self.query = kwargs.pop(key)
                 assert type(self.query) is Query, 'field "query" expects "Query" object, got "' + str(type(self.query)) + '" instead'
@@ -613,7 +774,7 @@ class _CmdSub(object):
                                      (ON_SET, DMSEvent.CODE_SET),
                                      (ON_CREATE, DMSEvent.CODE_CREATE),
                                      (ON_RENAME, DMSEvent.CODE_RENAME),
-                                     (ON_DELETE, DMSEvent.CODE_RENAME)]:
+                                     (ON_DELETE, DMSEvent.CODE_DELETE)]:
                 if code_int & val_int:
                     # flag is set
                     strings_list.append(val_str)
@@ -755,16 +916,60 @@ class ExtInfos(_Mydict):
 
         for field in ExtInfos._fields:
             try:
-                # all fields are strings.
-                # default: no special treatment
-                self._values_dict[field] = kwargs[field]
+                # all fields are strings, repeated in many responses
+                self._values_dict[field] = intern_str(kwargs[field])
             except KeyError:
                 # argument was not in response =>setting default value
                 self._values_dict[field] = None
 
 
 
-class HistData_detail(_Mylist):
+# one trendpoint in HistData_compact()
+# allowing attribute-access to items, based on example from
+# https://docs.python.org/3/library/collections.html#collections.namedtuple
+# (defined on module level: instances have to be picklable for decoding in worker processes)
+Trendpoint_tuple = namedtuple(typename='Trendpoint_tuple', field_names=['stamp', 'value'])
+
+
+def parse_stamp(stamp_str):
+    """ ISO 8601 timestamp from DMS -> datetime.datetime (None stays None) """
+    # fast path: datetime.fromisoformat() (DMS uses comma as decimal sign, older Python versions only accept a dot),
+    # other variants of ISO 8601 are parsed by dateutil (raises ValueError when it's no timestamp)
+    if stamp_str is None:
+        return None
+    try:
+        return datetime.datetime.fromisoformat(stamp_str.replace(',', '.', 1))
+    except ValueError:
+        return dateutil.parser.parse(stamp_str)
+
+
+
+class Trendpoint_dict(_Mydict):
+    """ one trendpoint in HistData_detail() """
+    # allowing access to items as attributes: storing items in _Mydict's
+    # (we have to implement a concrete class for getting right class name in __repr__())
+    def __init__(self, **kwargs):
+        super(Trendpoint_dict, self).__init__(**kwargs)
+
+
+class Trendpoint_entry(_Record):
+    """ one trendpoint in HistData_detail() with TREND_RECORDS=True """
+    _fields = __slots__ = ('stamp', 'value', 'state', 'rec')
+
+
+
+class _HistData(_Mylist):
+    """ common superclass of trend data containers """
+
+    def aggregate(self, interval_secs, origin=0.0, end=None):
+        """ time-bucketed aggregation of all trendpoints, returns HistData_aggregated() """
+        aggregator = TrendAggregator(interval_secs=interval_secs, origin=origin)
+        aggregator.add(self._values_list)
+        return aggregator.result(end=end)
+
+
+
+class HistData_detail(_HistData):
     """ from DMS: optional history data in detailed format """
 
     _fields = ('stamp',
@@ -774,30 +979,23 @@ class HistData_detail(_Mylist):
 
     def __init__(self, histobj_list):
         super(HistData_detail, self).__init__()
-        # internal storage: list of dictionarys
-
-        # allowing access to items as attributes: storing items in _Mydict's
-        # (we have to implement a concrete class for getting right class name in __repr__())
-        class Trendpoint_dict(_Mydict):
-            def __init__(self, **kwargs):
-                super(Trendpoint_dict, self).__init__(**kwargs)
-
+        # internal storage: list of Trendpoint_dict (or Trendpoint_entry records, look in TREND_RECORDS)
+        trendpoint_cls = Trendpoint_entry if TREND_RECORDS else Trendpoint_dict
 
         for histobj in histobj_list:
 
-            curr_dict = Trendpoint_dict()
+            curr_dict = trendpoint_cls()
             for field in HistData_detail._fields:
                 if field == 'stamp':
                     # timestamps are ISO 8601 formatted (or "null" after DMS restart or on nodes with type "none")
                     # https://stackoverflow.com/questions/969285/how-do-i-translate-a-iso-8601-datetime-string-into-a-python-datetime-object
                     try:
-                        curr_dict[field] = dateutil.parser.parse(histobj[field])
+                        curr_dict[field] = parse_stamp(histobj[field])
                     except ValueError:
                         # something went wrong, conversion into a datetime.datetime() object isn't possible
                         logger.exception('constructor of HistData_detail(): ERROR: timestamp in current response could not get parsed as valid datetime.datetime() object!')
                         curr_dict[field] = None
-                else:
-                    # other fields are number or string, currently no special treatment
+                elif field == 'value':
                     try:
                         curr_dict[field] = histobj[field]
                     except KeyError:
@@ -805,6 +1003,13 @@ class HistData_detail(_Mylist):
                         logger.exception('constructor of HistData_detail(): ERROR: mandatory field "' + field + '" is missing in current response!')
                         # argument was not in response =>setting default value
                         curr_dict[field] = None
+                else:
+                    # "state" and "rec" are repeated in most trendpoints
+                    try:
+                        curr_dict[field] = intern_str(histobj[field])
+                    except KeyError:
+                        logger.exception('constructor of HistData_detail(): ERROR: mandatory field "' + field + '" is missing in current response!')
+                        curr_dict[field] = None
             # save current dict, begin a new one
             self._values_list.append(curr_dict)
             curr_dict = {}
@@ -817,7 +1022,7 @@ class HistData_detail(_Mylist):
 
 
 
-class HistData_compact(_Mylist):
+class HistData_compact(_HistData):
     """ from DMS: optional history data in compact format """
 
     def __init__(self, histobj_list):
@@ -832,16 +1037,13 @@ class HistData_compact(_Mylist):
             # timestamps are ISO 8601 formatted (or "null" after DMS restart or on nodes with type "none")
             # https://stackoverflow.com/questions/969285/how-do-i-translate-a-iso-8601-datetime-string-into-a-python-datetime-object
             try:
-                stamp = dateutil.parser.parse(stamp_str)
+                stamp = parse_stamp(stamp_str)
             except ValueError:
                 # something went wrong, conversion into a datetime.datetime() object isn't possible
                 logger.exception('constructor of HistData_compact(): ERROR: timestamp in current response could not get parsed as valid datetime.datetime() object!')
                 stamp = None
 
-            # allowing attribute-access to items, based on example from
-            # https://docs.python.org/3/library/collections.html#collections.namedtuple
-            Trendpoint = namedtuple(typename='Trendpoint_tuple', field_names=['stamp', 'value'])
-            self._values_list.append(Trendpoint(stamp, value))
+            self._values_list.append(Trendpoint_tuple(stamp, value))
 
 
     def __repr__(self):
@@ -851,46 +1053,447 @@ class HistData_compact(_Mylist):
 
 
 
+# one aggregated time bucket in HistData_aggregated()
+# (field "twa" is time-weighted average: every value is valid until next trendpoint)
+TrendAggregate_tuple = namedtuple(typename='TrendAggregate_tuple',
+                                  field_names=['stamp', 'count', 'min', 'max', 'mean', 'sum', 'first', 'last', 'twa'])
+
+
+class HistData_aggregated(_Mylist):
+    """ time-bucketed aggregation of trend data (built by TrendAggregator) """
+
+    def __init__(self, aggregates_list):
+        super(HistData_aggregated, self).__init__()
+        # internal storage: list of TrendAggregate_tuple
+        self._values_list = aggregates_list
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'HistData_aggregated([' + ', '.join(map(repr, self._values_list)) + '])'
+
+
+
+class TrendAggregator(object):
+    """ incremental time-bucketed aggregation of trendpoints (min, max, mean, sum, count, first, last, twa) """
+    # =>add() accepts chunks of trendpoints in chronological order (e.g. from windowed "histData" requests),
+    #   result() can be called at any time, aggregation continues with next add()
+    # =>uses NumPy when available, pure Python otherwise
+    # =>values which aren't numbers (e.g. strings or "null") are ignored
+
+    # indices in list of one bucket
+    _COUNT, _SUM, _MIN, _MAX, _FIRST, _LAST, _TW_SUM, _TW_SECS = range(8)
+
+    def __init__(self, interval_secs, origin=0.0):
+        self.interval_secs = float(interval_secs)
+        assert self.interval_secs > 0, 'interval of aggregation has to be greater than zero'
+        # buckets begin at "origin" (seconds since epoch) plus multiples of interval
+        self.origin = float(origin)
+
+        # dict of buckets (key: begin of bucket in seconds since epoch, value: list with all accumulators)
+        self._buckets = {}
+
+        # last trendpoint as tuple (seconds since epoch, value): it's valid until next trendpoint arrives
+        self._last_point = None
+        self._tzinfo = None
+
+
+    def _get_bucket(self, secs):
+        return math.floor((secs - self.origin) / self.interval_secs) * self.interval_secs + self.origin
+
+
+    def add(self, trendpoints):
+        """ add a chunk of trendpoints (objects with attributes "stamp" and "value") """
+        stamps = []
+        values = []
+        for trendpoint in trendpoints:
+            if trendpoint.stamp is None:
+                continue
+            try:
+                val = float(trendpoint.value)
+            except (TypeError, ValueError):
+                continue
+            if self._tzinfo is None:
+                self._tzinfo = trendpoint.stamp.tzinfo
+            stamps.append(trendpoint.stamp.timestamp())
+            values.append(val)
+        if not stamps:
+            return
+
+        if self._last_point and stamps[0] < self._last_point[0]:
+            logger.warning('TrendAggregator.add(): trendpoints are not in chronological order, time-weighted average could be wrong...')
+
+        if numpy is not None:
+            self._add_numpy(stamps, values)
+        else:
+            self._add_python(stamps, values)
+
+
+    def _add_python(self, stamps, values):
+        # pure Python: one loop over all trendpoints
+        for secs, val in sorted(zip(stamps, values), key=lambda item: item[0]):
+            bucket = self._get_bucket(secs)
+            self._merge_bucket(bucket, 1, val, val, val, val, val)
+            if self._last_point:
+                self._add_segment(self._last_point[0], secs, self._last_point[1])
+            self._last_point = (secs, val)
+
+
+    def _add_numpy(self, stamps, values):
+        # vectorized: reductions per bucket, loops only over number of buckets
+        secs = numpy.asarray(stamps, dtype=numpy.float64)
+        vals = numpy.asarray(values, dtype=numpy.float64)
+        order = numpy.argsort(secs, kind='stable')
+        secs = secs[order]
+        vals = vals[order]
+
+        buckets = numpy.floor((secs - self.origin) / self.interval_secs) * self.interval_secs + self.origin
+        starts = numpy.concatenate(([0], numpy.flatnonzero(numpy.diff(buckets)) + 1))
+        ends = numpy.append(starts[1:], len(secs))
+        counts = ends - starts
+        sums = numpy.add.reduceat(vals, starts)
+        mins = numpy.minimum.reduceat(vals, starts)
+        maxs = numpy.maximum.reduceat(vals, starts)
+
+        # time-weighting: value of every trendpoint is valid until next trendpoint
+        # (segment of last trendpoint in this chunk stays open)
+        if self._last_point:
+            self._add_segment(self._last_point[0], float(secs[0]), self._last_point[1])
+        durations = numpy.diff(secs)
+        seg_begin_buckets = buckets[:-1]
+        inside = secs[1:] <= seg_begin_buckets + self.interval_secs
+        group_ids = numpy.repeat(numpy.arange(len(starts)), counts)[:-1]
+        tw_sums = numpy.bincount(group_ids, weights=numpy.where(inside, vals[:-1] * durations, 0.0), minlength=len(starts))
+        tw_secs = numpy.bincount(group_ids, weights=numpy.where(inside, durations, 0.0), minlength=len(starts))
+        for idx in numpy.flatnonzero(~inside):
+            # rare case: segment spans more than one bucket
+            self._add_segment(float(secs[idx]), float(secs[idx + 1]), float(vals[idx]))
+
+        for idx in range(len(starts)):
+            self._merge_bucket(float(buckets[starts[idx]]),
+                               int(counts[idx]),
+                               float(sums[idx]),
+                               float(mins[idx]),
+                               float(maxs[idx]),
+                               float(vals[starts[idx]]),
+                               float(vals[ends[idx] - 1]),
+                               float(tw_sums[idx]),
+                               float(tw_secs[idx]))
+        self._last_point = (float(secs[-1]), float(vals[-1]))
+
+
+    def _merge_bucket(self, bucket, count, sum_val, min_val, max_val, first_val, last_val, tw_sum=0.0, tw_secs=0.0):
+        curr = self._buckets.get(bucket, None)
+        if curr is None:
+            self._buckets[bucket] = [count, sum_val, min_val, max_val, first_val, last_val, tw_sum, tw_secs]
+        elif curr[TrendAggregator._COUNT] == 0:
+            # bucket was created by time-weighting, these are it's first own trendpoints
+            curr[TrendAggregator._COUNT:TrendAggregator._TW_SUM] = [count, sum_val, min_val, max_val, first_val, last_val]
+            curr[TrendAggregator._TW_SUM] += tw_sum
+            curr[TrendAggregator._TW_SECS] += tw_secs
+        else:
+            curr[TrendAggregator._COUNT] += count
+            curr[TrendAggregator._SUM] += sum_val
+            curr[TrendAggregator._MIN] = min(curr[TrendAggregator._MIN], min_val)
+            curr[TrendAggregator._MAX] = max(curr[TrendAggregator._MAX], max_val)
+            curr[TrendAggregator._LAST] = last_val
+            curr[TrendAggregator._TW_SUM] += tw_sum
+            curr[TrendAggregator._TW_SECS] += tw_secs
+
+
+    def _add_segment(self, begin_secs, end_secs, val, buckets_dict=None):
+        # distribute time-weighted value of one segment over all touched buckets
+        if buckets_dict is None:
+            buckets_dict = self._buckets
+        curr_secs = begin_secs
+        while curr_secs < end_secs:
+            bucket = self._get_bucket(curr_secs)
+            next_secs = min(bucket + self.interval_secs, end_secs)
+            if bucket not in buckets_dict:
+                # bucket without own trendpoints
+                buckets_dict[bucket] = [0, 0.0, None, None, None, None, 0.0, 0.0]
+            buckets_dict[bucket][TrendAggregator._TW_SUM] += val * (next_secs - curr_secs)
+            buckets_dict[bucket][TrendAggregator._TW_SECS] += next_secs - curr_secs
+            curr_secs = next_secs
+
+
+    def result(self, end=None):
+        """ returns HistData_aggregated() with all buckets until now """
+        # last trendpoint is valid until end of it's bucket (or until "end")
+        buckets_dict = {bucket: list(curr) for bucket, curr in self._buckets.items()}
+        if self._last_point:
+            last_secs, last_val = self._last_point
+            if end is None:
+                end_secs = self._get_bucket(last_secs) + self.interval_secs
+            else:
+                try:
+                    end_secs = end.timestamp()
+                except AttributeError:
+                    # now we assume it's already in seconds since epoch
+                    end_secs = float(end)
+            self._add_segment(last_secs, end_secs, last_val, buckets_dict=buckets_dict)
+
+        aggregates_list = []
+        for bucket in sorted(buckets_dict):
+            count, sum_val, min_val, max_val, first_val, last_val, tw_sum, tw_secs = buckets_dict[bucket]
+            aggregates_list.append(TrendAggregate_tuple(stamp=datetime.datetime.fromtimestamp(bucket, tz=self._tzinfo),
+                                                        count=count,
+                                                        min=min_val,
+                                                        max=max_val,
+                                                        mean=sum_val / count if count else None,
+                                                        sum=sum_val,
+                                                        first=first_val,
+                                                        last=last_val,
+                                                        twa=tw_sum / tw_secs if tw_secs else None))
+        return HistData_aggregated(aggregates_list)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'TrendAggregator(interval_secs=' + repr(self.interval_secs) + ', origin=' + repr(self.origin) + ')'
+
+
+
+def _trend_as_arrays(trendpoints):
+    # trendpoints -> (seconds since epoch, values as float) sorted by time, skipping trendpoints without number
+    stamps = []
+    values = []
+    for trendpoint in trendpoints:
+        if trendpoint.stamp is None:
+            continue
+        try:
+            val = float(trendpoint.value)
+        except (TypeError, ValueError):
+            continue
+        stamps.append(trendpoint.stamp.timestamp())
+        values.append(val)
+    if stamps and any(stamps[idx] > stamps[idx + 1] for idx in range(len(stamps) - 1)):
+        stamps, values = (list(item) for item in zip(*sorted(zip(stamps, values), key=lambda item: item[0])))
+    return stamps, values
+
+
+def _resample_numpy(stamps, values, grid, step_secs, fill):
+    # vectorized: binary search of all grid points at once
+    secs = numpy.asarray(stamps, dtype=numpy.float64)
+    vals = numpy.asarray(values, dtype=numpy.float64)
+    if not len(secs):
+        return numpy.full(len(grid), numpy.nan)
+    if fill == ALIGN_FILL_LINEAR:
+        return numpy.interp(grid, secs, vals, left=numpy.nan, right=numpy.nan)
+    idx = numpy.searchsorted(secs, grid, side='right') - 1
+    valid = idx >= 0
+    if fill == ALIGN_FILL_NONE:
+        valid &= secs[numpy.maximum(idx, 0)] > grid - step_secs
+    return numpy.where(valid, vals[numpy.maximum(idx, 0)], numpy.nan)
+
+
+def _resample_python(stamps, values, grid, step_secs, fill):
+    # pure Python: grid and trendpoints are sorted, one merge loop over both
+    result = []
+    idx = -1
+    nof_points = len(stamps)
+    for grid_secs in grid:
+        while idx + 1 < nof_points and stamps[idx + 1] <= grid_secs:
+            idx += 1
+        if idx < 0:
+            result.append(math.nan)
+        elif fill == ALIGN_FILL_LINEAR:
+            if stamps[idx] == grid_secs:
+                result.append(values[idx])
+            elif idx + 1 < nof_points:
+                ratio = (grid_secs - stamps[idx]) / (stamps[idx + 1] - stamps[idx])
+                result.append(values[idx] + ratio * (values[idx + 1] - values[idx]))
+            else:
+                result.append(math.nan)
+        elif fill == ALIGN_FILL_NONE and stamps[idx] <= grid_secs - step_secs:
+            result.append(math.nan)
+        else:
+            result.append(values[idx])
+    return result
+
+
+
+class AlignedTrends(object):
+    """ trend data of many datapoints on a common timeline (result of DMSClient.fetch_aligned()) """
+    # =>"values" is a matrix with one row per grid point and one column per datapoint (NaN: no value),
+    #   numpy.ndarray when NumPy is available, otherwise list of lists
+    # =>"stamps" are seconds since epoch of all grid points, get_datetimes() for datetime.datetime objects
+
+    def __init__(self, paths, stamps, values, tzinfo=None, errors=None):
+        self.paths = list(paths)
+        self.stamps = stamps
+        self.values = values
+        self.tzinfo = tzinfo
+        # dictionary path -> exception of all failed requests (their columns contain only NaN)
+        self.errors = errors or {}
+
+    def get_datetimes(self):
+        return [datetime.datetime.fromtimestamp(secs, tz=self.tzinfo) for secs in self.stamps]
+
+    def column(self, path):
+        """ all values of one datapoint """
+        col_idx = self.paths.index(path)
+        if numpy is not None and isinstance(self.values, numpy.ndarray):
+            return self.values[:, col_idx]
+        return [row[col_idx] for row in self.values]
+
+    def iter_rows(self):
+        """ generator: tuples (datetime.datetime, value of every datapoint) """
+        for stamp, row in zip(self.get_datetimes(), self.values):
+            yield (stamp, ) + tuple(row)
+
+    def as_dict(self):
+        """ dictionary column -> list of values ("stamp" and one column per datapoint, e.g. for pandas.DataFrame) """
+        result = {'stamp': self.get_datetimes()}
+        for path in self.paths:
+            result[path] = list(self.column(path))
+        return result
+
+    def to_dataframe(self):
+        """ pandas.DataFrame with datetime index and one column per datapoint (needs pandas) """
+        # (optional dependency, only imported when needed)
+        import pandas
+        return pandas.DataFrame(self.values, index=pandas.DatetimeIndex(self.get_datetimes(), name='stamp'), columns=self.paths)
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'AlignedTrends(paths=' + repr(len(self.paths)) + ', stamps=' + repr(len(self.stamps)) + ', errors=' + repr(len(self.errors)) + ')'
+
+
+def fetch_aligned(client, paths, start, end, step, fill=ALIGN_FILL_FFILL, max_workers=ALIGN_MAX_WORKERS, timeout=REQ_TIMEOUT, lookback=None):
+    """ fetching trend data of many datapoints concurrently, resampled onto common grid, returns AlignedTrends """
+    # (used by DMSClient.fetch_aligned() and DMSHttpClient.fetch_aligned())
+    # start, end: datetime.datetime (grid points: start, start + step, ... until end, inclusive)
+    # step: seconds or datetime.timedelta
+    # lookback: seconds or datetime.timedelta of trend data before "start" for seeding the fill of first grid points
+    #   (default: one step), grid points before first trendpoint in this range stay NaN,
+    #   linear interpolation reads the same range after "end", too
+    # =>every trend is resampled into it's column as soon as it arrives and dropped afterwards,
+    #   memory is bounded by size of result plus "max_workers" trends in flight
+    assert fill in (ALIGN_FILL_FFILL, ALIGN_FILL_LINEAR, ALIGN_FILL_NONE), 'unknown fill method "' + str(fill) + '"'
+    try:
+        step_secs = step.total_seconds()
+    except AttributeError:
+        step_secs = float(step)
+    assert step_secs > 0, 'step of grid has to be greater than zero'
+    if lookback is None:
+        lookback_secs = step_secs
+    else:
+        try:
+            lookback_secs = lookback.total_seconds()
+        except AttributeError:
+            lookback_secs = float(lookback)
+    hist_start = start - datetime.timedelta(seconds=lookback_secs)
+    hist_end = end + datetime.timedelta(seconds=lookback_secs) if fill == ALIGN_FILL_LINEAR else end
+    paths = list(paths)
+    start_secs = start.timestamp()
+    nof_stamps = int(math.floor((end.timestamp() - start_secs) / step_secs)) + 1
+    if numpy is not None:
+        grid = start_secs + numpy.arange(nof_stamps, dtype=numpy.float64) * step_secs
+        values = numpy.full((nof_stamps, len(paths)), numpy.nan)
+    else:
+        grid = [start_secs + idx * step_secs for idx in range(nof_stamps)]
+        values = [[math.nan] * len(paths) for _ in range(nof_stamps)]
+
+    def fetch(path):
+        # runs in worker thread
+        response = client.dp_get(path, timeout=timeout, histData=HistData(start=hist_start, end=hist_end, format='compact'))[0]
+        if response['code'] != _Response.CODE_OK:
+            raise IOError('DMS returned code "' + str(response['code']) + '" with message "' + str(response['message']) + '"')
+        return _trend_as_arrays(response['histData'] or [])
+
+    errors = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch, path): col_idx for col_idx, path in enumerate(paths)}
+        for future in concurrent.futures.as_completed(futures):
+            col_idx = futures.pop(future)
+            try:
+                stamps, trend_values = future.result()
+            except Exception as ex:
+                logger.error('fetch_aligned(): fetching trend data of "' + paths[col_idx] + '" failed: ' + repr(ex))
+                errors[paths[col_idx]] = ex
+                continue
+            if numpy is not None:
+                values[:, col_idx] = _resample_numpy(stamps, trend_values, grid, step_secs, fill)
+            else:
+                for row, val in zip(values, _resample_python(stamps, trend_values, grid, step_secs, fill)):
+                    row[col_idx] = val
+    return AlignedTrends(paths=paths, stamps=grid, values=values, tzinfo=start.tzinfo, errors=errors)
+
+
+
+class Changelog_entry(_Record):
+    """ one entry in Changelog_Protocol() with CHANGELOG_RECORDS=True """
+    _fields = __slots__ = ('path', 'stamp', 'text')
+
+
+class Changelog_alarm_entry(_Record):
+    """ one entry in Changelog_Alarm() with CHANGELOG_RECORDS=True """
+    _fields = __slots__ = ('path', 'stamp', 'text',
+                           'state', 'priority', 'priorityBACnet', 'alarmGroup', 'alarmCollectGroup', 'siteGroup', 'screen')
+
+
+
+def _stamp_as_secs(stamp):
+    # datetime.datetime -> seconds since epoch (NaN when timestamp is unknown)
+    if stamp is None:
+        return math.nan
+    return stamp.timestamp()
+
+
+
 class Changelog_Protocol(_Mylist):
     """ from DMS: optional protocol data about datapoint """
 
     _fields = ('path',
                'stamp',
                'text')
+
+    # class of entries
+    _entry_cls = Changelog_entry
+
     def __init__(self, obj_list):
         super(Changelog_Protocol, self).__init__()
-        # internal storage: list of dictionarys
+        # internal storage: list of dictionaries (or Changelog_entry records, look in CHANGELOG_RECORDS)
+        # =>single pass: every JSON-object is parsed into one entry with all it's fields
+        parse_entry = self._parse_entry
+        self._values_list = [parse_entry(obj) for obj in obj_list]
+
+    def _parse_entry(self, obj):
+        # dictionary (as in previous versions) or compact record, look in CHANGELOG_RECORDS
+        fields_dict = self._parse_fields(obj)
+        if CHANGELOG_RECORDS:
+            return self._entry_cls(**fields_dict)
+        return fields_dict
+
+    def _parse_fields(self, obj):
+        fields_dict = {}
+
+        # timestamps are ISO 8601 formatted (or "null" after DMS restart or on nodes with type "none")
+        try:
+            fields_dict['stamp'] = parse_stamp(obj['stamp'])
+        except (KeyError, ValueError, TypeError):
+            # something went wrong, conversion into a datetime.datetime() object isn't possible
+            logger.exception('constructor of Changelog_Protocol(): ERROR: timestamp in current response could not get parsed as valid datetime.datetime() object!')
+            fields_dict['stamp'] = None
 
-        for obj in obj_list:
-            curr_dict = {}
-            for field in Changelog_Protocol._fields:
-                if field == 'stamp':
-                    # timestamps are ISO 8601 formatted (or "null" after DMS restart or on nodes with type "none")
-                    # https://stackoverflow.com/questions/969285/how-do-i-translate-a-iso-8601-datetime-string-into-a-python-datetime-object
-                    try:
-                        curr_dict[field] = dateutil.parser.parse(obj[field])
-                    except ValueError:
-                        # something went wrong, conversion into a datetime.datetime() object isn't possible
-                        logger.exception('constructor of Changelog_Protocol(): ERROR: timestamp in current response could not get parsed as valid datetime.datetime() object!')
-                        curr_dict[field] = None
-                elif field == 'path':
-                    # path is optional when only one datapoint was requested
-                    if 'path' in obj:
-                        curr_dict[field] = obj[field]
-                    else:
-                        curr_dict[field] = None
-                else:
-                    # other fields are string, currently no special treatment
-                    try:
-                        curr_dict[field] = obj[field]
-                    except KeyError:
-                        # something went wrong, a mandatory field is missing...
-                        logger.exception('constructor of Changelog_Protocol(): ERROR: mandatory field "' + field + '" is missing in current response!')
-                        # argument was not in response =>setting default value
-                        curr_dict[field] = None
-            # save current dict, begin a new one
-            self._values_list.append(curr_dict)
-            curr_dict = {}
+        # path is optional when only one datapoint was requested
+        fields_dict['path'] = intern_str(obj['path']) if 'path' in obj else None
+
+        # other fields are string, currently no special treatment
+        try:
+            fields_dict['text'] = obj['text']
+        except KeyError:
+            # something went wrong, a mandatory field is missing...
+            logger.exception('constructor of Changelog_Protocol(): ERROR: mandatory field "text" is missing in current response!')
+            # argument was not in response =>setting default value
+            fields_dict['text'] = None
+        return fields_dict
+
+    def as_batch(self, path=None):
+        """ returns content as ChangelogBatch (path: default for entries without path) """
+        return ChangelogBatch.from_changelog(self, path=path)
 
 
 class Changelog_Alarm(Changelog_Protocol):
@@ -904,37 +1507,38 @@ class Changelog_Alarm(Changelog_Protocol):
                'siteGroup',
                'screen')
 
-    def __init__(self, obj_list):
-        super(Changelog_Alarm, self).__init__(obj_list)
-        # internal storage: list of dictionarys
+    # values as numbers
+    _int_fields = ('priority',
+                   'priorityBACnet',
+                   'alarmGroup',
+                   'alarmCollectGroup',
+                   'siteGroup')
 
-        # looping again through list of objects for alarm data,
-        # appending additional key/value pairs into internal list of dictionarys
-        for idx, obj in enumerate(obj_list):
-            curr_dict = {}
-            for field in Changelog_Alarm._fields:
-                if field in ['priority', 'priorityBACnet', 'alarmGroup', 'alarmCollectGroup', 'siteGroup']:
-                    # values as numbers
-                    curr_dict[field] = int(obj[field])
-                elif field == 'screen':
-                    # scada screen name is optional
-                    if 'screen' in obj:
-                        curr_dict[field] = obj[field]
-                    else:
-                        curr_dict[field] = None
-                else:
-                    # other fields are string, currently no special treatment
-                    try:
-                        curr_dict[field] = obj[field]
-                    except KeyError:
-                        # something went wrong, a mandatory field is missing...
-                        logger.exception('constructor of Changelog_Alarm(): ERROR: mandatory field "' + field + '" is missing in current response!')
-                        # argument was not in response =>setting default value
-                        curr_dict[field] = None
-            # save current dict (combine it into existing one already filled by superclass)
-            self._values_list[idx].update(curr_dict)
-            # begin a new one
-            curr_dict = {}
+    # class of entries
+    _entry_cls = Changelog_alarm_entry
+
+    def _parse_fields(self, obj):
+        # protocol fields and alarm fields of same JSON-object are filled into same entry
+        fields_dict = Changelog_Protocol._parse_fields(self, obj)
+
+        for field in Changelog_Alarm._int_fields:
+            try:
+                fields_dict[field] = int(obj[field])
+            except KeyError:
+                # something went wrong, a mandatory field is missing...
+                logger.exception('constructor of Changelog_Alarm(): ERROR: mandatory field "' + field + '" is missing in current response!')
+                fields_dict[field] = None
+
+        # "state" is repeated in most entries
+        try:
+            fields_dict['state'] = intern_str(obj['state'])
+        except KeyError:
+            logger.exception('constructor of Changelog_Alarm(): ERROR: mandatory field "state" is missing in current response!')
+            fields_dict['state'] = None
+
+        # scada screen name is optional
+        fields_dict['screen'] = obj.get('screen', None)
+        return fields_dict
 
     def __repr__(self):
         """ developer representation of this object """
@@ -943,6 +1547,125 @@ class Changelog_Alarm(Changelog_Protocol):
 
 
 
+class ChangelogBatch(object):
+    """ columnar changelog: one column per field instead of one record per entry """
+    # =>timestamps are stored as seconds since epoch in array.array('d') (NaN when unknown),
+    #   alarm columns exist only in batches of alarm changelogs
+    # =>batches of many responses can get combined with extend() (e.g. for storing in changelog.ChangelogStore)
+
+    _protocol_fields = ('path', 'text')
+    _alarm_fields = Changelog_Alarm._fields
+
+    def __init__(self, is_alarm=False):
+        self.is_alarm = is_alarm
+        self.stamps = array.array('d')
+        self.fields = ChangelogBatch._protocol_fields
+        if is_alarm:
+            self.fields = self.fields + ChangelogBatch._alarm_fields
+        self.columns = {field: [] for field in self.fields}
+
+    @classmethod
+    def from_json(cls, obj_list, path=None, is_alarm=None):
+        """ single pass decoding of JSON-objects of a changelog (path: default for entries without path) """
+        if is_alarm is None:
+            # same rule as in RespGet: alarm data contains "state"
+            is_alarm = bool(obj_list) and 'state' in obj_list[0]
+        batch = cls(is_alarm=is_alarm)
+        stamps_append = batch.stamps.append
+        path_append = batch.columns['path'].append
+        text_append = batch.columns['text'].append
+        if is_alarm:
+            alarm_columns = [(field, batch.columns[field].append) for field in ChangelogBatch._alarm_fields]
+        for obj in obj_list:
+            try:
+                stamps_append(_stamp_as_secs(parse_stamp(obj['stamp'])))
+            except (KeyError, ValueError, TypeError):
+                logger.exception('ChangelogBatch.from_json(): ERROR: timestamp in current response could not get parsed!')
+                stamps_append(math.nan)
+            path_append(intern_str(obj.get('path', path)))
+            text_append(obj.get('text', None))
+            if is_alarm:
+                for field, column_append in alarm_columns:
+                    val = obj.get(field, None)
+                    if field in Changelog_Alarm._int_fields and val is not None:
+                        val = int(val)
+                    elif field == 'state':
+                        val = intern_str(val)
+                    column_append(val)
+        return batch
+
+    @classmethod
+    def from_changelog(cls, changelog, path=None):
+        """ columns of an already decoded Changelog_Protocol or Changelog_Alarm (without parsing again) """
+        batch = cls(is_alarm=isinstance(changelog, Changelog_Alarm))
+        batch.stamps.extend(_stamp_as_secs(entry['stamp']) for entry in changelog)
+        batch.columns['path'] = [entry['path'] if entry['path'] is not None else path for entry in changelog]
+        batch.columns['text'] = [entry['text'] for entry in changelog]
+        if batch.is_alarm:
+            for field in ChangelogBatch._alarm_fields:
+                batch.columns[field] = [entry[field] for entry in changelog]
+        return batch
+
+    def extend(self, other):
+        """ appending all entries of another ChangelogBatch """
+        if other.is_alarm and not self.is_alarm:
+            # protocol entries have no alarm data
+            for field in ChangelogBatch._alarm_fields:
+                self.columns[field] = [None] * len(self)
+            self.fields = self.fields + ChangelogBatch._alarm_fields
+            self.is_alarm = True
+        self.stamps.extend(other.stamps)
+        for field in self.fields:
+            if field in other.columns:
+                self.columns[field].extend(other.columns[field])
+            else:
+                self.columns[field].extend([None] * len(other))
+
+    def column(self, field):
+        """ returns list of values of one field ("stamp": seconds since epoch) """
+        if field == 'stamp':
+            return self.stamps
+        return self.columns[field]
+
+    def get_datetime(self, idx, tz=datetime.timezone.utc):
+        secs = self.stamps[idx]
+        if math.isnan(secs):
+            return None
+        return datetime.datetime.fromtimestamp(secs, tz=tz)
+
+    def __getitem__(self, idx):
+        """ one entry as dictionary, or as Changelog_entry / Changelog_alarm_entry (look in CHANGELOG_RECORDS) """
+        entry = {field: self.columns[field][idx] for field in self.fields}
+        entry['stamp'] = self.get_datetime(idx)
+        if CHANGELOG_RECORDS:
+            entry_cls = Changelog_alarm_entry if self.is_alarm else Changelog_entry
+            return entry_cls(**entry)
+        return entry
+
+    def __iter__(self):
+        for idx in range(len(self)):
+            yield self[idx]
+
+    def iter_rows(self):
+        """ generator: tuples (stamp in seconds since epoch, field values in order of "fields") """
+        return zip(self.stamps, *[self.columns[field] for field in self.fields])
+
+    def get_time_range(self):
+        """ returns tuple (oldest, newest) in seconds since epoch, or None when batch is empty """
+        stamps = [secs for secs in self.stamps if not math.isnan(secs)]
+        if not stamps:
+            return None
+        return min(stamps), max(stamps)
+
+    def __len__(self):
+        return len(self.stamps)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'ChangelogBatch(is_alarm=' + repr(self.is_alarm) + ', len=' + repr(len(self)) + ')'
+
+
+
 
 class _Response(object):
     """ all common response fields """
@@ -961,6 +1684,9 @@ class _Response(object):
     # these fields are common for all responses
     _fields = ('code', )
 
+    # repeated strings in responses: using shared copies
+    _interned_fields = ('code', 'path', 'newPath', 'type', 'group')
+
     def __init__(self, **kwargs):
         # this variable has to be declared in child class...
         for field in _Response._fields:
@@ -982,6 +1708,11 @@ class _Response(object):
         if kwargs:
             logger.warning('constructor of CmdResponse(): WARNING: these fields in current response are unknown, perhaps unsupported JSON Data Exchange protocol: "' + repr(kwargs) + '"!')
 
+        for field in _Response._interned_fields:
+            val = self._values_dict.get(field, None)
+            if val is not None:
+                self._values_dict[field] = intern_str(val)
+
 
 class RespGet(_Mydict, _Response):
     _fields = ('path',
@@ -1282,6 +2013,8 @@ class SubscriptionES(eventsystem.EventSystem):
     def __init__(self, msghandler, sub_response):
         self._msghandler = msghandler
         self.sub_response = sub_response  # original DMS response (instance of RespSub())
+        # optional operators between received DMS-events and callbacks (look in pipeline())
+        self._pipeline = None
         super(SubscriptionES, self).__init__()
 
 
@@ -1289,6 +2022,43 @@ class SubscriptionES(eventsystem.EventSystem):
         return self.sub_response['tag']
 
 
+    def fire(self, *args, **kwargs):
+        profiler = self._msghandler.handler_profiler
+        if profiler:
+            profiler.record_event(self)
+        return super(SubscriptionES, self).fire(*args, **kwargs)
+
+    # (EventSystem binds "__call__" to it's own fire() method)
+    __call__ = fire
+
+
+    def _execute(self, handler, *args, **kwargs):
+        """ executes one callback function (measuring execution time when profiler is active) """
+        # =>coroutine functions ("async def") only create their coroutine here,
+        #   it gets executed in asyncio eventloop of _CoroutineRunner (profiling is done there)
+        profiler = self._msghandler.handler_profiler
+        if not profiler:
+            result = super(SubscriptionES, self)._execute(handler, *args, **kwargs)
+        else:
+            time_begin = time.perf_counter()
+            result = super(SubscriptionES, self)._execute(handler, *args, **kwargs)
+            if not asyncio.iscoroutine(result):
+                profiler.record_handler(self, handler, time.perf_counter() - time_begin)
+
+        if asyncio.iscoroutine(result):
+            self._msghandler.get_coroutine_runner().schedule(self, handler, result)
+            result = None
+        return result
+
+
+    def pipeline(self):
+        """ returns EventPipeline of this subscription (created on first call), it's operators run before callbacks """
+        # e.g. subES.pipeline().deadband(0.5).throttle(1.0), callbacks get only events passing all operators
+        if self._pipeline is None:
+            self._pipeline = EventPipeline(self, emit=self._msghandler.queue_event)
+        return self._pipeline
+
+
     def update(self, **kwargs):
         # FIXME for performance: detect changes in "query" and "event",
         # if changed, then overwrite subscription in DMS,
@@ -1309,6 +2079,8 @@ class SubscriptionES(eventsystem.EventSystem):
         resp = self._msghandler._dp_unsub(path=self.sub_response['path'],
                                           tag=self.sub_response['tag'])
         self._msghandler.del_subscription(self)
+        if self._pipeline is not None:
+            self._pipeline.close()
 
 
     # FIXME: unsubscribe() doesn't work during shutdown of Python interpreter... How to implement it right?
@@ -1327,7 +2099,6 @@ class SubscriptionES(eventsystem.EventSystem):
 
 
 
-
 class DMSEvent(_Mydict):
     # string constants
     CODE_CHANGE = 'onChange'
@@ -1368,6 +2139,10 @@ class DMSEvent(_Mydict):
                 logger.debug('DMSEvent() constructor: field "' + field + '" is not in response.')
                 self._values_dict[field] = None
 
+        # repeated strings: using shared copies (tag is same in all events of a subscription)
+        for field in ('code', 'path', 'newPath', 'type', 'tag'):
+            self._values_dict[field] = intern_str(self._values_dict[field])
+
         # sanity check:
         if not self._values_dict['code'] in (DMSEvent.CODE_CHANGE,
                                               DMSEvent.CODE_SET,
@@ -1378,13 +2153,230 @@ class DMSEvent(_Mydict):
 
 
 
+class _ConditionWaiter(object):
+    """ one caller of DMSClient.wait_for(): predicate and it's result """
+
+    def __init__(self, predicate, on_done):
+        # predicate: function getting value of datapoint, or value for comparison
+        self._predicate = predicate if callable(predicate) else (lambda val: val == predicate)
+        # on_done: function called once when predicate is fulfilled (or raised an exception)
+        self._on_done = on_done
+        self._lock = threading.Lock()
+        self.done = False
+        self.result = None
+        self.error = None
+
+    def check(self, obj):
+        """ checks value of RespGet or DMSEvent, returns True when waiter is finished """
+        with self._lock:
+            if self.done:
+                return True
+            try:
+                if not self._predicate(obj['value']):
+                    return False
+                self.result = obj
+            except Exception as ex:
+                logger.exception('_ConditionWaiter.check(): predicate raised exception')
+                self.error = ex
+            self.done = True
+        self._on_done()
+        return True
+
+
+
+class _ConditionWaiterTable(object):
+    """ all callers of DMSClient.wait_for(): one shared subscription per datapoint """
+
+    class _Entry(object):
+        def __init__(self):
+            self.waiters = set()
+            self.subES = None
+            self.error = None
+            self.ready = threading.Event()
+
+    def __init__(self, dmsclient):
+        self._dmsclient = dmsclient
+        self._lock = threading.Lock()
+        # path -> _Entry
+        self._entries = {}
+        self.nof_subscriptions = 0
+
+    def add(self, path, waiter, timeout):
+        """ registering waiter, subscribing datapoint when it's the first one, then checking current value """
+        with self._lock:
+            entry = self._entries.get(path, None)
+            is_first = entry is None
+            if is_first:
+                entry = self._entries[path] = _ConditionWaiterTable._Entry()
+            entry.waiters.add(waiter)
+
+        if is_first:
+            # subscription before reading current value: no change between both can get lost
+            try:
+                subES = self._dmsclient.get_dp_subscription(path, timeout=timeout, event=ON_CHANGE | ON_SET)
+                subES += lambda event: self._cb_event(entry, event)
+                entry.subES = subES
+                self.nof_subscriptions += 1
+            except Exception as ex:
+                entry.error = ex
+            finally:
+                entry.ready.set()
+        elif not entry.ready.wait(timeout):
+            self.remove(path, waiter)
+            raise TimeoutError('_ConditionWaiterTable.add(): subscription of "' + path + '" was not ready within ' + str(timeout) + ' seconds')
+        if entry.error:
+            self.remove(path, waiter)
+            raise entry.error
+
+        try:
+            response = self._dmsclient.dp_get(path, timeout=timeout)[0]
+        except Exception:
+            self.remove(path, waiter)
+            raise
+        if response['code'] != _Response.CODE_OK:
+            self.remove(path, waiter)
+            raise Exception('_ConditionWaiterTable.add(): reading "' + path + '" failed with code "' + str(response['code']) + '"')
+        waiter.check(response)
+
+    def remove(self, path, waiter):
+        """ unregistering waiter, unsubscribing datapoint when it was the last one """
+        with self._lock:
+            entry = self._entries.get(path, None)
+            if entry is None:
+                return
+            entry.waiters.discard(waiter)
+            if entry.waiters:
+                return
+            del self._entries[path]
+        if entry.subES:
+            try:
+                entry.subES.unsubscribe()
+            except Exception:
+                logger.exception('_ConditionWaiterTable.remove(): unsubscribing "' + path + '" failed')
+
+    def _cb_event(self, entry, event):
+        # runs in dispatcher thread
+        with self._lock:
+            waiters = list(entry.waiters)
+        for waiter in waiters:
+            waiter.check(event)
+
+    def get_stats(self):
+        """ returns dictionary with number of shared subscriptions and waiters """
+        with self._lock:
+            return {'paths': len(self._entries),
+                    'waiters': sum(len(entry.waiters) for entry in self._entries.values()),
+                    'subscriptions_total': self.nof_subscriptions}
+
+
+
+def _decode_frame(msg):
+    """ parsing of one raw frame from DMS: returns tuple (list of tuples (tag, response list), list of DMSEvent) """
+    # =>this is the CPU intensive part of message handling (JSON parsing, building of response objects),
+    #   it doesn't touch any state, so it's possible to execute it in a worker thread or worker process
+    #   (all results have to be picklable)
+    responses_list = []
+    events_list = []
+
+    payload_dict = json.loads(msg)
+
+    try:
+        # message handler
+        for resp_type, resp_cls in [('get', RespGet),
+                                    ('set', RespSet),
+                                    ('rename', RespRen),
+                                    ('delete', RespDel),
+                                    ('subscribe', RespSub),
+                                    ('unsubscribe', RespUnsub),
+                                    ('changelogGetGroups', RespChangelogGetGroups),
+                                    ('changelogRead', RespChangelogRead)]:
+            if resp_type in payload_dict:
+                # handling responses to command
+
+                # special treatment: when whole frame is tagged with helper-dictionary,
+                # then we need to copy it back to all tagless commands
+                # (I don't know why not all commands have an own tag...?!?)
+                # =>DMS must return us same helper-dictionary as built in _Request.as_dict(),
+                #   and all tagless commands in same order (array in JSON must keep ordering)
+                if resp_type == _CmdChangelogGetGroups.CMD_TYPE:
+                    for idx, resp_obj in enumerate(payload_dict[resp_type]):
+                        resp_obj['tag'] = payload_dict['tag'][_CmdChangelogGetGroups.CMD_TYPE][idx]
+
+                # assembling response lists
+                # (when one "get" command produces more than one response)
+                msg_tag = None
+                resp_list = []
+                for response in payload_dict[resp_type]:
+                    if 'tag' in response:
+                        curr_tag = response['tag']
+
+                        if curr_tag == msg_tag:
+                            # appending to current list
+                            resp_list.append(resp_cls(**response))
+                        else:
+                            # found a new tag =>save old list and create a new one
+                            if msg_tag and resp_list:
+                                logger.debug('message handler: found different tags in response. Storing response for other thread...')
+                                responses_list.append((msg_tag, resp_list))
+                            # begin of new response list
+                            msg_tag = curr_tag
+                            resp_list = [resp_cls(**response)]
+                    else:
+                        logger.warning('message handler: ignoring untagged response "' + repr(response) + '"...')
+
+                # storing collected list for other thread
+                if msg_tag:
+                    responses_list.append((msg_tag, resp_list))
+    except Exception as ex:
+        # help from https://stackoverflow.com/questions/5191830/best-way-to-log-a-python-exception
+        logger.exception("exception occurred in _MessageHandler.handle()")
+
+    if 'event' in payload_dict:
+        # handling DMS-events
+        for event in payload_dict['event']:
+            try:
+                events_list.append(DMSEvent(**event))
+            except AttributeError:
+                logger.exception("exception in _MessageHandler.handle(): DMS-event seems corrupted")
+            except Exception:
+                logger.exception("exception in _MessageHandler.handle() during handling of DMS-event")
+
+    return responses_list, events_list
+
+
+
 class _MessageHandler(object):
-    def __init__(self, dmsclient_obj, whois_str, user_str, subES_queue):
-        # backreference for sending messages
+    def __init__(self, dmsclient_obj, whois_str, user_str, subES_queue, coalesce_gets=False, profile_handlers=False,
+                 async_concurrency=ASYNC_CALLBACK_CONCURRENCY, async_ordered=True, transport=None, extinfos_cache=None):
+        # backreference to client object
         self._dmsclient = dmsclient_obj
+        # sending of requests (_WebSocketTransport or _HttpTransport)
+        self._transport = transport
         self._whois_str = whois_str
         self._user_str = user_str
 
+        # optional execution statistics of callbacks in SubscriptionES objects
+        self.handler_profiler = None
+        if profile_handlers:
+            self.handler_profiler = _HandlerProfiler()
+
+        # asyncio eventloop for coroutine callbacks, started when needed
+        self._async_concurrency = async_concurrency
+        self._async_ordered = async_ordered
+        self._coroutine_runner = None
+        self._coroutine_runner_lock = threading.Lock()
+
+        # optional cache of static extended infos (instance of _ExtInfosCache)
+        self.extinfos_cache = extinfos_cache
+
+        # optional request coalescing ("single-flight"):
+        # identical "get" commands share one DMS roundtrip while the first one is in flight
+        # (key: canonical JSON of "get" command without tag, value: _Inflight_get-objects)
+        self._coalesce_gets = coalesce_gets
+        self._inflight_gets_dict = {}
+        self._inflight_gets_lock = threading.Lock()
+        self.nof_coalesced_gets = 0
+
         # Queue for firing Subscription-EventSystem objects
         self._subES_queue = subES_queue
 
@@ -1393,10 +2385,8 @@ class _MessageHandler(object):
         # http://effbot.org/pyfaq/what-kinds-of-global-value-mutation-are-thread-safe.htm
         # https://stackoverflow.com/questions/8487673/how-would-you-make-this-python-dictionary-thread-safe
 
-        # dict for pending responses (key: cmd-tag, value: list of CmdResponse-objects)
-        # =>None means request is sent, but answer is not yet here
-        self._pending_response_dict = {}
-        self._pending_response_lock = threading.Lock()
+        # table of pending responses (key: cmd-tag, value: list of CmdResponse-objects)
+        self._pending_responses = _PendingResponseTable(default_timeout=REQ_TIMEOUT)
 
 
         # dict for DMS-events (key: tag, value: SubscriptionES-objects)
@@ -1406,28 +2396,29 @@ class _MessageHandler(object):
         self._subscriptionES_objs_lock = threading.Lock()
 
 
-        # object for assembling response lists
-        # (when one "get" command produces more than one response)
-        class Current_response(object):
-            def __init__(self):
-                self.msg_tag = ''
-                self.resp_list = []
-            def clear(self):
-                self.__init__()
-        self._curr_response = Current_response()
-
-    # object for "busy-waiting" mechanism in responses
-    class _Response_container(object):
+    # object for callers waiting on result of an identical "get" command
+    class _Inflight_get(object):
         def __init__(self):
-            self.isAvailable = threading.Event()
+            self.isDone = threading.Event()
             self.response_list = []
+            self.exception = None
 
 
     def dp_get(self, path, timeout=REQ_TIMEOUT, **kwargs):
         """ read datapoint value(s) """
 
-        req = _Request(whois=self._whois_str, user=self._user_str).addCmd(_CmdGet(msghandler=self, path=path, **kwargs))
-        self._send_frame(req)
+        cmd = _CmdGet(msghandler=self, path=path, **kwargs)
+        if self.extinfos_cache and cmd.showExtInfos:
+            return self._cached_extinfos_get(cmd, timeout)
+        return self._send_get(cmd, timeout)
+
+
+    def _send_get(self, cmd, timeout):
+        if self._coalesce_gets:
+            return self._coalesced_get(cmd, timeout)
+
+        req = _Request(whois=self._whois_str, user=self._user_str).addCmd(cmd)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1438,6 +2429,144 @@ class _MessageHandler(object):
             raise Exception('Please report this bug of pyVisiToolkit!')
 
 
+    def _cached_extinfos_get(self, cmd, timeout):
+        # static extended infos come from cache, DMS is asked only for missing or volatile ones
+        # =>responses contain exactly the requested fields, as without cache
+        # =>one datapoint: when it's missing in cache, all static fields are requested at once (one request)
+        # =>query: paths are unknown before the response, so the query asks only for volatile fields,
+        #   static fields of paths missing in cache follow in one additional frame (one "get" per path),
+        #   with warm cache a query needs only one request
+        cache = self.extinfos_cache
+        requested_list = cmd.showExtInfos
+        static_requested = [field for field in requested_list if field in _ExtInfosCache.STATIC_FIELDS]
+        volatile_list = [field for field in requested_list if not field in _ExtInfosCache.STATIC_FIELDS]
+        cached_dict = None
+        is_complete = False
+        if cmd.query:
+            if static_requested:
+                cmd.showExtInfos = volatile_list or None
+        else:
+            cached_dict = cache.get(cmd.path)
+            if cached_dict is not None:
+                cmd.showExtInfos = volatile_list or None
+            else:
+                # filling cache with all static fields at once
+                cmd.showExtInfos = requested_list + [field for field in _ExtInfosCache.STATIC_FIELDS if not field in requested_list]
+                is_complete = True
+
+        resp_list = self._send_get(cmd, timeout)
+
+        # path -> dictionary of static fields (only for queries)
+        static_dicts = {}
+        if cmd.query and static_requested:
+            missing_paths = []
+            for response in resp_list:
+                if response.code == _Response.CODE_OK:
+                    fields_dict = cache.get(response.path)
+                    if fields_dict is None:
+                        missing_paths.append(response.path)
+                    else:
+                        static_dicts[response.path] = fields_dict
+            if missing_paths:
+                results = self.dp_get_multi([(path, {'showExtInfos': list(_ExtInfosCache.STATIC_FIELDS)}) for path in missing_paths],
+                                            timeout=timeout)
+                for path, result in zip(missing_paths, results):
+                    if isinstance(result, Exception):
+                        raise result
+                    if result and result[0].code == _Response.CODE_OK and result[0].extInfos:
+                        ext_dict = result[0].extInfos.as_dict()
+                        fields_dict = {field: ext_dict[field] for field in _ExtInfosCache.STATIC_FIELDS}
+                        cache.put(path, fields_dict)
+                        static_dicts[path] = fields_dict
+
+        for response in resp_list:
+            if response.code != _Response.CODE_OK:
+                continue
+            fields_dict = {}
+            if response.extInfos:
+                fields_dict.update(response.extInfos.as_dict())
+            static_dict = static_dicts.get(response.path) if cmd.query else cached_dict
+            if static_dict is not None:
+                fields_dict.update(static_dict)
+            elif is_complete and response.extInfos:
+                cache.put(response.path, {field: fields_dict[field] for field in _ExtInfosCache.STATIC_FIELDS})
+            response['extInfos'] = ExtInfos(**{field: fields_dict[field] for field in requested_list if field in fields_dict})
+        return resp_list
+
+
+    def _coalesced_get(self, cmd, timeout):
+        # first caller sends the command, later callers with identical command wait for it's result
+        # =>all callers get the same response objects, they should be treated as read-only!
+        cmd_dict = cmd.as_dict()
+        del(cmd_dict['tag'])
+        key = json.dumps(cmd_dict, sort_keys=True)
+
+        with self._inflight_gets_lock:
+            inflight = self._inflight_gets_dict.get(key, None)
+            is_leader = inflight is None
+            if is_leader:
+                inflight = _MessageHandler._Inflight_get()
+                self._inflight_gets_dict[key] = inflight
+            else:
+                self.nof_coalesced_gets += 1
+
+        if not is_leader:
+            # our own tag is never sent
+            self._pending_responses.discard(cmd.tag)
+            logger.debug('_MessageHandler._coalesced_get(): waiting for result of identical "get" command in flight...')
+            if not inflight.isDone.wait(timeout=timeout):
+                raise Exception('_MessageHandler._coalesced_get(): got no response within ' + str(timeout) + ' seconds...')
+            if inflight.exception:
+                raise inflight.exception
+            return list(inflight.response_list)
+
+        try:
+            req = _Request(whois=self._whois_str, user=self._user_str).addCmd(cmd)
+            self._send_frame(req, timeout=timeout)
+            inflight.response_list = self._busy_wait_for_response(cmd.tag, timeout)
+            return list(inflight.response_list)
+        except Exception as ex:
+            inflight.exception = ex
+            raise
+        finally:
+            with self._inflight_gets_lock:
+                del(self._inflight_gets_dict[key])
+            inflight.isDone.set()
+
+
+    def dp_get_multi(self, requests, timeout=REQ_TIMEOUT):
+        """ many "get" commands in one frame, returns list of results in order of requests """
+        # requests: list of paths or tuples (path, dictionary with keyword arguments of dp_get())
+        # =>result of every command is it's list of responses, or the exception when it failed (e.g. timeout)
+        cmds = []
+        for item in requests:
+            if isinstance(item, str):
+                cmds.append(_CmdGet(msghandler=self, path=item))
+            else:
+                path, kwargs = item
+                cmds.append(_CmdGet(msghandler=self, path=path, **kwargs))
+        if not cmds:
+            return []
+
+        req = _Request(whois=self._whois_str, user=self._user_str).addCmd(*cmds)
+        try:
+            self._send_frame(req, timeout=timeout)
+        except Exception:
+            for cmd in cmds:
+                self._pending_responses.discard(cmd.tag)
+            raise
+
+        # (all commands share one deadline)
+        deadline = time.time() + timeout
+        results = []
+        for cmd in cmds:
+            try:
+                results.append(self._busy_wait_for_response(cmd.tag, max(0.0, deadline - time.time())))
+            except Exception as ex:
+                results.append(ex)
+        return results
+
+
     def dp_set(self, path, value, timeout=REQ_TIMEOUT, **kwargs):
         """ write datapoint value(s) """
         # Remarks: datatype in DMS is taken from datatype of "value" (field "type" is optional)
@@ -1447,7 +2576,7 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdSet(msghandler=self, path=path, value=value, **kwargs))
-        self._send_frame(req)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1463,7 +2592,9 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdDel(msghandler=self, path=path, recursive=recursive, **kwargs))
-        self._send_frame(req)
+        if self.extinfos_cache:
+            self.extinfos_cache.invalidate(path)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1479,7 +2610,10 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdRen(msghandler=self, path=path, newPath=newPath, **kwargs))
-        self._send_frame(req)
+        if self.extinfos_cache:
+            self.extinfos_cache.invalidate(path)
+            self.extinfos_cache.invalidate(newPath)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1495,7 +2629,7 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdSub(msghandler=self, path=path, **kwargs))
-        self._send_frame(req)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1512,7 +2646,7 @@ class _MessageHandler(object):
         # =>called by Subscription.unsubscribe()
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdUnsub(msghandler=self, path=path, tag=tag))
-        self._send_frame(req)
+        self._send_frame(req, timeout=timeout)
 
         try:
             return self._busy_wait_for_response(tag, timeout)
@@ -1527,7 +2661,7 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdChangelogGetGroups(msghandler=self, **kwargs))
-        self._send_frame(req)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1543,7 +2677,7 @@ class _MessageHandler(object):
 
         req = _Request(whois=self._whois_str, user=self._user_str).addCmd(
             _CmdChangelogRead(msghandler=self, group=group, start=start, **kwargs))
-        self._send_frame(req)
+        self._send_frame(req, timeout=timeout)
 
         try:
             tag = req.get_tags()[0]
@@ -1558,130 +2692,114 @@ class _MessageHandler(object):
 
 
     def handle(self, msg):
-        payload_dict = json.loads(msg)
+        """ decoding and dispatching of one raw frame received from DMS """
+        self.dispatch(_decode_frame(msg))
 
-        try:
-            # message handler
-            for resp_type, resp_cls in [('get', RespGet),
-                                        ('set', RespSet),
-                                        ('rename', RespRen),
-                                        ('delete', RespDel),
-                                        ('subscribe', RespSub),
-                                        ('unsubscribe', RespUnsub),
-                                        ('changelogGetGroups', RespChangelogGetGroups),
-                                        ('changelogRead', RespChangelogRead)]:
-                if resp_type in payload_dict:
-                    # handling responses to command
-
-                    # preparation: reset response list
-                    self._curr_response.clear()
-
-                    # special treatment: when whole frame is tagged with helper-dictionary,
-                    # then we need to copy it back to all tagless commands
-                    # (I don't know why not all commands have an own tag...?!?)
-                    # =>DMS must return us same helper-dictionary as built in _Request.as_dict(),
-                    #   and all tagless commands in same order (array in JSON must keep ordering)
-                    if resp_type == _CmdChangelogGetGroups.CMD_TYPE:
-                        for idx, resp_obj in enumerate(payload_dict[resp_type]):
-                            resp_obj['tag'] = payload_dict['tag'][_CmdChangelogGetGroups.CMD_TYPE][idx]
-
-                    for response in payload_dict[resp_type]:
-                        if 'tag' in response:
-                            curr_tag = response['tag']
-
-                            if curr_tag == self._curr_response.msg_tag:
-                                # appending to current list
-                                self._curr_response.resp_list.append(resp_cls(**response))
-                            else:
-                                # found a new tag =>save old list and create a new one
-                                if self._curr_response.msg_tag and self._curr_response.resp_list:
-                                    # need to save last responses
-                                    if curr_tag in self._pending_response_dict:
-                                        logger.debug('message handler: found different tags in response. Storing response for other thread...')
-                                        with self._pending_response_lock:
-                                            self._pending_response_dict[curr_tag].response_list = self._curr_response.resp_list
-                                            # inform other thread
-                                            self._pending_response_dict[curr_tag].isAvailable.set()
-                                    else:
-                                        logger.warning('message handler: ignoring unexpected response "' + repr(self._curr_response.resp_list) + '"...')
-                                # begin of new response list
-                                self._curr_response.msg_tag = curr_tag
-                                self._curr_response.resp_list = [resp_cls(**response)]
 
-                        else:
-                            logger.warning('message handler: ignoring untagged response "' + repr(response) + '"...')
+    @staticmethod
+    def decode(msg):
+        """ parsing of one raw frame without touching any state, result is argument of dispatch() """
+        return _decode_frame(msg)
 
 
-                    # storing collected list for other thread
-                    logger.debug('message handler: storing of response for other thread...')
-                    with self._pending_response_lock:
-                        self._pending_response_dict[curr_tag].response_list = self._curr_response.resp_list
-                        # inform other thread
-                        self._pending_response_dict[curr_tag].isAvailable.set()
-        except Exception as ex:
-            # help from https://stackoverflow.com/questions/5191830/best-way-to-log-a-python-exception
-            logger.exception("exception occurred in _MessageHandler.handle()")
+    def dispatch(self, decoded_frame):
+        """ hand over decoded responses to waiting threads and queue DMS-events for firing """
+        # (argument is result of _decode_frame(), decoding could be done in another thread or process)
+        responses_list, events_list = decoded_frame
 
+        for curr_tag, resp_list in responses_list:
+            logger.debug('message handler: storing of response for other thread...')
+            self._store_response(curr_tag, resp_list)
 
-        if 'event' in payload_dict:
-            # handling DMS-events
-            for event in payload_dict['event']:
-                # trigger Python event
-                try:
-                    event_obj = DMSEvent(**event)
-                    with self._subscriptionES_objs_lock:
-                        subES = self._subscriptionES_objs_dict[event_obj.tag]
-
-                    # via background thread: firing Python callback functions registered in EventSystem object
-                    # (result is list of tuples)
-                    if len(subES) > 0:
-                        logger.debug('_MsgHandler.handle(): queueing event-firing on SubscriptionES object [DMS-key="' + event_obj.path + '" / tag=' + event_obj.tag + ']...')
-                        self._subES_queue.put((subES, event_obj))
+        for event_obj in events_list:
+            if self.extinfos_cache and event_obj.code in (DMSEvent.CODE_RENAME, DMSEvent.CODE_DELETE):
+                # cached extended infos of this datapoint and it's children are outdated
+                self.extinfos_cache.invalidate(event_obj.path)
+                if event_obj.newPath:
+                    self.extinfos_cache.invalidate(event_obj.newPath)
+
+            # trigger Python event
+            try:
+                with self._subscriptionES_objs_lock:
+                    subES = self._subscriptionES_objs_dict[event_obj.tag]
+
+                # via background thread: firing Python callback functions registered in EventSystem object
+                # (result is list of tuples)
+                if len(subES) > 0:
+                    logger.debug('_MsgHandler.handle(): queueing event-firing on SubscriptionES object [DMS-key="' + event_obj.path + '" / tag=' + event_obj.tag + ']...')
+                    if subES._pipeline is not None:
+                        # operators decide if and when the event reaches callbacks
+                        subES._pipeline.push(event_obj)
                     else:
-                        logger.info('_MsgHandler.handle(): SubscriptionsAE object is empty, suppressing firing of EventSystem object...')
+                        self._subES_queue.put((subES, event_obj))
+                else:
+                    logger.info('_MsgHandler.handle(): SubscriptionsAE object is empty, suppressing firing of EventSystem object...')
 
-                    # help garbage collector
-                    event_obj = None
-                    subES = None
-                except AttributeError:
-                    logger.exception("exception in _MessageHandler.handle(): DMS-event seems corrupted")
-                except KeyError:
-                    logger.exception("exception in _MessageHandler.handle(): DMS-event is not registered")
-                except Exception:
-                    logger.exception("exception in _MessageHandler.handle() during handling of DMS-event")
+                # help garbage collector
+                event_obj = None
+                subES = None
+            except KeyError:
+                logger.exception("exception in _MessageHandler.handle(): DMS-event is not registered")
+            except Exception:
+                logger.exception("exception in _MessageHandler.handle() during handling of DMS-event")
 
 
 
-    def _send_frame(self, frame_obj):
+    def _send_frame(self, frame_obj, timeout=WS_CONNECT_TIMEOUT):
         # send whole request
+        # (timeout: seconds of request, it limits waiting for connection establishment)
 
         # create valid JSON
         # (according to https://docs.python.org/2/library/json.html : default encoding is UTF8)
         req_str = json.dumps(frame_obj.as_dict())
-        self._dmsclient._send_message(req_str)
+        self._transport.send(req_str, read_only=frame_obj.is_read_only(), timeout=timeout)
+
+    def _store_response(self, tag, resp_list):
+        # hand over response list to waiting thread
+        if not self._pending_responses.set_response(tag, resp_list):
+            logger.warning('message handler: ignoring unexpected response "' + repr(resp_list) + '"...')
 
     def _busy_wait_for_response(self, tag, timeout):
-        while not tag in self._pending_response_dict:
-            # FIXME: hmm, sometimes we have a race condition... Now we do this ugly busy wait loop...
-            # this tag HAS to be in dictionary, or we have a problem...
-            time.sleep(SLEEP_TIMEBASE)
-        with self._pending_response_lock:
-            isAvailable = self._pending_response_dict[tag].isAvailable
-        if isAvailable.wait(timeout=timeout):
-            with self._pending_response_lock:
-                curr_container = self._pending_response_dict.pop(tag)
-            return curr_container.response_list
-        else:
-            # no response in given timeframe... Should we return an exception?
-            raise Exception('_MessageHandler.DMS_busy_wait_for_response(): got no response within ' + str(timeout) + ' seconds...')
+        # (tag was registered by prepare_tag() before sending, entry is removed in every case)
+        return self._pending_responses.wait(tag, timeout)
+
+    def cancel_request(self, tag):
+        """ cancel pending request, waiting caller gets an exception """
+        return self._pending_responses.cancel(tag)
+
+    def poll_response(self, tag):
+        """ non-blocking: returns response list of a registered tag and forgets it, None while it's missing """
+        return self._pending_responses.poll(tag)
+
+    def get_coroutine_runner(self):
+        """ returns _CoroutineRunner for coroutine callbacks (starting it on first use) """
+        with self._coroutine_runner_lock:
+            if not self._coroutine_runner:
+                self._coroutine_runner = _CoroutineRunner(max_concurrency=self._async_concurrency,
+                                                          ordered=self._async_ordered,
+                                                          profiler=self.handler_profiler)
+                self._coroutine_runner.start()
+            return self._coroutine_runner
+
+    def stop_coroutine_runner(self):
+        with self._coroutine_runner_lock:
+            if self._coroutine_runner:
+                self._coroutine_runner.stop()
+                self._coroutine_runner = None
 
     def add_subscription(self, subAE):
         with self._subscriptionES_objs_lock:
             self._subscriptionES_objs_dict[subAE.get_tag()] = subAE
 
+    def queue_event(self, subES, item):
+        """ queueing item for firing SubscriptionES in dispatcher thread (output of EventPipeline) """
+        self._subES_queue.put((subES, item))
+
     def del_subscription(self, subAE):
         with self._subscriptionES_objs_lock:
             del(self._subscriptionES_objs_dict[subAE.get_tag()])
+        if self.handler_profiler:
+            self.handler_profiler.forget(subAE.get_tag())
 
 
     def prepare_tag(self, curr_tag=None):
@@ -1693,8 +2811,7 @@ class _MessageHandler(object):
             # (see https://docs.python.org/2/library/uuid.html )
             curr_tag = str(uuid.uuid4())
 
-        with self._pending_response_lock:
-            self._pending_response_dict[curr_tag] = _MessageHandler._Response_container()
+        self._pending_responses.register(curr_tag)
         return curr_tag
 
 
@@ -1708,7 +2825,6 @@ class _SubscriptionES_Dispatcher(threading.Thread):
     # FIXME: should we implement a hard timeout when synchronous execution of a fired SubscriptionES() with masses of handlers uses too much time?
     # FIXME: should we implement a priority queue for event handling?
     # FIXME: should we fire SubscriptionES() in parallel?
-    # FIXME: we use a "polling queue", it's a waste of CPU time when no datapoint subscription is active...
 
     def __init__(self, event_q):
         self._event_q = event_q
@@ -1724,15 +2840,17 @@ class _SubscriptionES_Dispatcher(threading.Thread):
         logger.debug('_SubscriptionES_Dispatcher.run(): background thread for firing EventSystem objects is running...')
         while self.keep_running:
             try:
-                subES, event_obj = self._event_q.get(block=False)
+                # (blocking with timeout: flag "keep_running" is checked regularly)
+                subES, event_obj = self._event_q.get(block=True, timeout=DISPATCHER_GET_TIMEOUT)
             except queue.Empty:
-                # give other threads some CPU time...
-                time.sleep(SLEEP_TIMEBASE)
+                pass
             except Exception as ex:
                 logger.error('_SubscriptionES_Dispatcher.run(): got exception ' + repr(ex))
             else:
                 # (this is an optional else clause when no exception occured)
-                logger.debug('_SubscriptionES_Dispatcher.run(): event-firing on SubscriptionES object [DMS-key="' + event_obj.path + '" / tag=' + event_obj.tag + ']')
+                # (items of an EventPipeline are not always DMSEvent objects, e.g. windows are lists of them)
+                event_descr = '[DMS-key="' + str(getattr(event_obj, 'path', None)) + '" / tag=' + str(subES.get_tag()) + ']'
+                logger.debug('_SubscriptionES_Dispatcher.run(): event-firing on SubscriptionES object ' + event_descr)
                 result = subES(event_obj)
 
                 # FIXME: how to inform caller about exceptions while executing his callbacks? Currently we log them, no other information.
@@ -1751,11 +2869,11 @@ class _SubscriptionES_Dispatcher(threading.Thread):
                             #            Assumption: traceback is not needed. It would be useful when debugging client code...
                             logger.error('_SubscriptionES_Dispatcher.run(): event-firing on SubscriptionES object: synchronous callback no.' + str(idx) + ' failed: ' + str(res[1]) + ' [handler=' + repr(res[2]) + ']')
                 else:
-                    logger.info('_SubscriptionES_Dispatcher.run(): event-firing had no effect (all handlers of SubscriptionES object were removed while waiting in event queue...) [DMS-key="' + event_obj.path + '" / tag=' + event_obj.tag + ']')
+                    logger.info('_SubscriptionES_Dispatcher.run(): event-firing had no effect (all handlers of SubscriptionES object were removed while waiting in event queue...) ' + event_descr)
 
                 # diagnostic values
                 if subES.duration_secs > CALLBACK_DURATION_WARNLEVEL:
-                    logger.warning('_SubscriptionES_Dispatcher.run(): event-firing on SubscriptionES object [DMS-key="' + event_obj.path + '" / tag=' + event_obj.tag + '] took ' + str(subES.duration_secs) + ' seconds... =>you should shorten your callback functions!')
+                    logger.warning('_SubscriptionES_Dispatcher.run(): event-firing on SubscriptionES object ' + event_descr + ' took ' + str(subES.duration_secs) + ' seconds... =>you should shorten your callback functions!')
                 if self._event_q.qsize() > EVENTQUEUE_WARNSIZE and self._do_warn_queuesize:
                     self._do_warn_queuesize = False
                     logger.warning('_SubscriptionES_Dispatcher.run(): number of waiting events is over ' + str(EVENTQUEUE_WARNSIZE) + '... =>you should shorten your callback functions and unsubscribe BEFORE removing handlers of SubscriptionES object!')
@@ -1771,12 +2889,149 @@ class _SubscriptionES_Dispatcher(threading.Thread):
                         pass
 
 
+class _FrameDecoder(threading.Thread):
+    """ decoding frames received from DMS in a separated thread """
+    # =>websocket thread only enqueues raw frames, so receiving continues while big responses get decoded
+    # =>with worker processes: big frames are decoded in parallel,
+    #   _FrameDeliverer hands over the results in order of arrival (ordering of responses and events is kept)
+
+    def __init__(self, rx_q, msghandler, nof_processes=0):
+        super(_FrameDecoder, self).__init__()
+        self.daemon = True
+        self._rx_q = rx_q
+        self._msghandler = msghandler
+
+        self._executor = None
+        self._deliverer = None
+        if nof_processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=nof_processes)
+            # limit number of decoded frames in memory
+            self._deliverer = _FrameDeliverer(delivery_q=queue.Queue(maxsize=4 * nof_processes),
+                                              msghandler=msghandler)
+
+
+    def run(self):
+        logger.debug('_FrameDecoder.run(): background thread for decoding of frames is running...')
+        if self._deliverer:
+            self._deliverer.start()
+        while True:
+            msg = self._rx_q.get()
+            if msg is None:
+                # request for exiting thread
+                break
+
+            if self._executor and len(msg) >= DECODE_PROCESS_MINSIZE:
+                future = self._executor.submit(_decode_frame, msg)
+            else:
+                future = concurrent.futures.Future()
+                try:
+                    future.set_result(_decode_frame(msg))
+                except Exception as ex:
+                    future.set_exception(ex)
+
+            if self._deliverer:
+                self._deliverer.put(future)
+            else:
+                _FrameDeliverer.deliver(self._msghandler, future)
+
+            # help garbage collector
+            msg = None
+            future = None
+
+        if self._deliverer:
+            self._deliverer.put(None)
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        logger.debug('_FrameDecoder.run(): background thread for decoding of frames is exiting...')
+
+
+    def stop(self):
+        self._rx_q.put(None)
+
+
+
+class _FrameDeliverer(threading.Thread):
+    """ handing over decoded frames in order of arrival to message handler """
+
+    def __init__(self, delivery_q, msghandler):
+        super(_FrameDeliverer, self).__init__()
+        self.daemon = True
+        self._delivery_q = delivery_q
+        self._msghandler = msghandler
+
+    def put(self, future):
+        self._delivery_q.put(future)
+
+    def run(self):
+        while True:
+            future = self._delivery_q.get()
+            if future is None:
+                break
+            _FrameDeliverer.deliver(self._msghandler, future)
+            future = None
+
+    @staticmethod
+    def deliver(msghandler, future):
+        # waits for decoding of this frame
+        try:
+            msghandler.dispatch(future.result())
+        except Exception:
+            logger.exception("exception occurred in _MessageHandler.handle()")
+
+
+
 class DMSClient(object):
-    def __init__(self, whois_str, user_str, dms_host_str=DMS_HOST, dms_port_int=DMS_PORT):
+    def __init__(self, whois_str, user_str, dms_host_str=DMS_HOST, dms_port_int=DMS_PORT, recorder=None, coalesce_gets=False,
+                 decode_mode=DECODE_INLINE, decode_processes=2,
+                 event_queue_size=0, overflow_policy=OVERFLOW_BLOCK, on_overflow=None,
+                 profile_handlers=False, async_concurrency=ASYNC_CALLBACK_CONCURRENCY, async_ordered=True,
+                 compression=False, compression_level=DEFLATE_COMPRESSION_LEVEL,
+                 client_max_window_bits=None, server_max_window_bits=None,
+                 extinfos_cache_ttl=None, extinfos_cache_size=EXTINFOS_CACHE_SIZE, frame_filter=None):
         self._dms_host_str = dms_host_str
         self._dms_port_int = dms_port_int
-        self._subAE_queue = queue.Queue()
-        self._msghandler = _MessageHandler(dmsclient_obj=self, whois_str=whois_str, user_str=user_str, subES_queue=self._subAE_queue)
+
+        # optional recording of all raw frames (e.g. instance of recorder.FrameRecorder())
+        self._recorder = recorder
+
+        # optional callable frame_filter(msg) for raw received frames (e.g. gateway.DMSGateway):
+        # it returns the frame to decode as usual (unchanged or without consumed parts), None when frame is consumed
+        self._frame_filter = frame_filter
+
+        # DMS-events waiting for firing of SubscriptionES objects
+        # (event_queue_size=0 means unbounded, otherwise "overflow_policy" decides what happens when queue is full)
+        self._subAE_queue = _EventQueue(maxsize=event_queue_size,
+                                        overflow_policy=overflow_policy,
+                                        on_overflow=on_overflow)
+        # extinfos_cache_ttl: seconds for caching static extended infos in dp_get(showExtInfos=...),
+        #                    None disables cache (look in watch_extinfos() for invalidation by DMS-events)
+        extinfos_cache = None
+        if extinfos_cache_ttl:
+            extinfos_cache = _ExtInfosCache(ttl_secs=extinfos_cache_ttl, maxsize=extinfos_cache_size)
+
+        # coalesce_gets=True: concurrent identical dp_get() calls share one DMS request
+        self._msghandler = _MessageHandler(dmsclient_obj=self,
+                                           whois_str=whois_str,
+                                           user_str=user_str,
+                                           subES_queue=self._subAE_queue,
+                                           coalesce_gets=coalesce_gets,
+                                           profile_handlers=profile_handlers,
+                                           async_concurrency=async_concurrency,
+                                           async_ordered=async_ordered,
+                                           transport=_WebSocketTransport(dmsclient=self, connect_timeout=WS_CONNECT_TIMEOUT),
+                                           extinfos_cache=extinfos_cache)
+
+        # decoding of received frames outside of websocket thread
+        assert decode_mode in (DECODE_INLINE, DECODE_THREAD, DECODE_PROCESS), 'unknown decode_mode "' + str(decode_mode) + '"'
+        self._decode_mode = decode_mode
+        self._rx_queue = queue.Queue()
+        self._decoder_thread = None
+        if decode_mode != DECODE_INLINE:
+            nof_processes = decode_processes if decode_mode == DECODE_PROCESS else 0
+            self._decoder_thread = _FrameDecoder(rx_q=self._rx_queue,
+                                                 msghandler=self._msghandler,
+                                                 nof_processes=nof_processes)
+            self._decoder_thread.start()
 
         # thread synchronisation flag for Websocket connection state
         # (documentation: https://docs.python.org/2/library/threading.html#event-objects )
@@ -1788,7 +3043,23 @@ class DMSClient(object):
         #   https://github.com/websocket-client/websocket-client/blob/master/websocket/_core.py
         #websocket.enableTrace(True)
         ws_URI = "ws://" + self._dms_host_str + ':' + str(self._dms_port_int) + DMS_BASEPATH
+
+        # compression=True: offering extension "permessage-deflate", it's used when server accepts it
+        # =>opt-in: our hooks depend on internals of websocket-client library (look in _PerMessageDeflate.is_supported())
+        # (window sizes in bits: None means biggest window, smaller windows need less memory on both sides)
+        self._deflate = None
+        ws_header = []
+        if compression:
+            if _PerMessageDeflate.is_supported():
+                self._deflate = _PerMessageDeflate(compression_level=compression_level,
+                                                   client_max_window_bits=client_max_window_bits,
+                                                   server_max_window_bits=server_max_window_bits)
+                ws_header.append(self._deflate.get_offer_header())
+            else:
+                logger.warning('DMSClient: installed version of websocket-client library is incompatible with our compression, using uncompressed frames')
+
         self._ws = websocket.WebSocketApp(ws_URI,
+                                    header = ws_header,
                                     on_message = self._cb_on_message,
                                     on_error = self._cb_on_error,
                                     on_open = self._cb_on_open,
@@ -1801,6 +3072,17 @@ class DMSClient(object):
         # background thread for firing Subscription-EventSystem objects
         self._subES_disp_thread = _SubscriptionES_Dispatcher(event_q=self._subAE_queue)
 
+        # background thread for removing expired pending requests
+        self._pending_sweeper_thread = _PendingSweeper(pending_table=self._msghandler._pending_responses)
+        self._pending_sweeper_thread.start()
+
+        # callers of wait_for(): concurrent waiters on same datapoint share one subscription
+        self._condition_waiters = _ConditionWaiterTable(dmsclient=self)
+
+        # periodic reads (look in poll()), scheduler is started when needed
+        self._poll_scheduler = None
+        self._poll_scheduler_lock = threading.Lock()
+
 
     # API
     def dp_get(self, path, timeout=REQ_TIMEOUT, **kwargs):
@@ -1819,6 +3101,67 @@ class DMSClient(object):
         """ rename datapoint(s) """
         return self._msghandler.dp_ren(path, newPath, timeout=timeout, **kwargs)
 
+    def dp_get_multi(self, requests, timeout=REQ_TIMEOUT):
+        """ many "get" commands in one frame (list of paths or tuples (path, kwargs)), returns list of results """
+        return self._msghandler.dp_get_multi(requests, timeout=timeout)
+
+    def poll(self, path, period, callback, **kwargs):
+        """ reading datapoint every "period" seconds, callback(responses) gets result, returns PollJob """
+        # =>all reads due in same tick of scheduler are sent as one frame (look in _PollScheduler)
+        with self._poll_scheduler_lock:
+            if self._poll_scheduler is None:
+                self._poll_scheduler = _PollScheduler(msghandler=self._msghandler, timeout=REQ_TIMEOUT)
+                self._poll_scheduler.start()
+        return self._poll_scheduler.add_job(path, period, callback, **kwargs)
+
+    def get_poll_stats(self):
+        """ returns dictionary with statistics of polling scheduler """
+        if self._poll_scheduler is None:
+            raise Exception('DMSClient.get_poll_stats(): no datapoints are polled!')
+        return self._poll_scheduler.get_stats()
+
+    def wait_for(self, path, predicate, timeout=REQ_TIMEOUT):
+        """ blocks until value of datapoint fulfills predicate, returns matching RespGet or DMSEvent """
+        # predicate: function getting value of datapoint (e.g. lambda val: val > 20.0), or value for comparison
+        # =>current value is checked once, afterwards every DMS-event of this datapoint,
+        #   on timeout TimeoutError is raised
+        time_begin = time.time()
+        done_event = threading.Event()
+        waiter = _ConditionWaiter(predicate, on_done=done_event.set)
+        self._condition_waiters.add(path, waiter, timeout)
+        try:
+            if not done_event.wait(timeout=max(0.0, timeout - (time.time() - time_begin))):
+                raise TimeoutError('DMSClient.wait_for(): condition on "' + path + '" was not fulfilled within ' + str(timeout) + ' seconds')
+        finally:
+            self._condition_waiters.remove(path, waiter)
+        if waiter.error:
+            raise waiter.error
+        return waiter.result
+
+    async def wait_for_async(self, path, predicate, timeout=REQ_TIMEOUT):
+        """ coroutine: waits until value of datapoint fulfills predicate, returns matching RespGet or DMSEvent """
+        # (same as wait_for(), but only subscribing and unsubscribing need a thread of default executor,
+        #  waiting itself doesn't block any thread)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def on_done():
+            # called in dispatcher thread
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = _ConditionWaiter(predicate, on_done=on_done)
+        time_begin = time.time()
+        await loop.run_in_executor(None, self._condition_waiters.add, path, waiter, timeout)
+        try:
+            await asyncio.wait_for(future, timeout=max(0.0, timeout - (time.time() - time_begin)))
+        except asyncio.TimeoutError:
+            raise TimeoutError('DMSClient.wait_for_async(): condition on "' + path + '" was not fulfilled within ' + str(timeout) + ' seconds')
+        finally:
+            await loop.run_in_executor(None, self._condition_waiters.remove, path, waiter)
+        if waiter.error:
+            raise waiter.error
+        return waiter.result
+
     def get_dp_subscription(self, path, timeout=REQ_TIMEOUT, **kwargs):
         """ subscribe monitoring of datapoints(s) """
         # FIXME: now we care only the first response... is this ok in every case?
@@ -1833,6 +3176,10 @@ class DMSClient(object):
         else:
             raise Exception('DMS ignored subscription of "' + path + '" with error "' + response.code + '"!')
 
+    def fetch_aligned(self, paths, start, end, step, fill=ALIGN_FILL_FFILL, max_workers=ALIGN_MAX_WORKERS, timeout=REQ_TIMEOUT, lookback=None):
+        """ trend data of many datapoints on a common timeline (fill: 'ffill', 'linear' or None), returns AlignedTrends """
+        return fetch_aligned(self, paths, start, end, step, fill=fill, max_workers=max_workers, timeout=timeout, lookback=lookback)
+
     def changelog_GetGroups(self, timeout=REQ_TIMEOUT, **kwargs):
         """ get list of available changelog groups """
         return self._msghandler.changelog_GetGroups(timeout=timeout, **kwargs)
@@ -1841,12 +3188,90 @@ class DMSClient(object):
         """ get protocol entries in given changelog group """
         return self._msghandler.changelog_Read(group, start, timeout=timeout, **kwargs)
 
-    def _send_message(self, msg):
+    def get_pending_requests(self):
+        """ returns list of tuples (tag, age in seconds, waiting flag) of all requests without response """
+        return self._msghandler._pending_responses.get_pending()
+
+    def cancel_request(self, tag):
+        """ cancel pending request (e.g. from another thread), waiting caller gets an exception """
+        return self._msghandler.cancel_request(tag)
+
+    def cancel_all_requests(self):
+        """ cancel all pending requests, returns number of cancelled requests """
+        nof_cancelled = 0
+        for tag, age_secs, is_waiting in self.get_pending_requests():
+            if self._msghandler.cancel_request(tag):
+                nof_cancelled += 1
+        return nof_cancelled
+
+    def top_slow_handlers(self, n=10, sort_by='p99_secs'):
+        """ returns list of dictionaries with execution statistics of the "n" slowest callbacks """
+        # (sort_by: 'p99_secs', 'max_secs', 'mean_secs', 'total_secs' or 'count')
+        if not self._msghandler.handler_profiler:
+            raise Exception('DMSClient.top_slow_handlers(): profiling of callbacks is disabled!')
+        return self._msghandler.handler_profiler.top_slow_handlers(n=n, sort_by=sort_by)
+
+    def get_subscription_stats(self):
+        """ returns list of dictionaries with number of events and event rate of all subscriptions """
+        if not self._msghandler.handler_profiler:
+            raise Exception('DMSClient.get_subscription_stats(): profiling of callbacks is disabled!')
+        return self._msghandler.handler_profiler.get_subscription_stats()
+
+    def get_event_queue_stats(self):
+        """ returns dictionary with size and drop counters of event queue """
+        return self._subAE_queue.get_stats()
+
+    def get_request_stats(self):
+        """ returns dictionary with counters of pending, timed out, late and orphaned responses """
+        return self._msghandler._pending_responses.get_stats()
+
+    def watch_extinfos(self, path, timeout=REQ_TIMEOUT):
+        """ subscribe rename and delete events of datapoint tree for invalidation of cached extended infos """
+        # (every rename or delete event of any subscription invalidates cache, this subscription only ensures
+        #  that DMS sends them for the whole tree)
+        if not self._msghandler.extinfos_cache:
+            raise Exception('DMSClient.watch_extinfos(): cache of extended infos is disabled!')
+        return self.get_dp_subscription(path,
+                                        timeout=timeout,
+                                        query=Query(maxDepth=-1),
+                                        event=ON_RENAME | ON_DELETE)
+
+    def invalidate_extinfos(self, path=None):
+        """ removing cached extended infos of datapoint and it's children (path=None: whole cache) """
+        if self._msghandler.extinfos_cache:
+            if path is None:
+                self._msghandler.extinfos_cache.clear()
+            else:
+                self._msghandler.extinfos_cache.invalidate(path)
+
+    def get_extinfos_cache_stats(self):
+        """ returns dictionary with size, hit and miss counters of cache for extended infos """
+        if not self._msghandler.extinfos_cache:
+            raise Exception('DMSClient.get_extinfos_cache_stats(): cache of extended infos is disabled!')
+        return self._msghandler.extinfos_cache.get_stats()
+
+    def get_compression_stats(self):
+        """ returns dictionary with compressed and uncompressed byte counters of WebSocket traffic """
+        if not self._deflate:
+            raise Exception('DMSClient.get_compression_stats(): compression is disabled!')
+        return self._deflate.get_stats()
+
+    def send_raw(self, msg):
+        """ sending raw JSON frame without waiting for responses (they are delivered to frame_filter) """
+        self._send_message(msg)
+
+    def _send_message(self, msg, timeout=WS_CONNECT_TIMEOUT):
         if not self.ready_to_send.is_set():
             logger.warning('DMSClient._send_message(): WebSocket not ready for sending, giving it more time for connection establishment...')
-        if self.ready_to_send.wait(timeout=60):     # timeout in seconds
+        if self.ready_to_send.wait(timeout=timeout):     # timeout in seconds
             logger.debug('DMSClient._send_message(): sending request "' + repr(msg) + '"')
-            self._ws.send(msg)
+            if self._recorder:
+                # (recorded before sending: response could arrive before record_tx() otherwise, replay needs it's tags first)
+                self._recorder.record_tx(msg)
+            if self._deflate:
+                self._deflate.send(self._ws.sock, msg)
+            else:
+                self._ws.send(msg)
         else:
             logger.error('DMSClient._send_message(): ERROR WebSocket not ready for sending request "' + repr(msg) + '"')
             raise IOError('DMSClient._send_message(): ERROR WebSocket not ready for sending request')
@@ -1859,13 +3284,27 @@ class DMSClient(object):
 
     def _cb_on_message(self, ws, message):
         logger.debug("DMSClient: websocket callback _on_message(): " + message)
-        self._msghandler.handle(message)
+        if self._recorder:
+            self._recorder.record_rx(message)
+        if self._frame_filter:
+            message = self._frame_filter(message)
+            if message is None:
+                return
+        if self._decoder_thread:
+            self._rx_queue.put(message)
+        else:
+            self._msghandler.handle(message)
 
     def _cb_on_error(self, ws, error):
         logger.error("DMSClient: websocket callback _on_error(): " + error)
 
     def _cb_on_open(self, ws):
         logger.info("DMSClient: websocket callback _on_open(): WebSocket connection is established.")
+        if self._deflate:
+            # result of negotiation is in handshake response,
+            # hooks have to be installed before websocket thread receives first frame
+            self._deflate.accept_response(ws.sock.getheaders())
+            self._deflate.install(ws.sock)
         self._subES_disp_thread.start()
         self.ready_to_send.set()
 
@@ -1889,6 +3328,23 @@ class DMSClient(object):
     def _exit_subAE_thread(self):
         logger.debug("DMSClient._exit_subAE_thread(): exiting subscriptionAE-dispatcher thread...")
         self._subES_disp_thread.keep_running = False
+        self._subAE_queue.stop()
+        self._pending_sweeper_thread.stop()
+        if self._decoder_thread:
+            self._decoder_thread.stop()
+        if self._poll_scheduler:
+            self._poll_scheduler.stop()
+        self._msghandler.stop_coroutine_runner()
+
+    def close(self):
+        """ closing WebSocket connection and stopping all background threads (calling it again does nothing) """
+        self.ready_to_send.clear()
+        self._exit_ws_thread()
+        self._exit_subAE_thread()
+        try:
+            self._ws.close()
+        except Exception as ex:
+            logger.debug('DMSClient.close(): closing WebSocket failed: ' + repr(ex))
 
     # trying to implement Context Manager.
     # help from https://jeffknupp.com/blog/2016/03/07/python-with-context-managers/
@@ -1898,8 +3354,7 @@ class DMSClient(object):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self._exit_ws_thread()
-        self._exit_subAE_thread()
+        self.close()
         if traceback:
             logger.error("DMSClient.__exit__(): type: {}".format(exc_type))
             logger.error("DMSClient.__exit__(): value: {}".format(exc_value))
@@ -1907,6 +3362,102 @@ class DMSClient(object):
 
 
 
+class DMSHttpClient(object):
+    """ stateless client for DMS "JSON Data Exchange" over HTTP (e.g. for batch jobs reading many datapoints) """
+    # =>all methods are thread-safe, concurrent calls are sent in parallel over up to "pool_size" connections
+    # =>subscriptions of DMS-events need WebSocket, use DMSClient for them
+
+    def __init__(self, whois_str, user_str, dms_host_str=DMS_HOST, dms_port_int=DMS_PORT, pool_size=HTTP_POOL_SIZE,
+                 http_timeout=REQ_TIMEOUT, recorder=None, coalesce_gets=False):
+        self._dms_host_str = dms_host_str
+        self._dms_port_int = dms_port_int
+
+        self._transport = _HttpTransport(host=dms_host_str,
+                                         port=dms_port_int,
+                                         basepath=DMS_BASEPATH,
+                                         on_frame=self._cb_on_frame,
+                                         pool_size=pool_size,
+                                         timeout=http_timeout,
+                                         recorder=recorder)
+        # (over HTTP we never get DMS-events, event queue stays empty)
+        self._msghandler = _MessageHandler(dmsclient_obj=self,
+                                           whois_str=whois_str,
+                                           user_str=user_str,
+                                           subES_queue=_EventQueue(),
+                                           coalesce_gets=coalesce_gets,
+                                           transport=self._transport)
+
+        # background thread for removing expired pending requests
+        self._pending_sweeper_thread = _PendingSweeper(pending_table=self._msghandler._pending_responses)
+        self._pending_sweeper_thread.start()
+
+
+    # API
+    def dp_get(self, path, timeout=REQ_TIMEOUT, **kwargs):
+        """ read datapoint value(s) """
+        return self._msghandler.dp_get(path, timeout=timeout, **kwargs)
+
+    def dp_get_multi(self, requests, timeout=REQ_TIMEOUT):
+        """ many "get" commands in one HTTP request (list of paths or tuples (path, kwargs)), returns list of results """
+        return self._msghandler.dp_get_multi(requests, timeout=timeout)
+
+    def dp_set(self, path, timeout=REQ_TIMEOUT, **kwargs):
+        """ write datapoint value(s) """
+        return self._msghandler.dp_set(path, timeout=timeout, **kwargs)
+
+    def dp_del(self, path, recursive, timeout=REQ_TIMEOUT, **kwargs):
+        """ delete datapoint(s) """
+        return self._msghandler.dp_del(path, recursive, timeout=timeout, **kwargs)
+
+    def dp_ren(self, path, newPath, timeout=REQ_TIMEOUT, **kwargs):
+        """ rename datapoint(s) """
+        return self._msghandler.dp_ren(path, newPath, timeout=timeout, **kwargs)
+
+    def get_dp_subscription(self, path, timeout=REQ_TIMEOUT, **kwargs):
+        """ not possible over HTTP """
+        raise Exception('DMSHttpClient.get_dp_subscription(): subscription of "' + path + '" needs a WebSocket connection, use DMSClient!')
+
+    def fetch_aligned(self, paths, start, end, step, fill=ALIGN_FILL_FFILL, max_workers=ALIGN_MAX_WORKERS, timeout=REQ_TIMEOUT, lookback=None):
+        """ trend data of many datapoints on a common timeline (fill: 'ffill', 'linear' or None), returns AlignedTrends """
+        return fetch_aligned(self, paths, start, end, step, fill=fill, max_workers=max_workers, timeout=timeout, lookback=lookback)
+
+    def changelog_GetGroups(self, timeout=REQ_TIMEOUT, **kwargs):
+        """ get list of available changelog groups """
+        return self._msghandler.changelog_GetGroups(timeout=timeout, **kwargs)
+
+    def changelog_Read(self, group, start, timeout=REQ_TIMEOUT, **kwargs):
+        """ get protocol entries in given changelog group """
+        return self._msghandler.changelog_Read(group, start, timeout=timeout, **kwargs)
+
+    def get_request_stats(self):
+        """ returns dictionary with counters of pending, timed out, late and orphaned responses """
+        return self._msghandler._pending_responses.get_stats()
+
+    def get_transport_stats(self):
+        """ returns dictionary with HTTP request, connection and byte counters """
+        return self._transport.get_stats()
+
+    def _cb_on_frame(self, msg):
+        logger.debug("DMSHttpClient: received response: " + msg)
+        self._msghandler.handle(msg)
+
+    def close(self):
+        """ closing all idle HTTP connections and stopping background thread """
+        self._pending_sweeper_thread.stop()
+        self._transport.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        if traceback:
+            logger.error("DMSHttpClient.__exit__(): type: {}".format(exc_type))
+            logger.error("DMSHttpClient.__exit__(): value: {}".format(exc_value))
+            logger.error("DMSHttpClient.__exit__(): traceback: {}".format(traceback))
+
+
+
 if __name__ == '__main__':
 
     #test_set = set(range(18))
@@ -1944,17 +3495,8 @@ if __name__ == '__main__':
                 print('*' * 20)
 
         if 2 in test_set:
-            print('\n\nNow doing loadtest:')
-            DEBUGGING = False
-            nof_tests = 1000
-            for x in range(nof_tests):
-                response = myClient.dp_get(path="System:Time")
-            print('We have done ' + str(nof_tests) + ' requests. :-) Does it still work?')
-            DEBUGGING = True
-            print('*' * 20)
-            response = myClient.dp_get(path="System:Time")
-            print('response to our request: ' + repr(response))
-            print('*' * 20)
+            # =>load tests are done by console script "visitoolkit-loadgen" (module "loadgen.py")
+            print('\n\nloadtest: please use "visitoolkit-loadgen --help"')
 
         if 3 in test_set:
             print('\nNow testing query function:')
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\coroutines.py
+
+Execution of coroutine callbacks ("async def") of SubscriptionES objects
+in an asyncio eventloop running in it's own background thread
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>DMSClient creates the eventloop thread when the first coroutine callback is fired
+=>plain callbacks are still executed by dispatcher thread of DMSClient
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# maximum number of concurrently running coroutines
+ASYNC_CALLBACK_CONCURRENCY = 100
+
+
+
+class _CoroutineRunner(threading.Thread):
+    """ executing coroutine callbacks of SubscriptionES objects in an asyncio eventloop """
+    # =>own background thread with own eventloop, so I/O-bound callbacks can overlap
+    # =>"max_concurrency" limits number of concurrently running coroutines
+    # =>ordered=True: coroutines of the same subscription are executed one after another in order of events
+
+    def __init__(self, max_concurrency=ASYNC_CALLBACK_CONCURRENCY, ordered=True, profiler=None):
+        super(_CoroutineRunner, self).__init__()
+        self.daemon = True
+        self._max_concurrency = max_concurrency
+        self._ordered = ordered
+        self._profiler = profiler
+        self._loop = asyncio.new_event_loop()
+
+        # these objects are only used inside eventloop thread
+        self._semaphore = None
+        # (key: subscription tag, value: deque of waiting coroutines)
+        self._pending_dict = {}
+
+        self.nof_scheduled = 0
+        self.nof_failed = 0
+
+
+    def run(self):
+        logger.debug('_CoroutineRunner.run(): background thread for coroutine callbacks is running...')
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+        # cleanup: coroutines which never got executed
+        for pending in self._pending_dict.values():
+            for subES, handler, coro in pending:
+                coro.close()
+        self._loop.close()
+        logger.debug('_CoroutineRunner.run(): background thread for coroutine callbacks is exiting...')
+
+
+    def schedule(self, subES, handler, coro):
+        """ hand over coroutine from any thread into eventloop """
+        self.nof_scheduled += 1
+        self._loop.call_soon_threadsafe(self._enqueue, subES, handler, coro)
+
+
+    def _enqueue(self, subES, handler, coro):
+        # (executed in eventloop thread)
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        if not self._ordered:
+            self._loop.create_task(self._execute(subES, handler, coro))
+            return
+
+        tag = subES.get_tag()
+        pending = self._pending_dict.get(tag, None)
+        if pending is None:
+            # no coroutine of this subscription is running: start a worker for this subscription
+            pending = collections.deque()
+            self._pending_dict[tag] = pending
+            self._loop.create_task(self._worker(tag, pending))
+        pending.append((subES, handler, coro))
+
+
+    async def _worker(self, tag, pending):
+        # executing coroutines of one subscription in order of events
+        while pending:
+            subES, handler, coro = pending.popleft()
+            await self._execute(subES, handler, coro)
+        del(self._pending_dict[tag])
+
+
+    async def _execute(self, subES, handler, coro):
+        async with self._semaphore:
+            time_begin = time.perf_counter()
+            try:
+                await coro
+            except Exception as ex:
+                self.nof_failed += 1
+                logger.error('_CoroutineRunner: coroutine callback failed: ' + repr(ex) + ' [handler=' + repr(handler) + ']')
+            if self._profiler:
+                self._profiler.record_handler(subES, handler, time.perf_counter() - time_begin)
+
+
+    def stop(self):
+        if self._loop.is_running():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return '_CoroutineRunner(max_concurrency=' + repr(self._max_concurrency) + ', ordered=' + repr(self._ordered) + ')'
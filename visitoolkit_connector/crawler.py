@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\crawler.py
+
+Breadth-first crawler of big datapoint trees: many small "get" requests with limited "maxDepth"
+instead of one huge query of the whole installation
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>every request reads "depth" levels below up to "batch" nodes (one frame, DMSClient.dp_get_multi()),
+  nodes on the last level with "hasChild" are crawled in a later request,
+  up to "concurrency" requests are in flight at the same time
+=>crawl() is a generator: discovered nodes (RespGet) are streamed to caller, nothing is collected in memory
+  (memory is bounded by frontier of unvisited nodes and by "concurrency" * "batch" responses)
+=>optional checkpoint file (JSON) contains frontier and counters, it's written between batches:
+  after interruption a new crawler with same checkpoint file continues, nodes of requests in flight
+  during last checkpoint are delivered again (at-least-once)
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import concurrent.futures
+import json
+import os
+import time
+
+from visitoolkit_connector import connector
+
+
+# levels below requested node in one "get" request
+CRAWL_DEPTH = 2
+
+# nodes in one frame
+CRAWL_BATCH = 50
+
+# requests in flight
+CRAWL_CONCURRENCY = 8
+
+# seconds between checkpoints
+CRAWL_CHECKPOINT_SECS = 10.0
+
+# attempts of one node before it's reported as failed
+CRAWL_RETRIES = 3
+
+# version of checkpoint file format
+CRAWL_CHECKPOINT_VERSION = 1
+
+
+
+def path_depth(path):
+    """ number of levels in path ("" is root of DMS) """
+    return path.count(':') + 1 if path else 0
+
+
+
+class TreeCrawler(object):
+    """ breadth-first crawling of datapoint tree with bounded concurrency and resumable checkpoints """
+
+    def __init__(self, dmsclient, root='', depth=CRAWL_DEPTH, batch=CRAWL_BATCH, concurrency=CRAWL_CONCURRENCY,
+                 checkpoint=None, checkpoint_secs=CRAWL_CHECKPOINT_SECS, retries=CRAWL_RETRIES,
+                 timeout=connector.REQ_TIMEOUT, **kwargs):
+        # dmsclient: connected DMSClient (or DMSHttpClient)
+        # checkpoint: filename of checkpoint, when it exists then crawling continues from there
+        # kwargs: additional arguments for every "get" request (e.g. showExtInfos=connector.INFO_ALL)
+        assert depth >= 1, 'TreeCrawler: depth must be at least 1'
+        self._dmsclient = dmsclient
+        self.root = root
+        self.depth = depth
+        self.batch = batch
+        self.concurrency = concurrency
+        self.checkpoint = checkpoint
+        self.checkpoint_secs = checkpoint_secs
+        self.retries = retries
+        self.timeout = timeout
+        self._kwargs = kwargs
+
+        # paths whose subtree still has to be read (with number of failed attempts)
+        self._frontier = collections.deque()
+        # paths whose request is in flight -> number of failed attempts
+        self._in_flight = {}
+        self.failed_paths = []
+        self._nof_nodes = 0
+        self._nof_requests = 0
+        self._nof_errors = 0
+        self._time_begin = None
+        self._keep_running = False
+        self._resumed = False
+
+        if checkpoint and os.path.exists(checkpoint):
+            self._load_checkpoint()
+        else:
+            # root itself is delivered, too
+            self._frontier.append((root, 0, True))
+
+
+    def _load_checkpoint(self):
+        with open(self.checkpoint, 'r') as f:
+            state = json.load(f)
+        if state.get('version') != CRAWL_CHECKPOINT_VERSION or state.get('root') != self.root:
+            raise ValueError('TreeCrawler: checkpoint "' + self.checkpoint + '" belongs to another crawl')
+        for path, attempts, include_self in state['frontier']:
+            self._frontier.append((path, attempts, include_self))
+        self.failed_paths = state['failed_paths']
+        self._nof_nodes = state['nodes']
+        self._nof_requests = state['requests']
+        self._nof_errors = state['errors']
+        self._resumed = True
+
+
+    def save_checkpoint(self):
+        """ writing frontier (including requests in flight) into checkpoint file """
+        if not self.checkpoint:
+            raise Exception('TreeCrawler.save_checkpoint(): no checkpoint file given!')
+        frontier = [list(item) for item in self._in_flight.values()]
+        frontier.extend(list(item) for item in self._frontier)
+        state = {'version': CRAWL_CHECKPOINT_VERSION,
+                 'root': self.root,
+                 'frontier': frontier,
+                 'failed_paths': self.failed_paths,
+                 'nodes': self._nof_nodes,
+                 'requests': self._nof_requests,
+                 'errors': self._nof_errors}
+        # atomic replacement: an interruption during writing keeps old checkpoint
+        tmp_filename = self.checkpoint + '.tmp'
+        with open(tmp_filename, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_filename, self.checkpoint)
+
+
+    def _read_batch(self, items):
+        # runs in worker thread: one frame with one "get" per node
+        requests = [(path, dict(self._kwargs, query=connector.Query(maxDepth=self.depth))) for path, _, _ in items]
+        return self._dmsclient.dp_get_multi(requests, timeout=self.timeout)
+
+
+    def crawl(self):
+        """ generator: yields RespGet of every node in tree below root (breadth-first) """
+        self._keep_running = True
+        self._time_begin = time.time()
+        next_checkpoint = self._time_begin + self.checkpoint_secs
+        # future -> list of frontier items
+        futures = {}
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.concurrency,
+                                                   thread_name_prefix='TreeCrawler') as executor:
+            while self._keep_running and (self._frontier or futures):
+                # filling pipeline
+                while self._frontier and len(futures) < self.concurrency:
+                    items = []
+                    while self._frontier and len(items) < self.batch:
+                        item = self._frontier.popleft()
+                        items.append(item)
+                        self._in_flight[item[0]] = item
+                    futures[executor.submit(self._read_batch, items)] = items
+                    self._nof_requests += 1
+
+                done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    items = futures.pop(future)
+                    try:
+                        results = future.result()
+                    except Exception as ex:
+                        results = [ex] * len(items)
+                    for item, result in zip(items, results):
+                        nodes, children = self._process(item, result)
+                        for response in nodes:
+                            yield response
+                        # (frontier and requests in flight change together: checkpoints stay consistent)
+                        self._frontier.extend(children)
+                        del self._in_flight[item[0]]
+
+                if self.checkpoint and time.time() >= next_checkpoint:
+                    self.save_checkpoint()
+                    next_checkpoint = time.time() + self.checkpoint_secs
+
+            if not self._keep_running:
+                # stopped by caller: requests in flight are crawled again after resume
+                for future in futures:
+                    future.cancel()
+        if self.checkpoint:
+            self.save_checkpoint()
+
+
+    def _process(self, item, result):
+        # returns tuple (list of nodes to yield, list of new frontier items)
+        path, attempts, include_self = item
+        if isinstance(result, Exception) or not result or result[0]['code'] != connector._Response.CODE_OK:
+            self._nof_errors += 1
+            if attempts + 1 < self.retries:
+                return [], [(path, attempts + 1, include_self)]
+            else:
+                descr = repr(result) if isinstance(result, Exception) else (result[0]['code'] if result else 'no response')
+                connector.logger.warning('TreeCrawler: reading subtree of "' + path + '" failed: ' + descr)
+                self.failed_paths.append(path)
+            return [], []
+
+        nodes = []
+        children = []
+        last_level = path_depth(path) + self.depth
+        for response in result:
+            if response['code'] != connector._Response.CODE_OK:
+                continue
+            curr_path = response['path']
+            if curr_path == path and not include_self:
+                # already delivered as child in previous request
+                continue
+            nodes.append(response)
+            if response['hasChild'] and path_depth(curr_path) >= last_level:
+                children.append((curr_path, 0, False))
+        self._nof_nodes += len(nodes)
+        return nodes, children
+
+
+    def stop(self):
+        """ stopping crawl() after current batch (with checkpoint for resuming) """
+        self._keep_running = False
+
+
+    def is_done(self):
+        """ True when whole tree is crawled """
+        return not self._frontier and not self._in_flight
+
+
+    def get_stats(self):
+        """ returns dictionary with progress of crawling """
+        elapsed_secs = time.time() - self._time_begin if self._time_begin else 0.0
+        return {'nodes': self._nof_nodes,
+                'requests': self._nof_requests,
+                'errors': self._nof_errors,
+                'failed_paths': len(self.failed_paths),
+                'frontier': len(self._frontier),
+                'in_flight': len(self._in_flight),
+                'resumed': self._resumed,
+                'nodes_per_sec': self._nof_nodes / elapsed_secs if elapsed_secs else None}
+
+
+    def __iter__(self):
+        return self.crawl()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'TreeCrawler(root=' + repr(self.root) + ', depth=' + repr(self.depth) + ', nodes=' + repr(self._nof_nodes) + ')'
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\deflate.py
+
+WebSocket extension "permessage-deflate" (RFC 7692) for connections of DMSClient
+(compressed frames in both directions, parameter "compression" of DMSClient)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>websocket-client library doesn't support compression extensions:
+  this module offers the extension in handshake header and installs hooks into the connected websocket object
+=>opt-in: hooks depend on internals of websocket-client library (look in _PerMessageDeflate.is_supported())
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import logging
+import threading
+import websocket
+import zlib
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# zlib compression level of our messages (0..9)
+DEFLATE_COMPRESSION_LEVEL = 6
+# smaller messages (number of bytes) are sent uncompressed
+DEFLATE_MIN_SIZE = 256
+# our hooks were only tested with these releases of websocket-client library (tuple (major, minor) of version)
+DEFLATE_MIN_WEBSOCKET_VERSION = (1, 0)
+
+
+
+class _PerMessageDeflate(object):
+    """ WebSocket extension "permessage-deflate" (RFC 7692) for websocket-client library """
+    # =>websocket-client doesn't support compression extensions:
+    #   we offer the extension in handshake header and install hooks into the connected websocket object
+    #   (receiving: frame header with "RSV1" bit marks a compressed message, library would reject it,
+    #    so our hook clears this bit and decompresses the message after reassembly of all fragments)
+    # =>messages sent by us are compressed when they're bigger than DEFLATE_MIN_SIZE
+
+    EXTENSION_NAME = 'permessage-deflate'
+    # trailing bytes of every compressed message, they're removed on the wire
+    _TAIL = b'\x00\x00\xff\xff'
+
+    def __init__(self, compression_level=DEFLATE_COMPRESSION_LEVEL, client_max_window_bits=None, server_max_window_bits=None):
+        assert client_max_window_bits is None or 9 <= client_max_window_bits <= 15, 'client_max_window_bits has to be in range 9..15'
+        assert server_max_window_bits is None or 8 <= server_max_window_bits <= 15, 'server_max_window_bits has to be in range 8..15'
+        self.compression_level = compression_level
+        self.client_max_window_bits = client_max_window_bits
+        self.server_max_window_bits = server_max_window_bits
+
+        # results of negotiation
+        self.is_active = False
+        self._client_wbits = zlib.MAX_WBITS
+        self._client_no_context_takeover = False
+        self._server_no_context_takeover = False
+
+        self._compressor = None
+        self._decompressor = None
+        # compressor keeps context between messages: compressing and sending has to be atomic
+        self._send_lock = threading.Lock()
+        # set by receiving hook when first frame of a message has RSV1 bit
+        self._rx_is_compressed = False
+
+        # statistics (payload is uncompressed size, wire is size of frame payload on the wire)
+        self.bytes_rx = 0
+        self.bytes_rx_wire = 0
+        self.bytes_tx = 0
+        self.bytes_tx_wire = 0
+        self.msgs_rx_compressed = 0
+        self.msgs_tx_compressed = 0
+
+
+    @staticmethod
+    def is_supported():
+        """ checks version of websocket-client library and availability of all library internals used by our hooks """
+        try:
+            version = tuple(int(part) for part in websocket.__version__.split('.')[:2])
+        except (AttributeError, ValueError):
+            return False
+        if version < DEFLATE_MIN_WEBSOCKET_VERSION:
+            return False
+        try:
+            from websocket import _abnf
+            return (hasattr(websocket.WebSocket, 'recv_data_frame')
+                    and hasattr(websocket.WebSocket, 'send_frame')
+                    and hasattr(_abnf.frame_buffer, 'recv_header')
+                    and hasattr(websocket.ABNF, 'create_frame'))
+        except (ImportError, AttributeError):
+            return False
+
+
+    def get_offer_header(self):
+        """ handshake header line with our offer """
+        params = [_PerMessageDeflate.EXTENSION_NAME]
+        if self.client_max_window_bits:
+            params.append('client_max_window_bits=' + str(self.client_max_window_bits))
+        else:
+            # parameter without value: server may limit window of our compressor
+            params.append('client_max_window_bits')
+        if self.server_max_window_bits:
+            params.append('server_max_window_bits=' + str(self.server_max_window_bits))
+        return 'Sec-WebSocket-Extensions: ' + '; '.join(params)
+
+
+    def accept_response(self, headers):
+        """ parsing extension parameters in handshake response of server, returns True when compression is active """
+        self.is_active = False
+        ext_str = ''
+        for key, val in (headers or {}).items():
+            if key.lower() == 'sec-websocket-extensions':
+                ext_str = val
+        for ext in ext_str.split(','):
+            params = [param.strip() for param in ext.split(';')]
+            if params[0] != _PerMessageDeflate.EXTENSION_NAME:
+                continue
+            self.is_active = True
+            self._client_wbits = self.client_max_window_bits or zlib.MAX_WBITS
+            for param in params[1:]:
+                name, _, val = param.partition('=')
+                name = name.strip()
+                val = val.strip().strip('"')
+                if name == 'client_no_context_takeover':
+                    self._client_no_context_takeover = True
+                elif name == 'server_no_context_takeover':
+                    self._server_no_context_takeover = True
+                elif name == 'client_max_window_bits' and val:
+                    self._client_wbits = min(self._client_wbits, int(val))
+            break
+
+        if self.is_active:
+            # zlib doesn't support raw deflate streams with 256 byte window
+            # =>when server demands it we send all messages uncompressed (this is always allowed)
+            if self._client_wbits >= 9:
+                self._compressor = self._new_compressor()
+            # decompressor with biggest window is able to decode streams of every smaller window
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+            logger.info('_PerMessageDeflate.accept_response(): server accepted compression "' + ext_str + '"')
+        else:
+            logger.info('_PerMessageDeflate.accept_response(): server doesn\'t support compression, using uncompressed frames')
+        return self.is_active
+
+
+    def _new_compressor(self):
+        return zlib.compressobj(self.compression_level, zlib.DEFLATED, -self._client_wbits)
+
+
+    def install(self, sock):
+        """ installing receiving hooks into connected websocket.WebSocket object """
+        frame_buffer = sock.frame_buffer
+        orig_recv_header = frame_buffer.recv_header
+        orig_recv_data_frame = sock.recv_data_frame
+
+        def recv_header():
+            orig_recv_header()
+            fin, rsv1, rsv2, rsv3, opcode, has_mask, length_bits = frame_buffer.header
+            if rsv1 and opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY):
+                self._rx_is_compressed = True
+                frame_buffer.header = (fin, 0, rsv2, rsv3, opcode, has_mask, length_bits)
+
+        def recv_data_frame(control_frame=False):
+            opcode, frame = orig_recv_data_frame(control_frame)
+            if opcode in (websocket.ABNF.OPCODE_TEXT, websocket.ABNF.OPCODE_BINARY):
+                self.bytes_rx_wire += len(frame.data)
+                if self._rx_is_compressed:
+                    self._rx_is_compressed = False
+                    frame.data = self._decompress(frame.data)
+                    self.msgs_rx_compressed += 1
+                self.bytes_rx += len(frame.data)
+            return opcode, frame
+
+        if self.is_active:
+            frame_buffer.recv_header = recv_header
+            # UTF8 validation of compressed payload would fail, websocket.WebSocketApp decodes decompressed text
+            frame_buffer.skip_utf8_validation = True
+            sock.cont_frame.skip_utf8_validation = True
+        sock.recv_data_frame = recv_data_frame
+
+
+    def _decompress(self, data):
+        if self._server_no_context_takeover:
+            self._decompressor = zlib.decompressobj(-zlib.MAX_WBITS)
+        return self._decompressor.decompress(data + _PerMessageDeflate._TAIL)
+
+
+    def send(self, sock, msg):
+        """ sending text message, compressed when it's worth it """
+        payload = msg.encode('utf-8')
+        with self._send_lock:
+            self.bytes_tx += len(payload)
+            if self._compressor and len(payload) >= DEFLATE_MIN_SIZE:
+                if self._client_no_context_takeover:
+                    self._compressor = self._new_compressor()
+                data = self._compressor.compress(payload) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+                frame = websocket.ABNF.create_frame(data[:-len(_PerMessageDeflate._TAIL)], websocket.ABNF.OPCODE_TEXT)
+                frame.rsv1 = 1
+                self.msgs_tx_compressed += 1
+            else:
+                frame = websocket.ABNF.create_frame(payload, websocket.ABNF.OPCODE_TEXT)
+            self.bytes_tx_wire += len(frame.data)
+            sock.send_frame(frame)
+
+
+    def get_stats(self):
+        """ returns dictionary with compressed and uncompressed byte counters """
+        stats = {'is_active': self.is_active,
+                 'bytes_rx': self.bytes_rx,
+                 'bytes_rx_wire': self.bytes_rx_wire,
+                 'bytes_tx': self.bytes_tx,
+                 'bytes_tx_wire': self.bytes_tx_wire,
+                 'msgs_rx_compressed': self.msgs_rx_compressed,
+                 'msgs_tx_compressed': self.msgs_tx_compressed}
+        # compression ratio: uncompressed size / size on the wire
+        for direction in ('rx', 'tx'):
+            wire = stats['bytes_' + direction + '_wire']
+            stats['ratio_' + direction] = stats['bytes_' + direction] / wire if wire else None
+        return stats
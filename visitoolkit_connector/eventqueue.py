@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\eventqueue.py
+
+Optionally bounded FIFO queue for DMS-events waiting for the dispatcher thread of DMSClient
+(parameters "event_queue_size", "overflow_policy" and "on_overflow" of DMSClient)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>a full queue either blocks the receiving thread or drops events (policy chosen by caller),
+  every dropped event is counted and handed over to the overflow callback
+=>stop() wakes up all waiting threads, so closing DMSClient never hangs on a full queue
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import logging
+import queue
+import threading
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# overflow policies of bounded event queue (parameter "overflow_policy" of DMSClient)
+OVERFLOW_BLOCK       = 'block'          # receiving of frames waits until dispatcher has fired an event
+OVERFLOW_DROP_OLDEST = 'drop_oldest'    # oldest waiting event is dropped
+OVERFLOW_DROP_NEWEST = 'drop_newest'    # new event is dropped
+OVERFLOW_CONFLATE    = 'conflate'       # new event replaces waiting event of same datapoint (else oldest is dropped)
+
+# maximum time in seconds a blocked put() into full event queue waits before checking it's exit flag
+EVENTQUEUE_PUT_TIMEOUT = 0.1
+
+
+
+class _EventQueue(object):
+    """ optionally bounded FIFO queue for DMS-events waiting for _SubscriptionES_Dispatcher """
+    # =>interface is compatible to queue.Queue() (methods put(), get() and qsize())
+    # =>items are tuples (SubscriptionES, DMSEvent)
+
+    def __init__(self, maxsize=0, overflow_policy=OVERFLOW_BLOCK, on_overflow=None):
+        assert overflow_policy in (OVERFLOW_BLOCK,
+                                   OVERFLOW_DROP_OLDEST,
+                                   OVERFLOW_DROP_NEWEST,
+                                   OVERFLOW_CONFLATE), 'unknown overflow policy "' + str(overflow_policy) + '"'
+        self.maxsize = maxsize
+        self.overflow_policy = overflow_policy
+        # optional callback on overflow: on_overflow(overflow_policy, dropped item or None)
+        self.on_overflow = on_overflow
+
+        # items are stored in mutable lists ("slots"), so conflation can replace a waiting event in place
+        self._slots = collections.deque()
+        # (key: tuple (subscription tag, DMS-key), value: slot) =>only used with OVERFLOW_CONFLATE
+        self._conflate_dict = {}
+        self._lock = threading.Lock()
+        self._not_empty = threading.Condition(self._lock)
+        self._not_full = threading.Condition(self._lock)
+        # cleared by stop(): nobody will get events anymore, so put() must not wait for free space
+        self._keep_running = True
+
+        # statistics
+        self.nof_blocked = 0
+        self.nof_dropped_oldest = 0
+        self.nof_dropped_newest = 0
+        self.nof_conflated = 0
+        self.nof_dropped_stopped = 0
+
+
+    @staticmethod
+    def _get_key(item):
+        subES, event_obj = item
+        return subES.get_tag(), getattr(event_obj, 'path', None)
+
+
+    def put(self, item):
+        # returns False when item was dropped
+        is_overflow = False
+        dropped_item = None
+        with self._lock:
+            if not self._keep_running:
+                # dispatcher is gone
+                self.nof_dropped_stopped += 1
+                return False
+            if self.maxsize > 0 and len(self._slots) >= self.maxsize:
+                is_overflow = True
+                if self.overflow_policy == OVERFLOW_BLOCK:
+                    self.nof_blocked += 1
+                    while len(self._slots) >= self.maxsize:
+                        self._not_full.wait(timeout=EVENTQUEUE_PUT_TIMEOUT)
+                        if not self._keep_running:
+                            logger.debug('_EventQueue.put(): queue was stopped while waiting for free space, dropping event')
+                            self.nof_dropped_stopped += 1
+                            return False
+                    self._append_slot(item)
+                elif self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                    self.nof_dropped_newest += 1
+                    dropped_item = item
+                elif self.overflow_policy == OVERFLOW_CONFLATE and self._get_key(item) in self._conflate_dict:
+                    # replace waiting event of same datapoint, keeping it's position in queue
+                    slot = self._conflate_dict[self._get_key(item)]
+                    dropped_item = tuple(slot)
+                    slot[:] = item
+                    self.nof_conflated += 1
+                else:
+                    # OVERFLOW_DROP_OLDEST (and OVERFLOW_CONFLATE without waiting event of same datapoint)
+                    dropped_item = self._pop_slot()
+                    self.nof_dropped_oldest += 1
+                    self._append_slot(item)
+            else:
+                self._append_slot(item)
+
+        if is_overflow and self.on_overflow:
+            # (executed outside of lock: callback could inspect this queue)
+            try:
+                self.on_overflow(self.overflow_policy, dropped_item)
+            except Exception:
+                logger.exception('_EventQueue.put(): exception in overflow callback')
+        return dropped_item is not item
+
+
+    def stop(self):
+        """ waking up blocked put() calls, from now on every event gets dropped """
+        with self._lock:
+            self._keep_running = False
+            self._not_full.notify_all()
+
+
+    def _append_slot(self, item):
+        # (caller has to hold the lock)
+        slot = list(item)
+        self._slots.append(slot)
+        if self.overflow_policy == OVERFLOW_CONFLATE:
+            self._conflate_dict[self._get_key(item)] = slot
+        self._not_empty.notify()
+
+    def _pop_slot(self):
+        # (caller has to hold the lock)
+        slot = self._slots.popleft()
+        if self.overflow_policy == OVERFLOW_CONFLATE:
+            key = self._get_key(slot)
+            if self._conflate_dict.get(key, None) is slot:
+                del(self._conflate_dict[key])
+        self._not_full.notify()
+        return tuple(slot)
+
+
+    def get(self, block=True, timeout=None):
+        with self._lock:
+            if block:
+                if not self._not_empty.wait_for(lambda: len(self._slots) > 0, timeout=timeout):
+                    raise queue.Empty
+            elif not self._slots:
+                raise queue.Empty
+            return self._pop_slot()
+
+
+    def qsize(self):
+        with self._lock:
+            return len(self._slots)
+
+
+    def get_stats(self):
+        """ returns dictionary with counters """
+        with self._lock:
+            return {'size': len(self._slots),
+                    'maxsize': self.maxsize,
+                    'overflow_policy': self.overflow_policy,
+                    'blocked': self.nof_blocked,
+                    'dropped_oldest': self.nof_dropped_oldest,
+                    'dropped_newest': self.nof_dropped_newest,
+                    'conflated': self.nof_conflated,
+                    'dropped_stopped': self.nof_dropped_stopped}
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return '_EventQueue(' + repr(self.get_stats()) + ')'
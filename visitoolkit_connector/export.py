@@ -0,0 +1,272 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\export.py
+
+Streaming export of trend data ("histData" in DMS "get" command) of many datapoints
+into Parquet or Arrow IPC files (optional dependency "pyarrow") or into CSV files
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>trend data of all datapoints is fetched concurrently by a pool of worker threads,
+  rows are collected into batches of "batch_size" rows and written batch by batch,
+  so memory usage depends on batch size and number of workers, not on size of export
+=>optional "window" splits the requested timeframe into smaller requests
+  (recommended for datapoints with huge amount of trend data)
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import concurrent.futures
+import csv
+import datetime
+
+from visitoolkit_connector import connector
+
+# optional dependency for Parquet and Arrow output
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+# number of rows per written batch
+BATCH_SIZE = 65536
+
+# number of concurrent "get" requests
+MAX_WORKERS = 4
+
+
+
+class TrendExporter(object):
+    """ fetching trend data of a list of datapoints and writing it batch by batch """
+
+    def __init__(self, dmsclient, paths, start, end=None, format='compact', interval=None, window=None,
+                 batch_size=BATCH_SIZE, max_workers=MAX_WORKERS, timeout=connector.REQ_TIMEOUT):
+        self._dmsclient = dmsclient
+        self.paths = list(paths)
+        self.start = start
+        self.end = end
+        assert format in ('compact', 'detail'), 'format of trend data has to be "compact" or "detail", got "' + str(format) + '"'
+        self.format = format
+        self.interval = interval
+        self.window = window
+        self.batch_size = int(batch_size)
+        self.max_workers = int(max_workers)
+        self.timeout = timeout
+
+        if self.window:
+            # splitting timeframe is only possible with datetime.datetime objects
+            assert isinstance(self.start, datetime.datetime), 'option "window" expects "start" as datetime.datetime object'
+            if self.end is None:
+                self.end = datetime.datetime.now(tz=self.start.tzinfo)
+            assert isinstance(self.end, datetime.datetime), 'option "window" expects "end" as datetime.datetime object'
+
+        if self.format == 'compact':
+            self.columns = ('path', 'stamp', 'value')
+        else:
+            self.columns = ('path', 'stamp', 'value', 'state', 'rec')
+
+        # list of tuples (path, error message) of all failed requests of last export
+        self.errors = []
+
+
+    def _get_tasks(self):
+        # list of tuples (path, start, end, end is exclusive), one per "get" request
+        # =>"end" of histData is inclusive: windows are half-open [start, end),
+        #   trendpoints on boundary between two windows belong to the later one (only last window includes "end")
+        tasks = []
+        for path in self.paths:
+            if self.window:
+                curr_start = self.start
+                while curr_start < self.end:
+                    curr_end = min(curr_start + self.window, self.end)
+                    tasks.append((path, curr_start, curr_end, curr_end < self.end))
+                    curr_start = curr_end
+            else:
+                tasks.append((path, self.start, self.end, False))
+        return tasks
+
+
+    def _fetch(self, path, start, end, end_exclusive=False):
+        # runs in worker thread: returns list of rows
+        kwargs = {'format': self.format}
+        if end is not None:
+            kwargs['end'] = end
+        if self.interval is not None:
+            kwargs['interval'] = self.interval
+        response = self._dmsclient.dp_get(path=path,
+                                          histData=connector.HistData(start=start, **kwargs),
+                                          timeout=self.timeout)[0]
+        if response.code != connector._Response.CODE_OK or response.message:
+            raise IOError('DMS returned code "' + str(response.code) + '" with message "' + str(response.message) + '"')
+
+        rows = []
+        if response.histData:
+            trendpoints = response.histData
+            if end_exclusive:
+                trendpoints = [trendpoint for trendpoint in trendpoints if trendpoint.stamp is None or trendpoint.stamp < end]
+            if self.format == 'compact':
+                for trendpoint in trendpoints:
+                    rows.append((path, trendpoint.stamp, trendpoint.value))
+            else:
+                for trendpoint in trendpoints:
+                    rows.append((path, trendpoint.stamp, trendpoint.value, trendpoint.state, trendpoint.rec))
+        return rows
+
+
+    def iter_rows(self):
+        """ generator: yields all trendpoints as tuples (path, stamp, value[, state, rec]) """
+        # =>only "max_workers" requests are in flight, results are yielded in order of paths
+        # (errors of previous export are discarded)
+        self.errors = []
+        tasks = self._get_tasks()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = collections.deque()
+            task_idx = 0
+            while task_idx < len(tasks) or pending:
+                while task_idx < len(tasks) and len(pending) < self.max_workers:
+                    path, start, end, end_exclusive = tasks[task_idx]
+                    pending.append((path, executor.submit(self._fetch, path, start, end, end_exclusive)))
+                    task_idx += 1
+
+                path, future = pending.popleft()
+                try:
+                    rows = future.result()
+                except Exception as ex:
+                    connector.logger.error('TrendExporter: export of trend data of "' + path + '" failed: ' + repr(ex))
+                    self.errors.append((path, repr(ex)))
+                    continue
+                for row in rows:
+                    yield row
+                # help garbage collector
+                rows = None
+
+
+    def iter_batches(self):
+        """ generator: yields dictionaries {column: list of values} with up to "batch_size" rows """
+        batch = [[] for _ in self.columns]
+        nof_rows = 0
+        for row in self.iter_rows():
+            for column, val in zip(batch, row):
+                column.append(val)
+            nof_rows += 1
+            if nof_rows >= self.batch_size:
+                yield dict(zip(self.columns, batch))
+                batch = [[] for _ in self.columns]
+                nof_rows = 0
+        if nof_rows:
+            yield dict(zip(self.columns, batch))
+
+
+    @staticmethod
+    def _check_pyarrow(format_name):
+        if pyarrow is None:
+            raise ImportError('export in ' + format_name + ' format needs optional package "pyarrow"!')
+
+
+    def _get_arrow_schema(self):
+        fields = [pyarrow.field('path', pyarrow.string()),
+                  pyarrow.field('stamp', pyarrow.timestamp('us', tz='UTC')),
+                  pyarrow.field('value', pyarrow.float64())]
+        if self.format == 'detail':
+            fields.extend([pyarrow.field('state', pyarrow.string()),
+                           pyarrow.field('rec', pyarrow.string())])
+        return pyarrow.schema(fields)
+
+
+    def iter_record_batches(self):
+        """ generator: yields pyarrow.RecordBatch objects with up to "batch_size" rows """
+        self._check_pyarrow('Arrow')
+        schema = self._get_arrow_schema()
+        for batch in self.iter_batches():
+            # trend values are numbers or booleans, other values are exported as null
+            batch['value'] = [_as_float(val) for val in batch['value']]
+            if self.format == 'detail':
+                for column in ('state', 'rec'):
+                    batch[column] = [None if val is None else str(val) for val in batch[column]]
+            yield pyarrow.RecordBatch.from_arrays([batch[column] for column in self.columns], schema=schema)
+
+
+    def to_csv(self, filename, delimiter=';'):
+        """ writing all trendpoints into CSV file, returns number of written rows """
+        nof_rows = 0
+        with open(filename, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f, delimiter=delimiter)
+            writer.writerow(self.columns)
+            for batch in self.iter_batches():
+                stamps = [None if stamp is None else stamp.isoformat() for stamp in batch['stamp']]
+                batch['stamp'] = stamps
+                writer.writerows(zip(*[batch[column] for column in self.columns]))
+                nof_rows += len(stamps)
+        return nof_rows
+
+
+    def to_arrow(self, filename):
+        """ writing all trendpoints into Arrow IPC file, returns number of written rows """
+        self._check_pyarrow('Arrow')
+        nof_rows = 0
+        schema = self._get_arrow_schema()
+        with pyarrow.OSFile(filename, 'wb') as sink:
+            with pyarrow.ipc.new_file(sink, schema) as writer:
+                for record_batch in self.iter_record_batches():
+                    writer.write_batch(record_batch)
+                    nof_rows += record_batch.num_rows
+        return nof_rows
+
+
+    def to_parquet(self, filename, compression='snappy'):
+        """ writing all trendpoints into Parquet file, returns number of written rows """
+        self._check_pyarrow('Parquet')
+        nof_rows = 0
+        schema = self._get_arrow_schema()
+        with pyarrow.parquet.ParquetWriter(filename, schema, compression=compression) as writer:
+            for record_batch in self.iter_record_batches():
+                writer.write_table(pyarrow.Table.from_batches([record_batch], schema=schema))
+                nof_rows += record_batch.num_rows
+        return nof_rows
+
+
+    def export(self, filename):
+        """ writing all trendpoints, file format is chosen by file extension (other extensions than Parquet/Arrow get CSV) """
+        lower_name = filename.lower()
+        if lower_name.endswith(('.parquet', '.arrow', '.feather')) and pyarrow is None:
+            # no silent fallback: CSV content in a ".parquet" file would break every reader of it
+            raise ImportError('TrendExporter.export(): writing "' + filename + '" needs optional package "pyarrow"!')
+        if lower_name.endswith('.parquet'):
+            return self.to_parquet(filename)
+        elif lower_name.endswith('.arrow') or lower_name.endswith('.feather'):
+            return self.to_arrow(filename)
+        else:
+            if not lower_name.endswith('.csv'):
+                connector.logger.warning('TrendExporter.export(): writing "' + filename + '" in CSV format...')
+            return self.to_csv(filename)
+
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'TrendExporter(paths=' + repr(self.paths) + ', start=' + repr(self.start) + ', end=' + repr(self.end) + ')'
+
+
+
+def _as_float(val):
+    # trend values as number (None when conversion is impossible)
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\extinfos.py
+
+Client-side cache of static extended infos (unit, comment, template, name, changelogGroup) by path
+(parameters "extinfos_cache_ttl" and "extinfos_cache_size" of DMSClient)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>_MessageHandler answers "showExtInfos" from this cache and requests only missing datapoints from DMS
+=>rename and delete of datapoints invalidate cached infos of the whole subtree
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import threading
+import time
+
+
+# maximum number of cached datapoints (least recently used are dropped)
+EXTINFOS_CACHE_SIZE = 100000
+
+
+
+class _ExtInfosCache(object):
+    """ client-side cache of static extended infos (unit, comment, template, name, changelogGroup) by path """
+    # =>"state" and "accType" change with value or type of datapoint, they're always requested from DMS
+    # =>entries expire after "ttl_secs" or on invalidation (rename or delete of datapoint or one of it's parents):
+    #   invalidation only remembers path with current generation number (no scanning through all entries),
+    #   lookup compares generation of entry with invalidations of all parent paths
+
+    STATIC_FIELDS = ('name', 'template', 'unit', 'comment', 'changelogGroup')
+
+    def __init__(self, ttl_secs, maxsize=EXTINFOS_CACHE_SIZE):
+        self.ttl_secs = ttl_secs
+        self.maxsize = maxsize
+        # path -> tuple (dictionary of static fields, generation, expiry time)
+        self._entries = collections.OrderedDict()
+        # invalidated path -> tuple (generation, time of invalidation)
+        self._invalidations = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+        # statistics
+        self.nof_hits = 0
+        self.nof_misses = 0
+        self.nof_invalidations = 0
+
+
+    def get(self, path):
+        """ returns dictionary of static fields or None """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(path, None)
+            if entry is not None:
+                fields_dict, generation, expiry = entry
+                if expiry < now or self._is_invalidated(path, generation):
+                    del(self._entries[path])
+                else:
+                    self._entries.move_to_end(path)
+                    self.nof_hits += 1
+                    return fields_dict
+            self.nof_misses += 1
+            return None
+
+
+    def _is_invalidated(self, path, generation):
+        # checking path and all parent paths (caller has to hold self._lock)
+        if not self._invalidations:
+            return False
+        idx = path.find(':')
+        while idx != -1:
+            item = self._invalidations.get(path[:idx], None)
+            if item and item[0] >= generation:
+                return True
+            idx = path.find(':', idx + 1)
+        item = self._invalidations.get(path, None)
+        return bool(item and item[0] >= generation)
+
+
+    def put(self, path, fields_dict):
+        with self._lock:
+            self._generation += 1
+            self._entries[path] = (fields_dict, self._generation, time.time() + self.ttl_secs)
+            self._entries.move_to_end(path)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+    def invalidate(self, path):
+        """ invalidating cached infos of datapoint and all it's children """
+        now = time.time()
+        with self._lock:
+            self._generation += 1
+            self._invalidations[path] = (self._generation, now)
+            self.nof_invalidations += 1
+            self._entries.pop(path, None)
+            if len(self._invalidations) > self.maxsize:
+                # all entries cached before these invalidations are expired anyway
+                for curr_path, (generation, stamp) in list(self._invalidations.items()):
+                    if stamp < now - self.ttl_secs:
+                        del(self._invalidations[curr_path])
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._invalidations.clear()
+
+
+    def get_stats(self):
+        """ returns dictionary with size, hit and miss counters """
+        with self._lock:
+            return {'size': len(self._entries),
+                    'hits': self.nof_hits,
+                    'misses': self.nof_misses,
+                    'invalidations': self.nof_invalidations}
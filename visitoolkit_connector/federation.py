@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\federation.py
+
+Federated access to many DMS instances: fan-out of "get" requests and queries to all hosts concurrently,
+results are tagged with name of host and streamed in order of arrival
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>every host has it's own client object (DMSClient or DMSHttpClient) and it's own timeout,
+  a slow or unreachable site never delays results of the other sites
+=>results are FederatedResult tuples: exceptions are returned in field "error" instead of being raised,
+  so one failing site doesn't abort the whole fan-out
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import concurrent.futures
+import threading
+import time
+from collections import namedtuple
+
+from visitoolkit_connector import connector
+
+
+# default timeout in seconds for one host
+FEDERATION_TIMEOUT = 30
+
+# seconds between checks for start of queued requests (when "max_workers" is smaller than number of hosts)
+FEDERATION_POLL_SECS = 0.05
+
+
+# result of one host: list of responses (None on error), exception (None on success), duration in seconds
+FederatedResult = namedtuple(typename='FederatedResult', field_names=['host', 'responses', 'error', 'duration_secs'])
+
+
+
+class FederatedDMSClient(object):
+    """ set of named DMS hosts, queried concurrently """
+
+    def __init__(self, hosts, whois_str, user_str, timeout=FEDERATION_TIMEOUT, timeouts=None, max_workers=None,
+                 client_factory=connector.DMSClient, **client_kwargs):
+        # hosts: dictionary name -> hostname, tuple (hostname, port) or already created client object
+        # timeouts: optional dictionary name -> timeout in seconds (overrides "timeout" for this host)
+        # client_factory: class of created client objects (e.g. connector.DMSHttpClient for stateless reads),
+        #                 "client_kwargs" are handed over to it
+        self._whois_str = whois_str
+        self._user_str = user_str
+        self._client_factory = client_factory
+        self._client_kwargs = client_kwargs
+        self.timeout = timeout
+        self._timeouts = dict(timeouts or {})
+        # max_workers: limit of concurrent requests in one fan-out (default: all hosts at the same time)
+        self.max_workers = max_workers
+
+        self._clients = {}
+        self._own_clients = set()
+        self._clients_lock = threading.Lock()
+        for name, host in hosts.items():
+            self.add_host(name, host)
+
+
+    def add_host(self, name, host, timeout=None):
+        """ adding DMS host (hostname, tuple (hostname, port) or client object) """
+        if isinstance(host, str):
+            client = self._client_factory(self._whois_str, self._user_str, dms_host_str=host, **self._client_kwargs)
+            is_own = True
+        elif isinstance(host, tuple):
+            client = self._client_factory(self._whois_str, self._user_str, dms_host_str=host[0], dms_port_int=host[1], **self._client_kwargs)
+            is_own = True
+        else:
+            client = host
+            is_own = False
+        with self._clients_lock:
+            if name in self._clients:
+                raise ValueError('FederatedDMSClient.add_host(): host "' + name + '" already exists')
+            self._clients[name] = client
+            if is_own:
+                self._own_clients.add(name)
+        if timeout is not None:
+            self._timeouts[name] = timeout
+
+
+    def remove_host(self, name):
+        """ removing DMS host, closing it's connection when it was created by us """
+        with self._clients_lock:
+            client = self._clients.pop(name)
+            is_own = name in self._own_clients
+            self._own_clients.discard(name)
+        self._timeouts.pop(name, None)
+        if is_own:
+            _close_client(client)
+
+
+    def get_hosts(self):
+        with self._clients_lock:
+            return sorted(self._clients)
+
+
+    def get_client(self, name):
+        with self._clients_lock:
+            return self._clients[name]
+
+
+    def _call(self, name, client, method_name, timeout, start_box, args, kwargs):
+        # runs in worker thread (start_box: list receiving start time, deadline of host begins here)
+        time_begin = time.time()
+        start_box.append(time_begin)
+        try:
+            responses = getattr(client, method_name)(*args, timeout=timeout, **kwargs)
+            return FederatedResult(name, responses, None, time.time() - time_begin)
+        except Exception as ex:
+            connector.logger.warning('FederatedDMSClient: ' + method_name + '() on host "' + name + '" failed: ' + repr(ex))
+            return FederatedResult(name, None, ex, time.time() - time_begin)
+
+
+    def iter_fanout(self, method_name, *args, **kwargs):
+        """ generator: calling client method on all hosts concurrently, yields FederatedResult in order of arrival """
+        # optional keyword arguments: "hosts" (list of names, default all hosts),
+        #                             "timeout" (seconds for every host, default per-host timeout)
+        hosts = kwargs.pop('hosts', None)
+        common_timeout = kwargs.pop('timeout', None)
+        with self._clients_lock:
+            if hosts is None:
+                hosts = sorted(self._clients)
+            clients = [(name, self._clients[name]) for name in hosts]
+        if not clients:
+            return
+
+        # pool of this fan-out: sized by current number of hosts (e.g. after add_host()),
+        # workers stuck on unreachable hosts finish on their own and never block next fan-out
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers or len(clients))
+        # future -> (name, timeout, start_box)
+        pending = {}
+        time_begin = time.time()
+        try:
+            for name, client in clients:
+                timeout = common_timeout if common_timeout is not None else self._timeouts.get(name, self.timeout)
+                start_box = []
+                future = executor.submit(self._call, name, client, method_name, timeout, start_box, args, kwargs)
+                pending[future] = (name, timeout, start_box)
+
+            while pending:
+                # deadline of a host counts from start of it's request, not from queueing
+                deadlines = [start_box[0] + timeout for name, timeout, start_box in pending.values() if start_box]
+                wait_secs = max(0.0, min(deadlines) - time.time()) if deadlines else None
+                if len(deadlines) < len(pending):
+                    # queued requests: looking again soon for their start
+                    wait_secs = FEDERATION_POLL_SECS if wait_secs is None else min(wait_secs, FEDERATION_POLL_SECS)
+                done, _ = concurrent.futures.wait(pending,
+                                                  timeout=wait_secs,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)
+                    yield future.result()
+
+                # hosts without result after their deadline: reporting timeout, their worker finishes on it's own
+                now = time.time()
+                for future, (name, timeout, start_box) in list(pending.items()):
+                    if start_box and start_box[0] + timeout <= now and not future.done():
+                        pending.pop(future)
+                        yield FederatedResult(name, None,
+                                              TimeoutError('host "' + name + '" gave no result within timeout'),
+                                              now - start_box[0])
+        finally:
+            executor.shutdown(wait=False)
+
+
+    def fanout(self, method_name, *args, **kwargs):
+        """ calling client method on all hosts concurrently, returns dictionary name -> FederatedResult """
+        results = {}
+        for result in self.iter_fanout(method_name, *args, **kwargs):
+            results[result.host] = result
+        return results
+
+
+    def iter_get(self, path, **kwargs):
+        """ generator: "get" on all hosts, yields FederatedResult in order of arrival """
+        return self.iter_fanout('dp_get', path, **kwargs)
+
+
+    def dp_get(self, path, **kwargs):
+        """ "get" on all hosts, returns dictionary name -> FederatedResult """
+        return self.fanout('dp_get', path, **kwargs)
+
+
+    def iter_query(self, path, hosts=None, timeout=None, **query_kwargs):
+        """ generator: browsing with Query() on all hosts, yields FederatedResult in order of arrival """
+        # (e.g. iter_query('MSR01', regExPath='.*Istwert', maxDepth=-1))
+        return self.iter_fanout('dp_get', path, hosts=hosts, timeout=timeout, query=connector.Query(**query_kwargs))
+
+
+    def iter_responses(self, method_name, *args, **kwargs):
+        """ generator: flattened stream of tuples (host name, response) over all successful hosts """
+        for result in self.iter_fanout(method_name, *args, **kwargs):
+            if result.error is None:
+                for response in result.responses:
+                    yield result.host, response
+
+
+    def close(self):
+        """ closing all connections created by us """
+        with self._clients_lock:
+            own_clients = [self._clients[name] for name in self._own_clients]
+            self._own_clients.clear()
+        for client in own_clients:
+            _close_client(client)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'FederatedDMSClient(hosts=' + repr(self.get_hosts()) + ', timeout=' + repr(self.timeout) + ')'
+
+
+
+def _close_client(client):
+    # (DMSClient and DMSHttpClient)
+    client.close()
@@ -0,0 +1,398 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\gateway.py
+
+Local multiplexing gateway: many local tools share one WebSocket session to DMS,
+they connect to the gateway and speak the same "JSON Data Exchange" protocol as with DMS
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>every forwarded command gets a new tag (prefix GATEWAY_TAG_PREFIX), responses are routed back
+  to the local connection with it's original tag
+=>identical subscriptions (same path, query and event) of all local clients share one DMS subscription,
+  DMS-events are copied to every subscriber, last unsubscribe (or disconnect) unsubscribes at DMS
+=>raw frames are forwarded without decoding into Python objects (DMSClient(frame_filter=...)),
+  DMSClient of gateway is usable for own requests at the same time (attribute "dmsclient")
+=>usage: python -m visitoolkit_connector.gateway --dms-host 192.168.1.10 --port 9021
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import wsserver
+
+
+# prefix of tags used between gateway and DMS (DMSClient uses UUIDs, they never collide)
+GATEWAY_TAG_PREFIX = 'gw-'
+
+# seconds until a forwarded request without response is forgotten
+GATEWAY_REQUEST_TTL = connector.REQ_TIMEOUT
+
+# seconds between searches for forgotten requests
+GATEWAY_SWEEP_SECS = 10
+
+
+
+class _SharedSubscription(object):
+    """ one DMS subscription with all local subscribers """
+
+    def __init__(self, key, path, upstream_tag):
+        self.key = key
+        self.path = path
+        self.upstream_tag = upstream_tag
+        # set of (conn, client_tag)
+        self.subscribers = set()
+        # local subscribers waiting for response of DMS
+        self.waiting = []
+        # response of DMS (value and stamp get updated by DMS-events for later subscribers)
+        self.response = None
+
+
+
+class DMSGateway(wsserver.WebSocketServer):
+    """ WebSocket server for local clients, forwarding all requests over one DMSClient session """
+
+    def __init__(self, dms_host_str=connector.DMS_HOST, dms_port_int=connector.DMS_PORT,
+                 host='127.0.0.1', port=0, whois_str='gateway', user_str='gateway',
+                 path=connector.DMS_BASEPATH, deflate=True, compression_level=6, **client_kwargs):
+        # client_kwargs: additional arguments for DMSClient (e.g. compression=True)
+        super(DMSGateway, self).__init__(host=host, port=port, path=path, deflate=deflate, compression_level=compression_level)
+        self._dms_host_str = dms_host_str
+        self._dms_port_int = dms_port_int
+        self._whois_str = whois_str
+        self._user_str = user_str
+        self._client_kwargs = client_kwargs
+        self.dmsclient = None
+
+        self._lock = threading.Lock()
+        self._tag_counter = itertools.count()
+        # upstream tag -> (conn, client_tag, timestamp) of forwarded commands and request frames
+        self._requests = {}
+        # subscription key -> _SharedSubscription
+        self._subscriptions = {}
+        # upstream tag -> _SharedSubscription
+        self._upstream_subs = {}
+        # conn -> {client_tag: _SharedSubscription}
+        self._conn_subs = {}
+        self._next_sweep = time.time() + GATEWAY_SWEEP_SECS
+
+        self._nof_local_frames = 0
+        self._nof_malformed_frames = 0
+        self._nof_upstream_frames = 0
+        self._nof_collapsed = 0
+        self._nof_events = 0
+
+
+    def start(self):
+        """ connecting to DMS, then listening for local clients, returns self """
+        self.dmsclient = connector.DMSClient(whois_str=self._whois_str,
+                                             user_str=self._user_str,
+                                             dms_host_str=self._dms_host_str,
+                                             dms_port_int=self._dms_port_int,
+                                             frame_filter=self._on_upstream_frame,
+                                             **self._client_kwargs)
+        return super(DMSGateway, self).start()
+
+
+    def stop(self):
+        super(DMSGateway, self).stop()
+        if self.dmsclient:
+            self.dmsclient.close()
+
+
+    def _new_tag(self):
+        return GATEWAY_TAG_PREFIX + str(next(self._tag_counter))
+
+
+    def on_connect(self, conn):
+        with self._lock:
+            self._conn_subs[conn] = {}
+
+
+    def on_disconnect(self, conn):
+        upstream = {}
+        with self._lock:
+            for client_tag in list(self._conn_subs.get(conn, ())):
+                self._detach(conn, client_tag, upstream)
+            self._conn_subs.pop(conn, None)
+            for tag in [tag for tag, item in self._requests.items() if item[0] is conn]:
+                del self._requests[tag]
+        if upstream:
+            self._send_upstream(dict(upstream, whois=self._whois_str, user=self._user_str))
+
+
+    def on_message(self, conn, msg):
+        try:
+            request = json.loads(msg)
+            if not isinstance(request, dict):
+                raise ValueError('request frame has to be a JSON object')
+        except ValueError as ex:
+            # malformed frame: only this local client gets an error, nothing is forwarded to DMS
+            with self._lock:
+                self._nof_malformed_frames += 1
+            connector.logger.warning('DMSGateway: malformed frame from local client ' + repr(conn.address) + ': ' + repr(ex))
+            self._send_local(conn, {'code': connector._Response.CODE_ERROR,
+                                    'message': 'malformed request frame: ' + str(ex)})
+            return
+        upstream = {'whois': request.get('whois', self._whois_str),
+                    'user': request.get('user', self._user_str)}
+        local = {}
+        with self._lock:
+            self._nof_local_frames += 1
+            self._sweep()
+            # tag of request frame: routing of untagged responses (e.g. "changelogGetGroups")
+            frame_tag = self._new_tag()
+            self._requests[frame_tag] = (conn, request.get('tag'), time.time())
+            upstream['tag'] = frame_tag
+            header_size = len(upstream)
+            for cmd_type, cmd_list in request.items():
+                if not isinstance(cmd_list, list):
+                    continue
+                for cmd in cmd_list:
+                    if cmd_type == 'subscribe':
+                        self._subscribe(conn, cmd, upstream, local)
+                    elif cmd_type == 'unsubscribe':
+                        self._unsubscribe(conn, cmd, upstream, local)
+                    else:
+                        cmd = dict(cmd)
+                        gw_tag = self._new_tag()
+                        self._requests[gw_tag] = (conn, cmd.get('tag'), time.time())
+                        cmd['tag'] = gw_tag
+                        upstream.setdefault(cmd_type, []).append(cmd)
+            if len(upstream) == header_size:
+                # all commands were answered by gateway
+                del self._requests[frame_tag]
+                upstream = None
+
+        if upstream:
+            self._send_upstream(upstream)
+        if local:
+            if 'tag' in request:
+                local['tag'] = request['tag']
+            self._send_local(conn, local)
+
+
+    def _subscribe(self, conn, cmd, upstream, local):
+        client_tag = cmd.get('tag')
+        if client_tag is None:
+            local.setdefault('subscribe', []).append({'code': connector._Response.CODE_ERROR,
+                                                      'path': cmd.get('path'),
+                                                      'message': 'subscriptions need a tag'})
+            return
+        if client_tag in self._conn_subs[conn]:
+            # same tag again: replacing old subscription
+            self._detach(conn, client_tag, upstream)
+
+        key = json.dumps({field: value for field, value in cmd.items() if field != 'tag'}, sort_keys=True)
+        sub = self._subscriptions.get(key)
+        if sub is None:
+            sub = _SharedSubscription(key=key, path=cmd['path'], upstream_tag=self._new_tag())
+            self._subscriptions[key] = sub
+            self._upstream_subs[sub.upstream_tag] = sub
+            upstream.setdefault('subscribe', []).append(dict(cmd, tag=sub.upstream_tag))
+        else:
+            self._nof_collapsed += 1
+        sub.subscribers.add((conn, client_tag))
+        self._conn_subs[conn][client_tag] = sub
+        if sub.response is None:
+            sub.waiting.append((conn, client_tag))
+        else:
+            local.setdefault('subscribe', []).append(dict(sub.response, tag=client_tag))
+
+
+    def _unsubscribe(self, conn, cmd, upstream, local):
+        client_tag = cmd.get('tag')
+        if client_tag in self._conn_subs[conn]:
+            self._detach(conn, client_tag, upstream)
+            code = connector._Response.CODE_OK
+        else:
+            code = connector._Response.CODE_NOTFOUND
+        local.setdefault('unsubscribe', []).append({'code': code, 'path': cmd.get('path'), 'tag': client_tag})
+
+
+    def _detach(self, conn, client_tag, upstream):
+        # removing local subscriber, last one unsubscribes at DMS
+        sub = self._conn_subs[conn].pop(client_tag)
+        sub.subscribers.discard((conn, client_tag))
+        if (conn, client_tag) in sub.waiting:
+            sub.waiting.remove((conn, client_tag))
+        if not sub.subscribers:
+            del self._subscriptions[sub.key]
+            del self._upstream_subs[sub.upstream_tag]
+            # (response of DMS has an unknown gateway tag, it gets dropped)
+            upstream.setdefault('unsubscribe', []).append({'path': sub.path, 'tag': sub.upstream_tag})
+
+
+    def _sweep(self):
+        # forgetting requests without response (e.g. lost during reconnection of DMS)
+        now = time.time()
+        if now >= self._next_sweep:
+            self._next_sweep = now + GATEWAY_SWEEP_SECS
+            for tag in [tag for tag, item in self._requests.items() if now - item[2] > GATEWAY_REQUEST_TTL]:
+                del self._requests[tag]
+
+
+    def _send_upstream(self, frame):
+        self.dmsclient.send_raw(json.dumps(frame))
+        with self._lock:
+            self._nof_upstream_frames += 1
+
+
+    def _send_local(self, conn, frame):
+        try:
+            conn.send_message(json.dumps(frame))
+        except Exception as ex:
+            # local client is gone, cleanup is done by on_disconnect()
+            connector.logger.debug('DMSGateway: sending to local client failed: ' + repr(ex))
+
+
+    def _on_upstream_frame(self, msg):
+        # runs in websocket thread of DMSClient, returns frame for own DMSClient without items of gateway
+        # (None when whole frame belongs to gateway)
+        if GATEWAY_TAG_PREFIX not in msg:
+            return msg
+        frame = json.loads(msg)
+        consumed = False
+        # conn -> frame for local client
+        out_frames = {}
+        # remaining frame for own DMSClient (e.g. DMS-events of it's own subscriptions in same frame)
+        own_frame = {}
+        with self._lock:
+            owner = None
+            frame_tag = frame.get('tag')
+            if isinstance(frame_tag, str) and frame_tag.startswith(GATEWAY_TAG_PREFIX):
+                consumed = True
+                owner = self._requests.pop(frame_tag, None)
+            done_tags = set()
+            for cmd_type, items in frame.items():
+                if not isinstance(items, list):
+                    if owner is None:
+                        own_frame[cmd_type] = items
+                    continue
+                for item in items:
+                    tag = item.get('tag')
+                    if tag is None:
+                        if owner is not None:
+                            out_frames.setdefault(owner[0], {}).setdefault(cmd_type, []).append(item)
+                        else:
+                            own_frame.setdefault(cmd_type, []).append(item)
+                        continue
+                    if not isinstance(tag, str) or not tag.startswith(GATEWAY_TAG_PREFIX):
+                        own_frame.setdefault(cmd_type, []).append(item)
+                        continue
+                    consumed = True
+                    if cmd_type == 'event':
+                        self._route_event(item, out_frames)
+                    elif cmd_type == 'subscribe' and tag in self._upstream_subs:
+                        self._route_subscribe_response(item, out_frames)
+                    elif tag in self._requests:
+                        conn, client_tag, _ = self._requests[tag]
+                        done_tags.add(tag)
+                        item = dict(item)
+                        if client_tag is None:
+                            del item['tag']
+                        else:
+                            item['tag'] = client_tag
+                        out_frames.setdefault(conn, {}).setdefault(cmd_type, []).append(item)
+            # (responses of one command are all in the same frame, e.g. "get" with query)
+            for tag in done_tags:
+                del self._requests[tag]
+
+        if not consumed:
+            return msg
+        for conn, out_frame in out_frames.items():
+            if owner is not None and conn is owner[0] and owner[1] is not None:
+                out_frame['tag'] = owner[1]
+            self._send_local(conn, out_frame)
+        if any(isinstance(items, list) for items in own_frame.values()):
+            return json.dumps(own_frame)
+        return None
+
+
+    def _route_event(self, event, out_frames):
+        sub = self._upstream_subs.get(event['tag'])
+        if sub is None:
+            return
+        if sub.response is not None and event.get('path') == sub.path and 'value' in event:
+            sub.response['value'] = event['value']
+            for field in ('type', 'stamp'):
+                if field in event:
+                    sub.response[field] = event[field]
+        for conn, client_tag in sub.subscribers:
+            out_frames.setdefault(conn, {}).setdefault('event', []).append(dict(event, tag=client_tag))
+            self._nof_events += 1
+
+
+    def _route_subscribe_response(self, response, out_frames):
+        sub = self._upstream_subs[response['tag']]
+        waiting = sub.waiting
+        sub.waiting = []
+        if response.get('code') == connector._Response.CODE_OK:
+            sub.response = dict(response)
+        else:
+            # DMS refused subscription: all local subscribers get the error
+            del self._subscriptions[sub.key]
+            del self._upstream_subs[sub.upstream_tag]
+            for conn, client_tag in sub.subscribers:
+                self._conn_subs[conn].pop(client_tag, None)
+            sub.subscribers.clear()
+        for conn, client_tag in waiting:
+            out_frames.setdefault(conn, {}).setdefault('subscribe', []).append(dict(response, tag=client_tag))
+
+
+    def get_stats(self):
+        """ returns dictionary with numbers of local clients, subscriptions and forwarded frames """
+        with self._lock:
+            return {'local_clients': len(self._conn_subs),
+                    'local_subscriptions': sum(len(subs) for subs in self._conn_subs.values()),
+                    'upstream_subscriptions': len(self._subscriptions),
+                    'collapsed_subscriptions': self._nof_collapsed,
+                    'pending_requests': len(self._requests),
+                    'local_frames': self._nof_local_frames,
+                    'malformed_frames': self._nof_malformed_frames,
+                    'upstream_frames': self._nof_upstream_frames,
+                    'routed_events': self._nof_events}
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local gateway: many clients share one WebSocket session to DMS')
+    parser.add_argument('--dms-host', default=connector.DMS_HOST)
+    parser.add_argument('--dms-port', type=int, default=connector.DMS_PORT)
+    parser.add_argument('--host', default='127.0.0.1', help='listening address for local clients')
+    parser.add_argument('--port', type=int, default=connector.DMS_PORT + 1, help='listening port for local clients')
+    parser.add_argument('--whois', default='gateway')
+    parser.add_argument('--user', default='gateway')
+    args = parser.parse_args()
+
+    gateway = DMSGateway(dms_host_str=args.dms_host,
+                         dms_port_int=args.dms_port,
+                         host=args.host,
+                         port=args.port,
+                         whois_str=args.whois,
+                         user_str=args.user)
+    gateway.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        gateway.stop()
@@ -0,0 +1,361 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\loadgen.py
+
+Load generator for DMS and connector: configurable mix of "get", "set", "subscribe" and "histData" traffic,
+report with throughput, latency percentiles and error rates as JSON
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>"concurrency" worker threads share one DMSClient session, they are started one after another during "ramp_up" seconds
+=>reads are sent in batches (DMSClient.dp_get_multi(): "batch" commands in one frame),
+  every read reaches DMS (no coalescing of identical reads)
+=>latency of every operation is one round trip (a batch of reads counts as one operation of "batch" commands),
+  "subscribe" includes unsubscribing
+=>usage: visitoolkit-loadgen --standin 10000 --mix get=70,set=20,subscribe=5,histdata=5 --concurrency 8 --duration 30
+         visitoolkit-loadgen --host 192.168.1.10 --root MSR01 --duration 60 --output report.json
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import array
+import datetime
+import json
+import random
+import sys
+import threading
+import time
+
+from visitoolkit_connector import connector
+
+
+# operations of load generator
+LOADGEN_OPERATIONS = ('get', 'set', 'subscribe', 'histdata')
+
+# default mix (relative weights of operations)
+LOADGEN_MIX = 'get=70,set=20,subscribe=5,histdata=5'
+
+# reported latency percentiles
+LOADGEN_PERCENTILES = (50, 90, 95, 99, 99.9)
+
+# seconds of trend data in one "histData" request
+LOADGEN_HISTDATA_SECS = 3600
+
+
+
+def parse_mix(mix_str):
+    """ parsing mix like "get=70,set=20" into dictionary operation -> weight """
+    mix = {}
+    for part in mix_str.split(','):
+        if not part.strip():
+            continue
+        op, _, weight = part.partition('=')
+        op = op.strip().lower()
+        if op not in LOADGEN_OPERATIONS:
+            raise ValueError('parse_mix(): unknown operation "' + op + '", expected one of ' + repr(LOADGEN_OPERATIONS))
+        mix[op] = float(weight) if weight else 1.0
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError('parse_mix(): mix "' + mix_str + '" contains no operation')
+    return mix
+
+
+def percentile(sorted_values, percent):
+    """ percentile of sorted sequence (nearest rank), None when sequence is empty """
+    if not sorted_values:
+        return None
+    rank = int(round(percent / 100.0 * (len(sorted_values) - 1)))
+    return sorted_values[rank]
+
+
+
+class _OpStats(object):
+    """ latencies and error counter of one operation """
+
+    def __init__(self):
+        # latencies in seconds (8 bytes per operation)
+        self.latencies = array.array('d')
+        self.nof_commands = 0
+        self.nof_errors = 0
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, latency_secs, nof_commands, error=None):
+        with self._lock:
+            self.latencies.append(latency_secs)
+            self.nof_commands += nof_commands
+            if error is not None:
+                self.nof_errors += 1
+                descr = error if isinstance(error, str) else error.__class__.__name__
+                self.errors[descr] = self.errors.get(descr, 0) + 1
+
+    def as_dict(self, elapsed_secs):
+        with self._lock:
+            latencies = sorted(self.latencies)
+            nof_ops = len(latencies)
+            result = {'operations': nof_ops,
+                      'commands': self.nof_commands,
+                      'errors': self.nof_errors,
+                      'error_rate': self.nof_errors / nof_ops if nof_ops else 0.0,
+                      'ops_per_sec': nof_ops / elapsed_secs if elapsed_secs else None,
+                      'commands_per_sec': self.nof_commands / elapsed_secs if elapsed_secs else None,
+                      'latency_ms': None,
+                      'error_types': dict(self.errors)}
+        if latencies:
+            latency_ms = {'min': latencies[0] * 1000.0,
+                          'mean': sum(latencies) / nof_ops * 1000.0,
+                          'max': latencies[-1] * 1000.0}
+            for percent in LOADGEN_PERCENTILES:
+                latency_ms['p' + str(percent).replace('.0', '')] = percentile(latencies, percent) * 1000.0
+            result['latency_ms'] = latency_ms
+        return result
+
+
+
+class LoadGenerator(object):
+    """ worker threads sending a random mix of operations over one DMSClient """
+
+    def __init__(self, dmsclient, paths, mix=LOADGEN_MIX, concurrency=4, duration=10.0, ramp_up=0.0,
+                 batch=10, timeout=10.0, seed=None):
+        # dmsclient: connected DMSClient
+        # paths: list of datapoints used by all operations ("set" writes random floats into them!)
+        # mix: dictionary operation -> weight, or string like "get=70,set=20"
+        if not paths:
+            raise ValueError('LoadGenerator: no datapoints for load test')
+        self._dmsclient = dmsclient
+        self.paths = list(paths)
+        self.mix = parse_mix(mix) if isinstance(mix, str) else dict(mix)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.ramp_up = ramp_up
+        self.batch = batch
+        self.timeout = timeout
+        self.seed = seed
+
+        self._ops = [op for op in LOADGEN_OPERATIONS if self.mix.get(op, 0) > 0]
+        self._weights = [self.mix[op] for op in self._ops]
+        self._stats = {op: _OpStats() for op in self._ops}
+        self._nof_events = 0
+        # (event callbacks run in thread of DMSClient, report is built in caller thread)
+        self._events_lock = threading.Lock()
+        self._keep_running = False
+
+
+    def run(self):
+        """ generating load for "duration" seconds (blocking), returns report as dictionary """
+        self._keep_running = True
+        workers = []
+        time_begin = time.time()
+        deadline = time_begin + self.duration
+        for idx in range(self.concurrency):
+            start_delay = self.ramp_up * idx / self.concurrency
+            rand = random.Random(None if self.seed is None else self.seed + idx)
+            worker = threading.Thread(target=self._run_worker,
+                                      args=(time_begin + start_delay, deadline, rand),
+                                      name='LoadGenerator worker ' + str(idx))
+            worker.daemon = True
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        self._keep_running = False
+        return self.get_report(time.time() - time_begin)
+
+
+    def stop(self):
+        """ stopping workers after their current operation """
+        self._keep_running = False
+
+
+    def _run_worker(self, start_time, deadline, rand):
+        delay = start_time - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        while self._keep_running and time.time() < deadline:
+            op = rand.choices(self._ops, weights=self._weights)[0]
+            time_begin = time.time()
+            error = None
+            nof_commands = 1
+            try:
+                if op == 'get':
+                    nof_commands = self.batch
+                    error = self._do_get(rand)
+                elif op == 'set':
+                    error = self._do_set(rand)
+                elif op == 'subscribe':
+                    error = self._do_subscribe(rand)
+                else:
+                    error = self._do_histdata(rand)
+            except Exception as ex:
+                error = ex
+            self._stats[op].add(time.time() - time_begin, nof_commands, error)
+
+
+    @staticmethod
+    def _check(responses):
+        # returns error description of first failed response, None when all are ok
+        for response in responses:
+            if response['code'] != 'ok':
+                return 'code "' + str(response['code']) + '"'
+        return None
+
+
+    def _do_get(self, rand):
+        results = self._dmsclient.dp_get_multi([rand.choice(self.paths) for _ in range(self.batch)], timeout=self.timeout)
+        for result in results:
+            if isinstance(result, Exception):
+                return result
+            error = self._check(result)
+            if error:
+                return error
+        return None
+
+
+    def _do_set(self, rand):
+        return self._check(self._dmsclient.dp_set(rand.choice(self.paths),
+                                                  timeout=self.timeout,
+                                                  value=round(rand.uniform(0.0, 100.0), 3)))
+
+
+    def _do_subscribe(self, rand):
+        subscription = self._dmsclient.get_dp_subscription(rand.choice(self.paths),
+                                                           timeout=self.timeout,
+                                                           event=connector.ON_CHANGE | connector.ON_SET)
+        subscription += self._cb_event
+        error = self._check([subscription.sub_response])
+        subscription.unsubscribe()
+        return error
+
+
+    def _do_histdata(self, rand):
+        start = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=LOADGEN_HISTDATA_SECS)
+        return self._check(self._dmsclient.dp_get(rand.choice(self.paths),
+                                                  timeout=self.timeout,
+                                                  histData=connector.HistData(start=start.isoformat(), format='compact')))
+
+
+    def _cb_event(self, event):
+        with self._events_lock:
+            self._nof_events += 1
+
+
+    def get_report(self, elapsed_secs):
+        """ returns dictionary with configuration and statistics of every operation """
+        operations = {op: stats.as_dict(elapsed_secs) for op, stats in self._stats.items()}
+        nof_ops = sum(item['operations'] for item in operations.values())
+        nof_errors = sum(item['errors'] for item in operations.values())
+        nof_commands = sum(item['commands'] for item in operations.values())
+        total = _OpStats()
+        for stats in self._stats.values():
+            total.latencies.extend(stats.latencies)
+        total_dict = total.as_dict(elapsed_secs)
+        total_dict.update({'operations': nof_ops,
+                           'commands': nof_commands,
+                           'errors': nof_errors,
+                           'error_rate': nof_errors / nof_ops if nof_ops else 0.0,
+                           'commands_per_sec': nof_commands / elapsed_secs if elapsed_secs else None})
+        del total_dict['error_types']
+        with self._events_lock:
+            nof_events = self._nof_events
+        return {'config': {'mix': self.mix,
+                           'concurrency': self.concurrency,
+                           'duration_secs': self.duration,
+                           'ramp_up_secs': self.ramp_up,
+                           'batch': self.batch,
+                           'timeout_secs': self.timeout,
+                           'datapoints': len(self.paths)},
+                'elapsed_secs': elapsed_secs,
+                'events_received': nof_events,
+                'total': total_dict,
+                'operations': operations}
+
+
+
+def discover_paths(dmsclient, root, limit=None, timeout=connector.REQ_TIMEOUT):
+    """ returns paths of all datapoints without children below "root" (at most "limit") """
+    responses = dmsclient.dp_get(root, timeout=timeout, query=connector.Query(regExPath='.*', maxDepth=-1))
+    paths = [response['path'] for response in responses
+             if response['code'] == 'ok' and not response.get('hasChild', False)]
+    if limit:
+        paths = paths[:limit]
+    return paths
+
+
+def main(argv=None):
+    """ entry point of console script "visitoolkit-loadgen" """
+    parser = argparse.ArgumentParser(description='load generator for DMS "JSON Data Exchange" (report as JSON)')
+    parser.add_argument('--host', default=connector.DMS_HOST)
+    parser.add_argument('--port', type=int, default=connector.DMS_PORT)
+    parser.add_argument('--standin', type=int, metavar='DATAPOINTS', default=0,
+                        help='start local stand-in server with this number of datapoints (ignores --host and --port)')
+    parser.add_argument('--root', default='SIM', help='datapoints below this path are used (caution: "set" overwrites them)')
+    parser.add_argument('--path', action='append', default=[], help='use this datapoint (repeatable, instead of --root)')
+    parser.add_argument('--limit', type=int, default=None, help='maximum number of used datapoints')
+    parser.add_argument('--mix', default=LOADGEN_MIX, help='weights of operations ' + repr(LOADGEN_OPERATIONS))
+    parser.add_argument('--concurrency', type=int, default=4, help='number of worker threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds of load test (including ramp-up)')
+    parser.add_argument('--ramp-up', type=float, default=0.0, help='seconds until all workers are started')
+    parser.add_argument('--batch', type=int, default=10, help='number of reads in one "get" frame')
+    parser.add_argument('--timeout', type=float, default=10.0, help='seconds until a request counts as error')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--whois', default='loadgen')
+    parser.add_argument('--user', default='loadgen')
+    parser.add_argument('--output', default=None, help='write report into this file instead of stdout')
+    args = parser.parse_args(argv)
+
+    server = None
+    host, port = args.host, args.port
+    if args.standin:
+        from visitoolkit_connector import standin
+        server = standin.StandInDMS(host='127.0.0.1', port=0)
+        server.populate(args.standin, prefix=args.root)
+        server.start()
+        host, port = '127.0.0.1', server.port
+
+    dmsclient = connector.DMSClient(whois_str=args.whois,
+                                    user_str=args.user,
+                                    dms_host_str=host,
+                                    dms_port_int=port)
+    try:
+        paths = args.path or discover_paths(dmsclient, args.root, limit=args.limit)
+        generator = LoadGenerator(dmsclient=dmsclient,
+                                  paths=paths,
+                                  mix=args.mix,
+                                  concurrency=args.concurrency,
+                                  duration=args.duration,
+                                  ramp_up=args.ramp_up,
+                                  batch=args.batch,
+                                  timeout=args.timeout,
+                                  seed=args.seed)
+        report = generator.run()
+        report['server'] = 'stand-in' if server else host + ':' + str(port)
+    finally:
+        dmsclient.close()
+        if server:
+            server.stop()
+
+    report_str = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report_str + '\n')
+    else:
+        print(report_str)
+    return 1 if report['total']['errors'] else 0
+
+
+
+if __name__ == '__main__':
+    sys.exit(main())
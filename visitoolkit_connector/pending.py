@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\pending.py
+
+Table of in-flight requests of _MessageHandler: message tags waiting for their responses,
+with deadlines, cancellation and a background thread removing expired entries
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>a waiting thread is woken up by set_response() (no busy-waiting)
+=>expired and cancelled requests never leak: their tags are removed by _PendingSweeper
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# interval in seconds for removing expired requests nobody is waiting for
+PENDING_SWEEP_INTERVAL = 10
+# number of remembered tags of timed out or cancelled requests (for counting late responses)
+PENDING_FINISHED_TAGS_SIZE = 10000
+
+
+
+class _PendingResponseTable(object):
+    """ in-flight requests: message tags waiting for their responses """
+    # =>every request has a deadline, the sweeper removes expired entries nobody is waiting for
+    # =>responses for timed out or cancelled requests are counted as "late",
+    #   responses with unknown tags are counted as "orphaned"
+
+    # object for "busy-waiting" mechanism in responses
+    class _Response_container(object):
+        def __init__(self, deadline):
+            self.isAvailable = threading.Event()
+            self.response_list = []
+            self.created = time.time()
+            self.deadline = deadline
+            self.isWaiting = False
+            self.isCancelled = False
+
+
+    def __init__(self, default_timeout):
+        self.default_timeout = default_timeout
+
+        # dict for pending responses (key: cmd-tag, value: _Response_container)
+        self._containers_dict = {}
+        # tags of recently timed out or cancelled requests (ordered for removing oldest ones)
+        self._finished_tags = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        # statistics
+        self.nof_late_responses = 0
+        self.nof_orphaned_responses = 0
+        self.nof_timeouts = 0
+        self.nof_expired = 0
+        self.nof_cancelled = 0
+
+
+    def register(self, tag, timeout=None):
+        """ prepare waiting for response with this tag """
+        if timeout is None:
+            timeout = self.default_timeout
+        with self._lock:
+            self._containers_dict[tag] = _PendingResponseTable._Response_container(deadline=time.time() + timeout)
+
+
+    def set_response(self, tag, response_list):
+        """ store response list and wake up waiting thread, returns False when nobody expects this tag """
+        with self._lock:
+            container = self._containers_dict.get(tag, None)
+            if container is None:
+                if tag in self._finished_tags:
+                    self.nof_late_responses += 1
+                else:
+                    self.nof_orphaned_responses += 1
+                return False
+            container.response_list = response_list
+            container.isAvailable.set()
+        return True
+
+
+    def wait(self, tag, timeout):
+        """ blocks until response is available, returns list of response objects """
+        with self._lock:
+            try:
+                container = self._containers_dict[tag]
+            except KeyError:
+                raise Exception('_PendingResponseTable.wait(): message tag "' + str(tag) + '" is not registered (request was cancelled or expired)...')
+            container.isWaiting = True
+            container.deadline = time.time() + timeout
+        try:
+            is_available = container.isAvailable.wait(timeout=timeout)
+        finally:
+            # entry is always removed, so late responses can't leak memory
+            self._finish(tag, container)
+        if container.isCancelled:
+            raise Exception('_MessageHandler.DMS_busy_wait_for_response(): request with message tag "' + str(tag) + '" was cancelled...')
+        if not is_available:
+            with self._lock:
+                self.nof_timeouts += 1
+            raise Exception('_MessageHandler.DMS_busy_wait_for_response(): got no response within ' + str(timeout) + ' seconds...')
+        return container.response_list
+
+
+    def poll(self, tag):
+        """ non-blocking: returns list of response objects and removes entry, None when no response is available """
+        with self._lock:
+            container = self._containers_dict.get(tag, None)
+            if container and container.isAvailable.is_set():
+                del(self._containers_dict[tag])
+                return container.response_list
+        return None
+
+
+    def discard(self, tag):
+        """ remove entry without waiting (e.g. when command was never sent) """
+        with self._lock:
+            self._containers_dict.pop(tag, None)
+
+
+    def cancel(self, tag):
+        """ cancel pending request, a waiting thread gets an exception; returns False when tag is unknown """
+        with self._lock:
+            container = self._containers_dict.get(tag, None)
+            if container is None:
+                return False
+            container.isCancelled = True
+            self.nof_cancelled += 1
+        self._finish(tag, container)
+        container.isAvailable.set()
+        return True
+
+
+    def sweep(self):
+        """ remove all expired entries nobody is waiting for, returns number of removed entries """
+        now = time.time()
+        with self._lock:
+            expired_tags = [tag for tag, container in self._containers_dict.items()
+                            if not container.isWaiting and container.deadline < now]
+            for tag in expired_tags:
+                del(self._containers_dict[tag])
+                self._remember_finished(tag)
+            self.nof_expired += len(expired_tags)
+        if expired_tags:
+            logger.debug('_PendingResponseTable.sweep(): removed ' + str(len(expired_tags)) + ' expired requests')
+        return len(expired_tags)
+
+
+    def _finish(self, tag, container):
+        with self._lock:
+            if self._containers_dict.get(tag, None) is container:
+                del(self._containers_dict[tag])
+                if not container.isAvailable.is_set() or container.isCancelled:
+                    self._remember_finished(tag)
+
+    def _remember_finished(self, tag):
+        # (caller has to hold the lock)
+        self._finished_tags[tag] = None
+        while len(self._finished_tags) > PENDING_FINISHED_TAGS_SIZE:
+            self._finished_tags.popitem(last=False)
+
+
+    def get_pending(self):
+        """ returns list of tuples (tag, age in seconds, waiting flag) of all pending requests """
+        now = time.time()
+        with self._lock:
+            return [(tag, now - container.created, container.isWaiting) for tag, container in self._containers_dict.items()]
+
+    def get_stats(self):
+        """ returns dictionary with counters """
+        with self._lock:
+            return {'pending': len(self._containers_dict),
+                    'late_responses': self.nof_late_responses,
+                    'orphaned_responses': self.nof_orphaned_responses,
+                    'timeouts': self.nof_timeouts,
+                    'expired': self.nof_expired,
+                    'cancelled': self.nof_cancelled}
+
+    def __contains__(self, tag):
+        with self._lock:
+            return tag in self._containers_dict
+
+    def __len__(self):
+        with self._lock:
+            return len(self._containers_dict)
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return '_PendingResponseTable(' + repr(self.get_stats()) + ')'
+
+
+
+class _PendingSweeper(threading.Thread):
+    """ periodically removing expired entries in _PendingResponseTable """
+
+    def __init__(self, pending_table, interval=PENDING_SWEEP_INTERVAL):
+        super(_PendingSweeper, self).__init__()
+        self.daemon = True
+        self._pending_table = pending_table
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(timeout=self._interval):
+            try:
+                self._pending_table.sweep()
+            except Exception:
+                logger.exception('_PendingSweeper.run(): exception while removing expired requests')
+
+    def stop(self):
+        self._stop_event.set()
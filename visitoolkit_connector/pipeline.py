@@ -0,0 +1,397 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\pipeline.py
+
+Chains of stream operators between received DMS-events and callbacks of a SubscriptionES
+(filter, map, deadband, debounce, throttle, tumbling and sliding windows)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>created by SubscriptionES.pipeline(), operators are appended in order of calls (fluent interface)
+=>all timed operators of all pipelines share one background thread (_PipelineTimer)
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import collections
+import collections.abc
+import heapq
+import logging
+import threading
+import time
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+
+
+class _PipelineTimer(threading.Thread):
+    """ one background thread for timed operators of all EventPipeline objects (debounce, throttle, windows) """
+    # =>timers are entries in a heap, operators re-arm themselves instead of cancelling
+    #   (e.g. debounce of a noisy datapoint has one timer per quiet period, not one per event)
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        super(_PipelineTimer, self).__init__(name='EventPipeline timer')
+        self.daemon = True
+        self._heap = []
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    @classmethod
+    def get_instance(cls):
+        """ returns shared timer thread (started on first call) """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+                cls._instance.start()
+            return cls._instance
+
+    def schedule(self, deadline, callback):
+        """ executing callback() at deadline (value of time.monotonic()) """
+        with self._cond:
+            # (sequence number: callbacks with same deadline are never compared)
+            self._seq += 1
+            heapq.heappush(self._heap, (deadline, self._seq, callback))
+            if self._heap[0][1] == self._seq:
+                self._cond.notify()
+
+    def run(self):
+        while True:
+            with self._cond:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._cond.wait(timeout=self._heap[0][0] - time.monotonic() if self._heap else None)
+                deadline, seq, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception:
+                logger.exception('_PipelineTimer.run(): exception in timed operator of EventPipeline')
+
+
+
+def _item_value(item):
+    # value of DMSEvent (or of other mappings), any other item is used as value itself
+    if isinstance(item, collections.abc.Mapping):
+        return item.get('value', None)
+    return item
+
+
+class _PipelineStage(object):
+    """ superclass of operators in EventPipeline (without overriding push() it passes all items unchanged) """
+    # =>push() gets one item and hands over zero or more items to "downstream" (push() of next stage or output),
+    #   timed operators are executed by _PipelineTimer while holding lock of pipeline
+
+    def __init__(self, pipeline):
+        self._pipeline = pipeline
+        self.downstream = None
+
+    def push(self, item):
+        self.downstream(item)
+
+    def _schedule(self, deadline, callback):
+        _PipelineTimer.get_instance().schedule(deadline, lambda: self._pipeline._run_timed(callback))
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return self.__class__.__name__.lstrip('_') + '()'
+
+
+class _FilterStage(_PipelineStage):
+    def __init__(self, pipeline, predicate):
+        super(_FilterStage, self).__init__(pipeline)
+        self._predicate = predicate
+
+    def push(self, item):
+        if self._predicate(item):
+            self.downstream(item)
+
+
+class _MapStage(_PipelineStage):
+    def __init__(self, pipeline, func):
+        super(_MapStage, self).__init__(pipeline)
+        self._func = func
+
+    def push(self, item):
+        self.downstream(self._func(item))
+
+
+class _DeadbandStage(_PipelineStage):
+    def __init__(self, pipeline, delta, relative):
+        super(_DeadbandStage, self).__init__(pipeline)
+        self._delta = float(delta)
+        self._relative = relative
+        # last passed value (only a number is kept, no reference to event)
+        self._last = None
+
+    def push(self, item):
+        val = _item_value(item)
+        try:
+            val = float(val)
+        except (TypeError, ValueError):
+            # not a number (e.g. string or "null"): every change passes
+            if val != self._last:
+                self._last = val
+                self.downstream(item)
+            return
+        if self._last is None or isinstance(self._last, str):
+            is_passing = True
+        else:
+            threshold = self._delta * abs(self._last) if self._relative else self._delta
+            is_passing = abs(val - self._last) >= threshold
+        if is_passing:
+            self._last = val
+            self.downstream(item)
+
+
+class _DebounceStage(_PipelineStage):
+    def __init__(self, pipeline, secs):
+        super(_DebounceStage, self).__init__(pipeline)
+        self._secs = float(secs)
+        self._pending = None
+        self._deadline = 0.0
+        self._armed = False
+
+    def push(self, item):
+        self._pending = item
+        self._deadline = time.monotonic() + self._secs
+        if not self._armed:
+            self._armed = True
+            self._schedule(self._deadline, self._on_timer)
+
+    def _on_timer(self):
+        if self._deadline > time.monotonic():
+            # events arrived meanwhile: quiet period begins again
+            self._schedule(self._deadline, self._on_timer)
+            return
+        self._armed = False
+        item = self._pending
+        self._pending = None
+        self.downstream(item)
+
+
+class _ThrottleStage(_PipelineStage):
+    def __init__(self, pipeline, secs, trailing):
+        super(_ThrottleStage, self).__init__(pipeline)
+        self._secs = float(secs)
+        self._trailing = trailing
+        self._next_allowed = 0.0
+        self._pending = None
+        self._has_pending = False
+        self._armed = False
+
+    def push(self, item):
+        now = time.monotonic()
+        if now >= self._next_allowed and not self._armed:
+            self._next_allowed = now + self._secs
+            self.downstream(item)
+        elif self._trailing:
+            # newest suppressed item is handed over at end of interval
+            self._pending = item
+            self._has_pending = True
+            if not self._armed:
+                self._armed = True
+                self._schedule(self._next_allowed, self._on_timer)
+
+    def _on_timer(self):
+        self._armed = False
+        if self._has_pending:
+            item = self._pending
+            self._pending = None
+            self._has_pending = False
+            self._next_allowed = time.monotonic() + self._secs
+            self.downstream(item)
+
+
+class _TumblingWindowStage(_PipelineStage):
+    def __init__(self, pipeline, secs, count):
+        super(_TumblingWindowStage, self).__init__(pipeline)
+        assert secs or count, 'tumbling window needs "secs" or "count"'
+        self._secs = secs
+        self._count = count
+        self._items = []
+        self._window_id = 0
+
+    def push(self, item):
+        if not self._items and self._secs:
+            # window opens with it's first item
+            window_id = self._window_id
+            self._schedule(time.monotonic() + self._secs, lambda: self._on_timer(window_id))
+        self._items.append(item)
+        if self._count and len(self._items) >= self._count:
+            self._flush()
+
+    def _flush(self):
+        items = self._items
+        self._items = []
+        self._window_id += 1
+        self.downstream(items)
+
+    def _on_timer(self, window_id):
+        # (window could be closed already by "count")
+        if window_id == self._window_id and self._items:
+            self._flush()
+
+
+class _SlidingWindowStage(_PipelineStage):
+    def __init__(self, pipeline, secs, count):
+        super(_SlidingWindowStage, self).__init__(pipeline)
+        assert secs or count, 'sliding window needs "secs" or "count"'
+        self._secs = secs
+        self._items = collections.deque(maxlen=count)
+        self._stamps = collections.deque(maxlen=count)
+
+    def push(self, item):
+        now = time.monotonic()
+        self._items.append(item)
+        self._stamps.append(now)
+        if self._secs:
+            while self._stamps[0] <= now - self._secs:
+                self._stamps.popleft()
+                self._items.popleft()
+        self.downstream(list(self._items))
+
+
+
+class EventPipeline(object):
+    """ chain of operators between received DMS-events and callbacks of a SubscriptionES """
+    # =>created by SubscriptionES.pipeline(), operators are appended in order of calls (fluent interface):
+    #   subES.pipeline().filter(lambda ev: ev.value is not None).deadband(0.5).debounce(2.0)
+    # =>operators run in frame decoding thread (timed operators in one shared timer thread),
+    #   only items passing all operators are queued for firing callbacks
+    # =>operators keep only their state (last value, pending item), no per-event containers
+    # =>passed items are handed over after releasing the lock: emit() can block (full event queue with OVERFLOW_BLOCK),
+    #   this must never block the shared timer thread while it holds the lock of a pipeline
+
+    def __init__(self, subES, emit):
+        self._subES = subES
+        # emit(subES, item): queueing item for callbacks
+        self._emit = emit
+        self._stages = []
+        self._head = self._output
+        self._lock = threading.RLock()
+        self._closed = False
+        # items which passed all operators, waiting for emit() (look in _flush())
+        self._outbox = collections.deque()
+        self._is_flushing = False
+        self.nof_in = 0
+        self.nof_out = 0
+
+    def _output(self, item):
+        # (caller holds the lock)
+        if not self._closed:
+            self.nof_out += 1
+            self._outbox.append(item)
+
+    def _flush(self):
+        # handing over waiting items without holding the lock
+        # (only one thread at a time is flushing, so order of items is kept)
+        with self._lock:
+            if self._is_flushing:
+                return
+            self._is_flushing = True
+        while True:
+            with self._lock:
+                if not self._outbox or self._closed:
+                    self._outbox.clear()
+                    self._is_flushing = False
+                    return
+                item = self._outbox.popleft()
+            try:
+                self._emit(self._subES, item)
+            except Exception:
+                logger.exception('EventPipeline._flush(): exception while queueing item for callbacks')
+
+    def _add(self, stage):
+        with self._lock:
+            stage.downstream = self._output
+            if self._stages:
+                self._stages[-1].downstream = stage.push
+            else:
+                self._head = stage.push
+            self._stages.append(stage)
+        return self
+
+    def push(self, item):
+        """ handing over one DMS-event to first operator """
+        with self._lock:
+            self.nof_in += 1
+            try:
+                self._head(item)
+            except Exception:
+                logger.exception('EventPipeline.push(): exception in operator')
+        self._flush()
+
+    def _run_timed(self, callback):
+        # executed by _PipelineTimer
+        with self._lock:
+            if not self._closed:
+                callback()
+        self._flush()
+
+    def filter(self, predicate):
+        """ only items with predicate(item) == True pass """
+        return self._add(_FilterStage(self, predicate))
+
+    def map(self, func):
+        """ items are replaced by func(item) """
+        return self._add(_MapStage(self, func))
+
+    def deadband(self, delta, relative=False):
+        """ only values differing at least "delta" from last passed value pass (relative=True: delta is a fraction) """
+        return self._add(_DeadbandStage(self, delta, relative))
+
+    def debounce(self, secs):
+        """ newest item passes after "secs" seconds without further items """
+        return self._add(_DebounceStage(self, secs))
+
+    def throttle(self, secs, trailing=True):
+        """ at most one item per "secs" seconds (trailing=True: newest suppressed item passes at end of interval) """
+        return self._add(_ThrottleStage(self, secs, trailing))
+
+    def tumbling_window(self, secs=None, count=None):
+        """ items are collected into lists, a list passes after "secs" seconds or "count" items """
+        return self._add(_TumblingWindowStage(self, secs, count))
+
+    def sliding_window(self, secs=None, count=None):
+        """ every item passes a list with all items of last "secs" seconds (or last "count" items) """
+        return self._add(_SlidingWindowStage(self, secs, count))
+
+    def clear(self):
+        """ removing all operators (pending items of timed operators are dropped) """
+        with self._lock:
+            for stage in self._stages:
+                # (timers of removed operators are still scheduled)
+                stage.downstream = lambda item: None
+            self._stages = []
+            self._head = self._output
+        return self
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+
+    def get_stats(self):
+        """ returns dictionary with number of incoming and passed items """
+        return {'in': self.nof_in,
+                'out': self.nof_out,
+                'operators': [repr(stage) for stage in self._stages]}
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'EventPipeline(' + ' -> '.join(repr(stage) for stage in self._stages) + ')'
@@ -0,0 +1,236 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\poll.py
+
+Periodic reads of many datapoints (DMSClient.poll()):
+all reads due in the same scheduler tick are sent as one multi-command frame
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>one scheduler per DMSClient, started with the first polled datapoint
+=>frames are sent and callbacks are executed by a pool of worker threads, never by scheduler thread
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import concurrent.futures
+import heapq
+import logging
+import math
+import threading
+import time
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# interval in seconds of scheduler ticks (all reads due in same tick are sent together)
+POLL_TICK_SECS = 0.1
+# maximum number of "get" commands in one frame
+POLL_MAX_BATCH = 1000
+# number of threads sending frames and executing callbacks
+POLL_WORKERS = 4
+
+
+
+class PollJob(object):
+    """ periodic read of one datapoint (created by DMSClient.poll()) """
+
+    def __init__(self, scheduler, path, period, callback, get_kwargs):
+        self._scheduler = scheduler
+        self.path = path
+        self.period = float(period)
+        assert self.period > 0, 'period of polling has to be greater than zero'
+        # callback(responses): list of RespGet of every successful read
+        self.callback = callback
+        self.get_kwargs = get_kwargs
+        self.next_due = 0.0
+        self.is_active = True
+        self.in_flight = False
+        # statistics
+        self.nof_polls = 0
+        self.nof_errors = 0
+        self.nof_skipped = 0
+        self.nof_deadline_misses = 0
+        self.last_latency_secs = None
+
+    def cancel(self):
+        """ stops polling of this datapoint """
+        self._scheduler.remove_job(self)
+
+    def as_dict(self):
+        return {'path': self.path,
+                'period': self.period,
+                'polls': self.nof_polls,
+                'errors': self.nof_errors,
+                'skipped': self.nof_skipped,
+                'deadline_misses': self.nof_deadline_misses,
+                'last_latency_secs': self.last_latency_secs}
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'PollJob(path=' + repr(self.path) + ', period=' + repr(self.period) + ')'
+
+
+
+class _PollScheduler(threading.Thread):
+    """ periodic reads of many datapoints: all reads due in same tick are sent as one multi-command frame """
+    # =>due times are multiples of the period (wall clock), so jobs with equal or multiple periods share their ticks
+    # =>ticks are scheduled on absolute times (start + n * tick), delays never accumulate,
+    #   "jitter" is the delay of a tick after it's scheduled time
+    # =>a job whose previous read is still in flight is skipped in this period (reads never pile up),
+    #   a "deadline miss" is a read completing after it's next due time or a period skipped by a late tick
+
+    def __init__(self, msghandler, timeout, tick_secs=POLL_TICK_SECS, max_batch=POLL_MAX_BATCH, workers=POLL_WORKERS):
+        super(_PollScheduler, self).__init__(name='_PollScheduler')
+        self.daemon = True
+        self._msghandler = msghandler
+        self.tick_secs = float(tick_secs)
+        self.max_batch = int(max_batch)
+        self.timeout = timeout
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        # heap of tuples (next due time, sequence number, PollJob)
+        self._heap = []
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._stop_event = threading.Event()
+        # statistics
+        self.nof_ticks = 0
+        self.nof_frames = 0
+        self.nof_commands = 0
+        self.nof_late_ticks = 0
+        self.jitter_sum_secs = 0.0
+        self.jitter_max_secs = 0.0
+        self._nof_jobs = 0
+
+    def _get_next_due(self, period, now):
+        return math.floor(now / period) * period + period
+
+    def add_job(self, path, period, callback, **get_kwargs):
+        job = PollJob(self, path, period, callback, get_kwargs)
+        job.next_due = self._get_next_due(job.period, time.time())
+        with self._lock:
+            self._push(job)
+            self._nof_jobs += 1
+        return job
+
+    def _push(self, job):
+        self._seq += 1
+        heapq.heappush(self._heap, (job.next_due, self._seq, job))
+
+    def remove_job(self, job):
+        # (job stays in heap until it's due, then it's dropped)
+        with self._lock:
+            if job.is_active:
+                job.is_active = False
+                self._nof_jobs -= 1
+
+    def run(self):
+        next_tick = math.ceil(time.time() / self.tick_secs) * self.tick_secs
+        while not self._stop_event.wait(timeout=max(0.0, next_tick - time.time())):
+            now = time.time()
+            jitter_secs = now - next_tick
+            self.nof_ticks += 1
+            self.jitter_sum_secs += jitter_secs
+            self.jitter_max_secs = max(self.jitter_max_secs, jitter_secs)
+            try:
+                self._tick(now)
+            except Exception:
+                logger.exception('_PollScheduler.run(): exception in tick')
+
+            next_tick += self.tick_secs
+            if next_tick <= time.time():
+                # we're late: skipping missed ticks instead of catching up with a burst
+                self.nof_late_ticks += 1
+                next_tick = math.ceil(time.time() / self.tick_secs) * self.tick_secs
+
+    def _tick(self, now):
+        # collecting all jobs due until middle of next tick
+        due_jobs = []
+        limit = now + self.tick_secs / 2
+        with self._lock:
+            while self._heap and self._heap[0][0] <= limit:
+                next_due, seq, job = heapq.heappop(self._heap)
+                if not job.is_active:
+                    continue
+                if job.in_flight:
+                    # previous read isn't finished yet
+                    job.nof_skipped += 1
+                else:
+                    job.in_flight = True
+                    due_jobs.append(job)
+                job.next_due += job.period
+                if job.next_due <= now:
+                    # periods missed by late ticks
+                    job.nof_deadline_misses += int((now - job.next_due) // job.period) + 1
+                    job.next_due = self._get_next_due(job.period, now)
+                self._push(job)
+
+        for idx in range(0, len(due_jobs), self.max_batch):
+            self._executor.submit(self._send_batch, due_jobs[idx:idx + self.max_batch], time.time())
+
+    def _send_batch(self, jobs, time_sent):
+        # runs in worker thread: one frame with all commands, then callbacks in order of jobs
+        # (counters are shared by all worker threads and scheduler thread: updated under lock)
+        with self._lock:
+            self.nof_frames += 1
+            self.nof_commands += len(jobs)
+        try:
+            results = self._msghandler.dp_get_multi([(job.path, job.get_kwargs) for job in jobs], timeout=self.timeout)
+        except Exception as ex:
+            results = [ex] * len(jobs)
+        time_done = time.time()
+        with self._lock:
+            for job, result in zip(jobs, results):
+                job.in_flight = False
+                job.nof_polls += 1
+                job.last_latency_secs = time_done - time_sent
+                if time_done > job.next_due:
+                    job.nof_deadline_misses += 1
+                if isinstance(result, Exception):
+                    job.nof_errors += 1
+        for job, result in zip(jobs, results):
+            if isinstance(result, Exception):
+                logger.warning('_PollScheduler: reading "' + job.path + '" failed: ' + repr(result))
+                continue
+            if job.is_active:
+                try:
+                    job.callback(result)
+                except Exception:
+                    logger.exception('_PollScheduler: exception in callback of "' + job.path + '"')
+
+    def get_jobs(self):
+        with self._lock:
+            return [job for next_due, seq, job in self._heap if job.is_active]
+
+    def get_stats(self):
+        """ returns dictionary with counters of ticks, frames, commands, jitter and deadline misses """
+        with self._lock:
+            jobs = [job for next_due, seq, job in self._heap if job.is_active]
+            return {'jobs': len(jobs),
+                    'ticks': self.nof_ticks,
+                    'late_ticks': self.nof_late_ticks,
+                    'frames': self.nof_frames,
+                    'commands': self.nof_commands,
+                    'jitter_mean_secs': self.jitter_sum_secs / self.nof_ticks if self.nof_ticks else None,
+                    'jitter_max_secs': self.jitter_max_secs,
+                    'skipped': sum(job.nof_skipped for job in jobs),
+                    'deadline_misses': sum(job.nof_deadline_misses for job in jobs),
+                    'errors': sum(job.nof_errors for job in jobs)}
+
+    def stop(self):
+        self._stop_event.set()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\profiler.py
+
+Profiling of callbacks fired by DMS-events (parameter "profile_handlers" of DMSClient):
+execution durations of every callback function and event rates of every subscription
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>only counters and one histogram per callback function, cheap enough for permanent use
+=>statistics are read by DMSClient.top_slow_handlers() and DMSClient.get_subscription_stats()
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+import threading
+import time
+
+
+# histogram of execution durations with logarithmic buckets
+# (bucket no. N contains durations up to PROFILER_MIN_SECS * PROFILER_BUCKET_FACTOR ** N)
+PROFILER_MIN_SECS = 1e-6
+PROFILER_BUCKET_FACTOR = 1.2
+PROFILER_NOF_BUCKETS = 128
+
+
+
+class _HandlerStats(object):
+    """ execution statistics of one callback function in one SubscriptionES """
+    __slots__ = ('path', 'tag', 'handler_name', 'count', 'total_secs', 'max_secs', 'histogram')
+
+    def __init__(self, path, tag, handler_name):
+        self.path = path
+        self.tag = tag
+        self.handler_name = handler_name
+        self.count = 0
+        self.total_secs = 0.0
+        self.max_secs = 0.0
+        # logarithmic histogram as sketch for percentiles
+        self.histogram = [0] * PROFILER_NOF_BUCKETS
+
+    def add(self, duration_secs):
+        self.count += 1
+        self.total_secs += duration_secs
+        if duration_secs > self.max_secs:
+            self.max_secs = duration_secs
+        if duration_secs > PROFILER_MIN_SECS:
+            idx = int(math.log(duration_secs / PROFILER_MIN_SECS, PROFILER_BUCKET_FACTOR)) + 1
+            self.histogram[min(idx, PROFILER_NOF_BUCKETS - 1)] += 1
+        else:
+            self.histogram[0] += 1
+
+    def get_percentile(self, percent):
+        """ estimation of percentile (upper bound of histogram bucket) """
+        if not self.count:
+            return None
+        limit = self.count * percent / 100.0
+        cumulated = 0
+        for idx, nof_values in enumerate(self.histogram):
+            cumulated += nof_values
+            if cumulated >= limit:
+                return min(PROFILER_MIN_SECS * PROFILER_BUCKET_FACTOR ** idx, self.max_secs)
+        return self.max_secs
+
+    def as_dict(self):
+        return {'path': self.path,
+                'tag': self.tag,
+                'handler': self.handler_name,
+                'count': self.count,
+                'total_secs': self.total_secs,
+                'mean_secs': self.total_secs / self.count if self.count else None,
+                'max_secs': self.max_secs,
+                'p99_secs': self.get_percentile(99)}
+
+
+
+class _HandlerProfiler(object):
+    """ collecting execution statistics of all callbacks and event rates of all subscriptions """
+    # =>only counters and one histogram per callback function, cheap enough for permanent use
+
+    def __init__(self):
+        # key: tuple (subscription tag, id of handler), value: _HandlerStats
+        self._handler_stats_dict = {}
+        # key: subscription tag, value: list [DMS-key, number of events, time of first event, time of last event]
+        self._subscription_stats_dict = {}
+        self._lock = threading.Lock()
+
+
+    def record_event(self, subES):
+        tag = subES.get_tag()
+        now = time.time()
+        with self._lock:
+            curr = self._subscription_stats_dict.get(tag, None)
+            if curr is None:
+                self._subscription_stats_dict[tag] = [subES.sub_response['path'], 1, now, now]
+            else:
+                curr[1] += 1
+                curr[3] = now
+
+
+    def record_handler(self, subES, handler, duration_secs):
+        tag = subES.get_tag()
+        key = (tag, id(handler))
+        with self._lock:
+            stats = self._handler_stats_dict.get(key, None)
+            if stats is None:
+                stats = _HandlerStats(path=subES.sub_response['path'], tag=tag, handler_name=_HandlerProfiler.get_handler_name(handler))
+                self._handler_stats_dict[key] = stats
+            stats.add(duration_secs)
+
+
+    @staticmethod
+    def get_handler_name(handler):
+        try:
+            return handler.__module__ + '.' + handler.__qualname__
+        except AttributeError:
+            return repr(handler)
+
+
+    def forget(self, tag):
+        """ remove all statistics of one subscription """
+        with self._lock:
+            self._subscription_stats_dict.pop(tag, None)
+            for key in [key for key in self._handler_stats_dict if key[0] == tag]:
+                del(self._handler_stats_dict[key])
+
+
+    def reset(self):
+        with self._lock:
+            self._handler_stats_dict = {}
+            self._subscription_stats_dict = {}
+
+
+    def top_slow_handlers(self, n=10, sort_by='p99_secs'):
+        """ returns list of dictionaries with statistics of the "n" slowest callbacks """
+        with self._lock:
+            stats_list = [stats.as_dict() for stats in self._handler_stats_dict.values()]
+        stats_list.sort(key=lambda item: item[sort_by] or 0.0, reverse=True)
+        return stats_list[:n]
+
+
+    def get_subscription_stats(self):
+        """ returns list of dictionaries with number of events and event rate per subscription """
+        stats_list = []
+        now = time.time()
+        with self._lock:
+            for tag, (path, nof_events, time_first, time_last) in self._subscription_stats_dict.items():
+                duration_secs = now - time_first
+                stats_list.append({'path': path,
+                                   'tag': tag,
+                                   'events': nof_events,
+                                   'events_per_sec': nof_events / duration_secs if duration_secs > 0 else None,
+                                   'secs_since_last_event': now - time_last})
+        return stats_list
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return '_HandlerProfiler(nof_handlers=' + str(len(self._handler_stats_dict)) + ')'
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\recorder.py
+
+Recording of raw websocket frames exchanged with DMS and offline replay of such recordings
+(e.g. for benchmarking decoding and callback throughput against real traffic without a DMS)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+file format:
+=>file begins with magic bytes RECORDING_MAGIC (written only once, recordings are append-only)
+=>every frame is one record: header (struct RECORD_HEADER) followed by UTF8 encoded payload
+  header fields: timestamp (double, seconds since epoch), direction (unsigned char), payload length (unsigned int)
+=>optional gzip compression: appending to an existing file adds a new gzip member,
+  Python's gzip module reads all members as one continuous stream
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import gzip
+import json
+import os
+import queue
+import struct
+import threading
+import time
+
+from visitoolkit_connector import connector
+
+
+# first bytes in every recording
+RECORDING_MAGIC = b'VTKREC1\n'
+
+# record header: timestamp, direction, payload length
+RECORD_HEADER = struct.Struct('<dBI')
+
+# direction of one recorded frame
+DIR_RX = 0      # received from DMS
+DIR_TX = 1      # sent to DMS
+
+# magic bytes of gzip files (used for autodetection on reading)
+_GZIP_MAGIC = b'\x1f\x8b'
+
+
+
+class FrameRecorder(object):
+    """ append-only recorder of raw websocket frames """
+    # =>hand an instance to DMSClient(recorder=...),
+    #   DMSClient calls record_tx() in _send_message() and record_rx() in _cb_on_message()
+
+    def __init__(self, filename, compress=False):
+        self.filename = filename
+        self.compress = compress
+        self.nof_frames = 0
+        self.nof_bytes = 0
+
+        is_new = not os.path.exists(filename) or os.path.getsize(filename) == 0
+        if compress:
+            self._file = gzip.open(filename, 'ab')
+        else:
+            self._file = open(filename, 'ab')
+        if is_new:
+            self._file.write(RECORDING_MAGIC)
+
+        # frames arrive from websocket thread and from all threads sending requests
+        self._lock = threading.Lock()
+
+
+    def record_rx(self, msg):
+        """ record one frame received from DMS """
+        self._write(DIR_RX, msg)
+
+    def record_tx(self, msg):
+        """ record one frame sent to DMS """
+        self._write(DIR_TX, msg)
+
+    def _write(self, direction, msg):
+        if isinstance(msg, str):
+            payload = msg.encode('utf-8')
+        else:
+            payload = bytes(msg)
+        header = RECORD_HEADER.pack(time.time(), direction, len(payload))
+        with self._lock:
+            if self._file:
+                self._file.write(header)
+                self._file.write(payload)
+                self.nof_frames += 1
+                self.nof_bytes += len(payload)
+
+    def flush(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'FrameRecorder(filename=' + repr(self.filename) + ', compress=' + repr(self.compress) + ')'
+
+
+
+class FrameReplayer(object):
+    """ reading a recording and feeding it back through message handler and dispatcher """
+
+    def __init__(self, filename):
+        self.filename = filename
+
+
+    def frames(self):
+        """ generator: yields tuples (timestamp, direction, message) of all recorded frames """
+        with open(self.filename, 'rb') as f:
+            is_compressed = f.read(2) == _GZIP_MAGIC
+
+        if is_compressed:
+            f = gzip.open(self.filename, 'rb')
+        else:
+            f = open(self.filename, 'rb')
+        with f:
+            if f.read(len(RECORDING_MAGIC)) != RECORDING_MAGIC:
+                raise ValueError('file "' + self.filename + '" is not a recording of visitoolkit_connector!')
+            while True:
+                header = f.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    # end of file (or truncated last record when recorder was killed)
+                    break
+                stamp, direction, length = RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    connector.logger.warning('FrameReplayer.frames(): last record in "' + self.filename + '" is truncated, ignoring it...')
+                    break
+                yield stamp, direction, payload.decode('utf-8')
+
+
+    def replay(self, speed=1.0, handlers=(), whois_str='replay', user_str='replay'):
+        """ feeding all received frames into a new _MessageHandler, returns statistics as dict """
+        # speed: 1.0 keeps original timing, 10.0 is ten times faster, None or 0 means "as fast as possible"
+        # handlers: callbacks attached to every SubscriptionES object found in recording
+        #           (frames sent by us are only used for registering message tags, they are never sent anywhere)
+        event_q = queue.Queue()
+        msghandler = connector._MessageHandler(dmsclient_obj=None,
+                                               whois_str=whois_str,
+                                               user_str=user_str,
+                                               subES_queue=event_q)
+        dispatcher = connector._SubscriptionES_Dispatcher(event_q=event_q)
+        dispatcher.daemon = True
+        dispatcher.start()
+
+        stats = {'frames_rx': 0,
+                 'frames_tx': 0,
+                 'bytes_rx': 0,
+                 'responses': 0,
+                 'subscriptions': 0,
+                 'decode_secs': 0.0,
+                 'duration_secs': 0.0}
+        registered_tags = set()
+
+        first_stamp = None
+        time_begin = time.time()
+        for stamp, direction, msg in self.frames():
+            if first_stamp is None:
+                first_stamp = stamp
+            if speed:
+                # keep relative timing of recording
+                delay = (stamp - first_stamp) / speed - (time.time() - time_begin)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if direction == DIR_TX:
+                stats['frames_tx'] += 1
+                for tag in self._get_tags(msg):
+                    msghandler.prepare_tag(curr_tag=tag)
+                    registered_tags.add(tag)
+            else:
+                stats['frames_rx'] += 1
+                stats['bytes_rx'] += len(msg)
+                # (frame is parsed only once: subscriptions and answered requests are found in decoded responses)
+                time_decode = time.time()
+                decoded_frame = msghandler.decode(msg)
+                stats['decode_secs'] += time.time() - time_decode
+                responses_list = decoded_frame[0]
+                stats['subscriptions'] += self._register_subscriptions(msghandler, responses_list, handlers)
+
+                time_decode = time.time()
+                msghandler.dispatch(decoded_frame)
+                stats['decode_secs'] += time.time() - time_decode
+
+                # collect answered requests, so pending responses don't pile up
+                for tag, _ in responses_list:
+                    if tag in registered_tags and msghandler.poll_response(tag) is not None:
+                        registered_tags.discard(tag)
+                        stats['responses'] += 1
+
+        # let dispatcher finish firing of queued events
+        while event_q.qsize() > 0:
+            time.sleep(connector.SLEEP_TIMEBASE)
+        dispatcher.keep_running = False
+        dispatcher.join()
+
+        stats['duration_secs'] = time.time() - time_begin
+        if stats['duration_secs'] > 0:
+            stats['frames_per_sec'] = stats['frames_rx'] / stats['duration_secs']
+        return stats
+
+
+    @staticmethod
+    def _get_tags(msg):
+        # all message tags of commands in one recorded request
+        tags = []
+        try:
+            payload_dict = json.loads(msg)
+        except ValueError:
+            connector.logger.warning('FrameReplayer: ignoring recorded request without valid JSON...')
+            return tags
+        for key, val in payload_dict.items():
+            if key == 'tag' and isinstance(val, dict):
+                # helper-dictionary for tagless commands (look in _Request.as_dict())
+                for tag_list in val.values():
+                    tags.extend(tag_list)
+            elif isinstance(val, list):
+                for cmd in val:
+                    if isinstance(cmd, dict) and 'tag' in cmd:
+                        tags.append(cmd['tag'])
+        return tags
+
+
+    @staticmethod
+    def _register_subscriptions(msghandler, responses_list, handlers):
+        # create SubscriptionES objects for all accepted subscriptions in a decoded frame
+        nof_subs = 0
+        for tag, resp_list in responses_list:
+            for response in resp_list:
+                if isinstance(response, connector.RespSub) and response['code'] == connector._Response.CODE_OK:
+                    subES = connector.SubscriptionES(msghandler=msghandler, sub_response=response)
+                    for handler in handlers:
+                        subES += handler
+                    msghandler.add_subscription(subAE=subES)
+                    nof_subs += 1
+        return nof_subs
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'FrameReplayer(filename=' + repr(self.filename) + ')'
@@ -0,0 +1,459 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\sharedtable.py
+
+Shared-memory table of current datapoint values for many processes on one host:
+one process with DMSClient publishes values of DMS-events, other processes read them without own websocket
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>table is a memory-mapped file (default in /dev/shm), readers map it read-only and never block the publisher
+=>every datapoint has a fixed slot, protected by a sequence lock ("seqlock"):
+  publisher increments sequence number before and after writing (odd: write in progress),
+  readers repeat reading until sequence number was even and unchanged
+=>directory of paths (slot number -> path) is append-only, readers load new paths when header says so
+=>a (re)started publisher creates a new table under a temporary name and replaces the file atomically,
+  readers keep their mapping of the old file (it's never truncated) until they see another "generation" in header:
+  publisher marks old table as replaced (generation 0), readers map new file and load it's directory of paths
+=>publisher writes heartbeat and number of updates into header every "heartbeat_secs" (background thread)
+=>only one publisher per table! (writers aren't synchronized against each other)
+=>values: None, bool, int, float and str (strings are truncated to "value_size" bytes UTF-8)
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from visitoolkit_connector import connector
+
+
+# default number of slots (datapoints) in a table
+SHARED_CAPACITY = 65536
+
+# maximum length of a path in bytes (UTF-8)
+SHARED_PATH_SIZE = 128
+
+# maximum length of string values in bytes (UTF-8)
+SHARED_VALUE_SIZE = 40
+
+# number of retries of a reader while publisher writes same slot
+SHARED_READ_RETRIES = 1000
+
+# seconds between heartbeats of publisher (0 disables background thread, heartbeat only in close())
+SHARED_HEARTBEAT_SECS = 1.0
+
+# layout of header: magic, version, capacity, path size, slot size, number of paths,
+#                   generation (microseconds since epoch of table creation, 0: replaced by newer table),
+#                   heartbeat (seconds since epoch), number of updates, publisher PID
+_HEADER = struct.Struct('<4sIIIIIQdQI')
+_HEADER_SIZE = 64
+_MAGIC = b'VTKS'
+_VERSION = 2
+
+# layout of one slot: sequence number, stamp (seconds since epoch, NaN unknown), kind of value, length of string,
+# followed by value (8 bytes number or string bytes)
+_SLOT = struct.Struct('<QdBxxxI')
+_NUMBER = struct.Struct('<d')
+_INTEGER = struct.Struct('<q')
+_SEQ = struct.Struct('<Q')
+_NOF_PATHS = struct.Struct('<I')
+_NOF_PATHS_OFFSET = 20
+_GENERATION = struct.Struct('<Q')
+_GENERATION_OFFSET = 24
+_GENERATION_REPLACED = 0
+_HEARTBEAT = struct.Struct('<dQ')
+_HEARTBEAT_OFFSET = 32
+
+# kinds of values
+_KIND_UNSET = 0
+_KIND_NONE = 1
+_KIND_FLOAT = 2
+_KIND_INT = 3
+_KIND_BOOL = 4
+_KIND_STR = 5
+
+
+# current value of one datapoint (stamp in seconds since epoch, None when unknown; seq: number of writes * 2)
+SharedValue = namedtuple(typename='SharedValue', field_names=['value', 'stamp', 'seq'])
+
+
+
+def default_filename(name):
+    """ returns path of table file in shared memory filesystem (or temporary directory) """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'visitoolkit_' + name + '.shm')
+
+
+def _get_layout(capacity, path_size, value_size):
+    # returns tuple (slot size, offset of slots, size of file)
+    slot_size = _SLOT.size + max(8, value_size)
+    # (8 byte alignment: sequence numbers are written with one machine instruction)
+    slot_size = (slot_size + 7) // 8 * 8
+    slots_offset = (_HEADER_SIZE + capacity * path_size + 7) // 8 * 8
+    return slot_size, slots_offset, slots_offset + capacity * slot_size
+
+
+def _mark_replaced(file_obj):
+    # header of old table gets generation 0: readers of old file switch to new table
+    header_bytes = file_obj.read(_HEADER.size)
+    if len(header_bytes) == _HEADER.size and header_bytes[:len(_MAGIC)] == _MAGIC:
+        file_obj.seek(_GENERATION_OFFSET)
+        file_obj.write(_GENERATION.pack(_GENERATION_REPLACED))
+
+
+
+class _HeartbeatThread(threading.Thread):
+    """ periodically writing heartbeat of SharedValuePublisher """
+
+    def __init__(self, publisher, interval=SHARED_HEARTBEAT_SECS):
+        super(_HeartbeatThread, self).__init__(name='SharedValuePublisher heartbeat')
+        self.daemon = True
+        self._publisher = publisher
+        self._interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(timeout=self._interval):
+            try:
+                self._publisher.heartbeat()
+            except Exception:
+                connector.logger.exception('_HeartbeatThread.run(): exception while writing heartbeat')
+
+    def stop(self):
+        self._stop_event.set()
+
+
+
+class SharedValuePublisher(object):
+    """ writing current values of datapoints into a shared-memory table (only one publisher per table) """
+
+    def __init__(self, filename, capacity=SHARED_CAPACITY, path_size=SHARED_PATH_SIZE, value_size=SHARED_VALUE_SIZE,
+                 heartbeat_secs=SHARED_HEARTBEAT_SECS):
+        self.filename = filename
+        self.capacity = int(capacity)
+        self.path_size = int(path_size)
+        self.value_size = int(value_size)
+        self._slot_size, self._slots_offset, file_size = _get_layout(self.capacity, self.path_size, self.value_size)
+        self.generation = int(time.time() * 1000000)
+
+        # creating new table under temporary name
+        # (an existing table is never truncated: readers would crash with SIGBUS on their mapping)
+        tmp_filename = filename + '.' + str(os.getpid()) + '.tmp'
+        with open(tmp_filename, 'wb') as f:
+            f.truncate(file_size)
+        self._file = open(tmp_filename, 'r+b')
+        self._mm = mmap.mmap(self._file.fileno(), file_size)
+
+        # path -> slot number
+        self._index = {}
+        self._lock = threading.Lock()
+        self._subscriptions = []
+        self.nof_updates = 0
+        self.nof_dropped = 0
+        _HEADER.pack_into(self._mm, 0, _MAGIC, _VERSION, self.capacity, self.path_size, self._slot_size,
+                          0, self.generation, time.time(), 0, os.getpid())
+
+        # complete table replaces old one atomically, afterwards readers of old file are notified
+        try:
+            old_file = open(filename, 'r+b')
+        except FileNotFoundError:
+            old_file = None
+        os.replace(tmp_filename, filename)
+        if old_file is not None:
+            with old_file:
+                _mark_replaced(old_file)
+
+        self._heartbeat_thread = None
+        if heartbeat_secs:
+            self._heartbeat_thread = _HeartbeatThread(self, interval=heartbeat_secs)
+            self._heartbeat_thread.start()
+
+
+    def _get_slot(self, path):
+        # slot number of path, new paths get next free slot (None when table is full)
+        slot = self._index.get(path, None)
+        if slot is None:
+            slot = len(self._index)
+            if slot >= self.capacity:
+                if not self.nof_dropped:
+                    connector.logger.warning('SharedValuePublisher: table "' + self.filename + '" is full, values of new datapoints are dropped!')
+                self.nof_dropped += 1
+                return None
+            path_bytes = path.encode('utf-8')
+            if len(path_bytes) > self.path_size:
+                raise ValueError('SharedValuePublisher: path "' + path + '" is longer than ' + str(self.path_size) + ' bytes')
+            offset = _HEADER_SIZE + slot * self.path_size
+            self._mm[offset:offset + len(path_bytes)] = path_bytes
+            self._index[path] = slot
+            # (path is written before readers get new number of paths)
+            _NOF_PATHS.pack_into(self._mm, _NOF_PATHS_OFFSET, len(self._index))
+        return slot
+
+
+    def publish(self, path, value, stamp=None):
+        """ writing current value of datapoint (stamp: datetime.datetime or seconds since epoch) """
+        if value is None:
+            kind, data = _KIND_NONE, b''
+        elif isinstance(value, bool):
+            kind, data = _KIND_BOOL, _INTEGER.pack(int(value))
+        elif isinstance(value, int):
+            kind, data = _KIND_INT, _INTEGER.pack(value)
+        elif isinstance(value, float):
+            kind, data = _KIND_FLOAT, _NUMBER.pack(value)
+        else:
+            kind, data = _KIND_STR, str(value).encode('utf-8')[:self.value_size]
+        if stamp is None:
+            stamp_secs = math.nan
+        elif isinstance(stamp, (int, float)):
+            stamp_secs = float(stamp)
+        else:
+            stamp_secs = stamp.timestamp()
+
+        with self._lock:
+            slot = self._get_slot(path)
+            if slot is None:
+                return False
+            offset = self._slots_offset + slot * self._slot_size
+            seq = _SEQ.unpack_from(self._mm, offset)[0]
+            # odd sequence number: write in progress
+            _SEQ.pack_into(self._mm, offset, seq + 1)
+            _SLOT.pack_into(self._mm, offset, seq + 1, stamp_secs, kind, len(data))
+            self._mm[offset + _SLOT.size:offset + _SLOT.size + len(data)] = data
+            _SEQ.pack_into(self._mm, offset, seq + 2)
+            self.nof_updates += 1
+        return True
+
+
+    def publish_event(self, event):
+        """ writing value of DMSEvent or RespGet """
+        if event['code'] in (connector.DMSEvent.CODE_DELETE, connector.DMSEvent.CODE_RENAME):
+            return False
+        return self.publish(event['path'], event['value'], event['stamp'])
+
+
+    def subscribe(self, dmsclient, path, timeout=connector.REQ_TIMEOUT, **kwargs):
+        """ publishing current values and all changes of datapoint(s), returns SubscriptionES """
+        # kwargs: e.g. query=connector.Query(regExPath='.*', maxDepth=-1) for a whole tree
+        subES = dmsclient.get_dp_subscription(path, timeout=timeout,
+                                              event=connector.ON_CHANGE | connector.ON_SET | connector.ON_CREATE, **kwargs)
+        subES += self.publish_event
+        self._subscriptions.append(subES)
+        # (subscription before reading: no change between both can get lost, newer events overwrite older values)
+        for response in dmsclient.dp_get(path, timeout=timeout, **kwargs):
+            if response['code'] == 'ok':
+                self.publish_event(response)
+        return subES
+
+
+    def heartbeat(self):
+        """ writing current time and number of updates into header (readers can detect a dead publisher) """
+        with self._lock:
+            _HEARTBEAT.pack_into(self._mm, _HEARTBEAT_OFFSET, time.time(), self.nof_updates)
+
+
+    def close(self, unlink=False):
+        """ unsubscribing and closing table (unlink=True: removing file) """
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.stop()
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+        for subES in self._subscriptions:
+            try:
+                subES.unsubscribe()
+            except Exception:
+                connector.logger.exception('SharedValuePublisher.close(): unsubscribing failed')
+        self._subscriptions = []
+        self.heartbeat()
+        self._mm.close()
+        self._file.close()
+        if unlink:
+            os.unlink(self.filename)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'SharedValuePublisher(filename=' + repr(self.filename) + ', paths=' + repr(len(self)) + ')'
+
+
+
+class SharedValueReader(object):
+    """ read-only access to a shared-memory table of a SharedValuePublisher (in any process on same host) """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.nof_retries = 0
+        self.nof_reopens = 0
+        self._open()
+
+
+    def _open(self):
+        file_obj = open(self.filename, 'rb')
+        mm = mmap.mmap(file_obj.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, capacity, path_size, slot_size, nof_paths, generation, heartbeat, updates, pid = _HEADER.unpack_from(mm, 0)
+        if magic != _MAGIC or version != _VERSION:
+            mm.close()
+            file_obj.close()
+            raise IOError('SharedValueReader: "' + self.filename + '" is no table of a SharedValuePublisher (version ' + str(_VERSION) + ')')
+        self._file = file_obj
+        self._mm = mm
+        self._generation = generation
+        self.capacity = capacity
+        self.path_size = path_size
+        self._slot_size = slot_size
+        self._slots_offset = _get_layout(self.capacity, self.path_size, self._slot_size - _SLOT.size)[1]
+        # path -> slot number (loaded from directory in table)
+        self._index = {}
+        self._paths = []
+        self._refresh_index()
+
+
+    def _check_generation(self):
+        # table was replaced by a restarted publisher: mapping new file (slots of paths may have changed)
+        if _GENERATION.unpack_from(self._mm, _GENERATION_OFFSET)[0] != self._generation:
+            self._mm.close()
+            self._file.close()
+            self._open()
+            self.nof_reopens += 1
+
+
+    def _refresh_index(self):
+        # loading paths added by publisher since last call
+        nof_paths = _NOF_PATHS.unpack_from(self._mm, _NOF_PATHS_OFFSET)[0]
+        for slot in range(len(self._paths), nof_paths):
+            offset = _HEADER_SIZE + slot * self.path_size
+            path = self._mm[offset:offset + self.path_size].rstrip(b'\x00').decode('utf-8')
+            self._index[path] = slot
+            self._paths.append(path)
+
+
+    def _read_slot(self, slot):
+        offset = self._slots_offset + slot * self._slot_size
+        mm = self._mm
+        for retry in range(SHARED_READ_RETRIES):
+            seq, stamp_secs, kind, length = _SLOT.unpack_from(mm, offset)
+            if seq & 1:
+                # publisher writes this slot right now
+                self.nof_retries += 1
+                if retry > 10:
+                    time.sleep(0)
+                continue
+            if kind == _KIND_FLOAT:
+                value = _NUMBER.unpack_from(mm, offset + _SLOT.size)[0]
+            elif kind == _KIND_INT:
+                value = _INTEGER.unpack_from(mm, offset + _SLOT.size)[0]
+            elif kind == _KIND_BOOL:
+                value = bool(_INTEGER.unpack_from(mm, offset + _SLOT.size)[0])
+            elif kind == _KIND_STR:
+                value = mm[offset + _SLOT.size:offset + _SLOT.size + length].decode('utf-8', errors='replace')
+            else:
+                value = None
+            if _SEQ.unpack_from(mm, offset)[0] == seq:
+                if kind == _KIND_UNSET:
+                    return None
+                return SharedValue(value, None if math.isnan(stamp_secs) else stamp_secs, seq)
+            self.nof_retries += 1
+        raise IOError('SharedValueReader: slot ' + str(slot) + ' was changed during ' + str(SHARED_READ_RETRIES) + ' retries')
+
+
+    def get(self, path):
+        """ returns SharedValue (value, stamp, seq) of datapoint, None when it's unknown """
+        self._check_generation()
+        slot = self._index.get(path, None)
+        if slot is None:
+            self._refresh_index()
+            slot = self._index.get(path, None)
+            if slot is None:
+                return None
+        return self._read_slot(slot)
+
+
+    def get_value(self, path, default=None):
+        """ returns current value of datapoint (default when it's unknown) """
+        result = self.get(path)
+        return default if result is None else result.value
+
+
+    def snapshot(self, paths=None):
+        """ returns dictionary path -> SharedValue of given (or all) datapoints """
+        self._check_generation()
+        self._refresh_index()
+        result = {}
+        for path in (self._paths if paths is None else paths):
+            slot = self._index.get(path, None)
+            if slot is not None:
+                value = self._read_slot(slot)
+                if value is not None:
+                    result[path] = value
+        return result
+
+
+    def get_paths(self):
+        self._check_generation()
+        self._refresh_index()
+        return list(self._paths)
+
+
+    def get_publisher_info(self):
+        """ returns dictionary with PID, last heartbeat and number of updates of publisher """
+        self._check_generation()
+        magic, version, capacity, path_size, slot_size, nof_paths, generation, heartbeat, updates, pid = _HEADER.unpack_from(self._mm, 0)
+        return {'pid': pid,
+                'generation': generation,
+                'heartbeat': heartbeat,
+                'updates': updates,
+                'paths': nof_paths,
+                'capacity': capacity}
+
+
+    def close(self):
+        self._mm.close()
+        self._file.close()
+
+    def __contains__(self, path):
+        self._check_generation()
+        if path not in self._index:
+            self._refresh_index()
+        return path in self._index
+
+    def __len__(self):
+        self._check_generation()
+        self._refresh_index()
+        return len(self._paths)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'SharedValueReader(filename=' + repr(self.filename) + ')'
@@ -0,0 +1,597 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\standin.py
+
+Local stand-in for ProMoS DMS "JSON Data Exchange" over WebSocket,
+an in-memory datapoint tree for testing and benchmarking DMSClient without a real DMS
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+WebSocket and HTTP POST (keep-alive) are served on the same port,
+supported commands: "get" (with "query", "histData", "changelog" and "showExtInfos"), "set", "rename", "delete",
+"subscribe", "unsubscribe", "changelogGetGroups" and "changelogRead"
+=>only an approximation of real DMS behaviour:
+  -trend data is synthetic (one trendpoint every "trend_interval" seconds around current value)
+  -alarm datapoints (created by add_alarm()) are boolean: a changed value adds a changelog entry with alarm data,
+   state is ALARM_STATE_ON for true values, ALARM_STATE_OFF for false values
+  -"maxDepth" in "query": 0 is the datapoint itself, N includes N levels of children, missing or negative is unlimited
+  -"regExPath" in "query" is searched in full path of every datapoint, "hasAlarmData" selects alarm datapoints
+  -no permissions, no persistence
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import math
+import re
+import threading
+import time
+
+import dateutil.parser
+
+from visitoolkit_connector import connector
+from visitoolkit_connector import wsserver
+
+
+# seconds between two synthetic trendpoints
+TREND_INTERVAL = 60
+
+# maximum number of trendpoints in one "histData" response
+HISTDATA_LIMIT = 100000
+
+# changelog group of all changes done by clients
+CHANGELOG_GROUP = 'Manip1'
+
+# alarm states in changelog entries of alarm datapoints
+ALARM_STATE_ON = 'coming'
+ALARM_STATE_OFF = 'gone'
+
+
+
+def _now():
+    return datetime.datetime.now().astimezone()
+
+
+def _parse_stamp(stamp_str):
+    stamp = dateutil.parser.parse(stamp_str)
+    if stamp.tzinfo is None:
+        stamp = stamp.astimezone()
+    return stamp
+
+
+def _parent_of(path):
+    return path.rpartition(':')[0]
+
+
+
+class _Node(object):
+    """ one datapoint in stand-in tree """
+    __slots__ = ('value', 'type', 'stamp', 'children', 'extInfos', 'changelog', 'alarm')
+
+    def __init__(self, value=None, type='none', stamp=None):
+        self.value = value
+        self.type = type
+        self.stamp = stamp
+        # names of child nodes (last part of path)
+        self.children = set()
+        self.extInfos = {}
+        # list of tuples (stamp, text, alarm data or None)
+        self.changelog = []
+        # alarm datapoints: dictionary with alarm data of their changelog entries (without "state")
+        self.alarm = None
+
+
+
+class StandInDMS(wsserver.WebSocketServer):
+    """ in-memory DMS, speaking "JSON Data Exchange" over WebSocket """
+
+    def __init__(self, host='127.0.0.1', port=0, deflate=True, compression_level=6, trend_interval=TREND_INTERVAL,
+                 server_max_window_bits=None, client_max_window_bits=None):
+        super(StandInDMS, self).__init__(host=host, port=port, deflate=deflate, compression_level=compression_level,
+                                         server_max_window_bits=server_max_window_bits,
+                                         client_max_window_bits=client_max_window_bits)
+        self.trend_interval = trend_interval
+
+        # path -> _Node ("" is invisible root node)
+        self._nodes = {'': _Node()}
+        self._lock = threading.RLock()
+
+        # connection -> {tag: (path, maxDepth, set of event codes)}
+        self._subscriptions = collections.defaultdict(dict)
+
+        # changelog groups: group name -> list of tuples (stamp, path, text)
+        self._changelog_groups = {CHANGELOG_GROUP: []}
+
+        self._blinker_thread = None
+
+        # statistics
+        self.nof_requests = 0
+        self.nof_commands = 0
+        self.nof_events = 0
+
+        self._add_node('System:Time', value=_now().isoformat(), type='string')
+
+
+    # tree handling
+    def _add_node(self, path, value=None, type='none', stamp=None):
+        # creating node and all missing parents, returns tuple (node, list of created paths)
+        created = []
+        curr_path = ''
+        for part in path.split(':'):
+            parent_path = curr_path
+            curr_path = part if not curr_path else curr_path + ':' + part
+            if curr_path not in self._nodes:
+                self._nodes[curr_path] = _Node(stamp=stamp or _now())
+                self._nodes[parent_path].children.add(part)
+                created.append(curr_path)
+        node = self._nodes[path]
+        node.value = value
+        node.type = type
+        node.stamp = stamp or _now()
+        return node, created
+
+
+    def _iter_subtree(self, path, max_depth=-1):
+        # generator: yields all paths below "path" (including "path") in breadth-first order
+        level = [path]
+        depth = 0
+        while level:
+            next_level = []
+            for curr_path in level:
+                yield curr_path
+                if max_depth < 0 or depth < max_depth:
+                    for child in sorted(self._nodes[curr_path].children):
+                        next_level.append(curr_path + ':' + child if curr_path else child)
+            level = next_level
+            depth += 1
+
+
+    def populate(self, nof_datapoints, prefix='SIM', fanout=10):
+        """ creating synthetic tree with "nof_datapoints" leaf datapoints, returns list of their paths """
+        # =>path of datapoint no. 1234 with fanout 10 and 4 levels: "SIM:N1:N2:N3:D4"
+        nof_levels = max(1, int(math.ceil(math.log(max(nof_datapoints, 2), fanout))))
+        paths = []
+        with self._lock:
+            for idx in range(nof_datapoints):
+                digits = []
+                curr_idx = idx
+                for _ in range(nof_levels):
+                    digits.append(curr_idx % fanout)
+                    curr_idx //= fanout
+                digits.reverse()
+                parts = [prefix] + ['N' + str(digit) for digit in digits[:-1]] + ['D' + str(digits[-1])]
+                path = ':'.join(parts)
+                node, _ = self._add_node(path, value=float(idx), type='double')
+                node.extInfos = {'unit': 'degC', 'comment': 'synthetic datapoint ' + str(idx)}
+                paths.append(path)
+        return paths
+
+
+    def add_alarm(self, path, priority=1, priorityBACnet=0, alarmGroup=0, alarmCollectGroup=0, siteGroup=0, screen=None):
+        """ creating boolean alarm datapoint (or making existing datapoint an alarm datapoint) """
+        # =>changelog gets entries with alarm data after first change of value
+        with self._lock:
+            if path in self._nodes:
+                node = self._nodes[path]
+            else:
+                node, _ = self._add_node(path, value=False, type='bool')
+            node.alarm = {'priority': priority,
+                          'priorityBACnet': priorityBACnet,
+                          'alarmGroup': alarmGroup,
+                          'alarmCollectGroup': alarmCollectGroup,
+                          'siteGroup': siteGroup}
+            if screen is not None:
+                node.alarm['screen'] = screen
+        return node
+
+
+    def start_blinker(self, path='System:Blinker:Blink1.0', interval=1.0):
+        """ toggling boolean datapoint in background thread (source of DMS-events), call it after start() """
+        with self._lock:
+            if path not in self._nodes:
+                self._add_node(path, value=False, type='bool')
+
+        def blink():
+            while self.keep_running:
+                time.sleep(interval)
+                with self._lock:
+                    value = not self._nodes[path].value
+                self._do_set({'path': path, 'value': value})
+
+        self._blinker_thread = threading.Thread(target=blink)
+        self._blinker_thread.daemon = True
+        self._blinker_thread.start()
+
+
+    # WebSocket server callbacks
+    def on_message(self, conn, msg):
+        conn.send_message(self._process_request(conn, msg))
+
+
+    def on_http_message(self, msg):
+        # (conn=None: no subscriptions over HTTP)
+        return self._process_request(None, msg)
+
+
+    def _process_request(self, conn, msg):
+        # executing all commands in one request, returns response frame
+        request = json.loads(msg)
+        self.nof_requests += 1
+        response = {}
+        if 'tag' in request:
+            # whole frame is tagged (e.g. helper-dictionary for tagless commands)
+            response['tag'] = request['tag']
+
+        for cmd_type, handler in [('get', self._cmd_get),
+                                  ('set', self._cmd_set),
+                                  ('rename', self._cmd_rename),
+                                  ('delete', self._cmd_delete),
+                                  ('subscribe', self._cmd_subscribe),
+                                  ('unsubscribe', self._cmd_unsubscribe),
+                                  ('changelogGetGroups', self._cmd_changelog_get_groups),
+                                  ('changelogRead', self._cmd_changelog_read)]:
+            if cmd_type in request:
+                resp_list = []
+                for cmd in request[cmd_type]:
+                    self.nof_commands += 1
+                    try:
+                        resp_list.extend(handler(conn, cmd))
+                    except Exception as ex:
+                        connector.logger.exception('StandInDMS: exception in command "' + cmd_type + '"')
+                        resp_list.append(self._error(cmd, connector._Response.CODE_ERROR, repr(ex)))
+                response[cmd_type] = resp_list
+        return json.dumps(response)
+
+
+    def on_disconnect(self, conn):
+        with self._lock:
+            self._subscriptions.pop(conn, None)
+
+
+    @staticmethod
+    def _error(cmd, code, message=None):
+        resp = {'code': code}
+        for field in ('path', 'tag'):
+            if field in cmd:
+                resp[field] = cmd[field]
+        if message:
+            resp['message'] = message
+        return resp
+
+
+    def _node_response(self, path, node, cmd):
+        resp = {'code': connector._Response.CODE_OK,
+                'path': path,
+                'value': node.value,
+                'type': node.type,
+                'hasChild': bool(node.children),
+                'tag': cmd['tag']}
+        if node.stamp is not None:
+            # (root node "" has no stamp)
+            resp['stamp'] = node.stamp.isoformat()
+        if path == 'System:Time':
+            resp['value'] = _now().isoformat()
+        if 'showExtInfos' in cmd:
+            ext_infos = {'state': 'ok', 'accType': node.type}
+            ext_infos.update(node.extInfos)
+            resp['extInfos'] = {key: val for key, val in ext_infos.items() if key in cmd['showExtInfos']}
+        if 'histData' in cmd:
+            resp['histData'] = self._get_histdata(node, cmd['histData'])
+        if 'changelog' in cmd:
+            resp['changelog'] = self._get_changelog(path, node, cmd['changelog'])
+        return resp
+
+
+    def _get_histdata(self, node, histdata_dict):
+        # synthetic trend data: sine wave around current value
+        if not isinstance(node.value, (int, float)) or isinstance(node.value, bool):
+            return []
+        start = _parse_stamp(histdata_dict['start'])
+        end = _parse_stamp(histdata_dict['end']) if 'end' in histdata_dict else _now()
+        interval = histdata_dict.get('interval', 0) or self.trend_interval
+        is_detail = histdata_dict.get('format', 'compact') == 'detail'
+
+        trend = []
+        start_secs = math.ceil(start.timestamp() / interval) * interval
+        end_secs = end.timestamp()
+        curr_secs = start_secs
+        while curr_secs <= end_secs and len(trend) < HISTDATA_LIMIT:
+            stamp_str = datetime.datetime.fromtimestamp(curr_secs, tz=start.tzinfo).isoformat()
+            value = round(node.value + math.sin(curr_secs / 3600.0), 3)
+            if is_detail:
+                trend.append({'stamp': stamp_str, 'value': value, 'state': 0, 'rec': 'STD'})
+            else:
+                trend.append({stamp_str: value})
+            curr_secs += interval
+        return trend
+
+
+    @staticmethod
+    def _get_changelog(path, node, changelog_dict):
+        start = _parse_stamp(changelog_dict['start'])
+        end = _parse_stamp(changelog_dict['end']) if 'end' in changelog_dict else None
+        entries = []
+        for stamp, text, alarm_data in node.changelog:
+            if stamp >= start and (end is None or stamp <= end):
+                entry = {'path': path, 'stamp': stamp.isoformat(), 'text': text}
+                if alarm_data:
+                    entry.update(alarm_data)
+                entries.append(entry)
+        return entries
+
+
+    # commands
+    def _cmd_get(self, conn, cmd):
+        path = cmd['path']
+        with self._lock:
+            if path not in self._nodes:
+                return [self._error(cmd, connector._Response.CODE_NOTFOUND)]
+            if 'query' in cmd:
+                query = cmd['query']
+                regex = re.compile(query['regExPath']) if 'regExPath' in query else None
+                responses = []
+                for curr_path in self._iter_subtree(path, query.get('maxDepth', -1)):
+                    if regex and not regex.search(curr_path):
+                        continue
+                    if 'hasAlarmData' in query and (self._nodes[curr_path].alarm is not None) != query['hasAlarmData']:
+                        continue
+                    responses.append(self._node_response(curr_path, self._nodes[curr_path], cmd))
+                return responses
+            else:
+                return [self._node_response(path, self._nodes[path], cmd)]
+
+
+    def _cmd_set(self, conn, cmd):
+        return [self._do_set(cmd)]
+
+
+    def _do_set(self, cmd):
+        path = cmd['path']
+        events = []
+        with self._lock:
+            is_new = path not in self._nodes
+            if is_new and not cmd.get('create', False):
+                return self._error(cmd, connector._Response.CODE_NOTFOUND)
+            stamp = _parse_stamp(cmd['stamp']) if 'stamp' in cmd else _now()
+            value = cmd['value']
+            if is_new:
+                node, created = self._add_node(path, type=cmd.get('type', _type_of(value)), stamp=stamp)
+                for curr_path in created:
+                    events.append((connector.DMSEvent.CODE_CREATE, curr_path, {}))
+            else:
+                node = self._nodes[path]
+            value = _convert(value, cmd.get('type', node.type))
+            is_changed = value != node.value
+            node.value = value
+            node.stamp = stamp
+            if 'type' in cmd:
+                node.type = cmd['type']
+            events.append((connector.DMSEvent.CODE_SET, path, {}))
+            if is_changed:
+                events.append((connector.DMSEvent.CODE_CHANGE, path, {}))
+                text = 'value changed to ' + repr(value)
+                alarm_data = None
+                if node.alarm is not None:
+                    alarm_data = dict(node.alarm, state=ALARM_STATE_ON if value else ALARM_STATE_OFF)
+                node.changelog.append((stamp, text, alarm_data))
+                self._changelog_groups[CHANGELOG_GROUP].append((stamp, path, text))
+        self._fire_events(events)
+
+        resp = {'code': connector._Response.CODE_OK,
+                'path': path,
+                'value': node.value,
+                'type': node.type,
+                'stamp': node.stamp.isoformat()}
+        if 'tag' in cmd:
+            resp['tag'] = cmd['tag']
+        return resp
+
+
+    def _cmd_rename(self, conn, cmd):
+        path = cmd['path']
+        new_path = cmd['newPath']
+        events = []
+        with self._lock:
+            if path not in self._nodes:
+                return [self._error(cmd, connector._Response.CODE_NOTFOUND)]
+            if new_path in self._nodes:
+                return [self._error(cmd, connector._Response.CODE_ERROR, 'new path already exists')]
+            subtree = list(self._iter_subtree(path))
+            node = self._nodes[path]
+            self._add_node(new_path, value=node.value, type=node.type, stamp=node.stamp)
+            for curr_path in subtree:
+                curr_new_path = new_path + curr_path[len(path):]
+                self._nodes[curr_new_path] = self._nodes.pop(curr_path)
+                events.append((connector.DMSEvent.CODE_RENAME, curr_path, {'newPath': curr_new_path}))
+            self._nodes[_parent_of(path)].children.discard(path.rpartition(':')[2])
+        self._fire_events(events)
+        return [{'code': connector._Response.CODE_OK, 'path': path, 'newPath': new_path, 'tag': cmd['tag']}]
+
+
+    def _cmd_delete(self, conn, cmd):
+        path = cmd['path']
+        events = []
+        with self._lock:
+            if path not in self._nodes:
+                return [self._error(cmd, connector._Response.CODE_NOTFOUND)]
+            if self._nodes[path].children and not cmd.get('recursive', False):
+                return [self._error(cmd, connector._Response.CODE_ERROR, 'datapoint has children, use "recursive"')]
+            # deepest nodes first
+            for curr_path in reversed(list(self._iter_subtree(path))):
+                events.append((connector.DMSEvent.CODE_DELETE, curr_path, {}))
+            self._nodes[_parent_of(path)].children.discard(path.rpartition(':')[2])
+        # (subscribers get events with last value before deletion)
+        self._fire_events(events)
+        with self._lock:
+            for _, curr_path, _ in events:
+                self._nodes.pop(curr_path, None)
+        return [{'code': connector._Response.CODE_OK, 'path': path, 'tag': cmd['tag']}]
+
+
+    def _cmd_subscribe(self, conn, cmd):
+        path = cmd['path']
+        if conn is None:
+            return [self._error(cmd, connector._Response.CODE_ERROR, 'subscriptions need WebSocket')]
+        with self._lock:
+            if path not in self._nodes:
+                return [self._error(cmd, connector._Response.CODE_NOTFOUND)]
+            max_depth = 0
+            if 'query' in cmd:
+                max_depth = cmd['query'].get('maxDepth', -1)
+            event_str = cmd.get('event', '*') or '*'
+            if event_str == '*':
+                codes = set((connector.DMSEvent.CODE_CHANGE,
+                             connector.DMSEvent.CODE_SET,
+                             connector.DMSEvent.CODE_CREATE,
+                             connector.DMSEvent.CODE_RENAME,
+                             connector.DMSEvent.CODE_DELETE))
+            else:
+                codes = set(code.strip() for code in event_str.split(','))
+            self._subscriptions[conn][cmd['tag']] = (path, max_depth, codes)
+            node = self._nodes[path]
+            resp = {'code': connector._Response.CODE_OK,
+                    'path': path,
+                    'value': node.value,
+                    'type': node.type,
+                    'tag': cmd['tag']}
+            if node.stamp is not None:
+                resp['stamp'] = node.stamp.isoformat()
+            if 'query' in cmd:
+                resp['query'] = cmd['query']
+        return [resp]
+
+
+    def _cmd_unsubscribe(self, conn, cmd):
+        with self._lock:
+            if conn is None or self._subscriptions[conn].pop(cmd.get('tag'), None) is None:
+                return [self._error(cmd, connector._Response.CODE_NOTFOUND)]
+        return [{'code': connector._Response.CODE_OK, 'path': cmd['path'], 'tag': cmd['tag']}]
+
+
+    def _cmd_changelog_get_groups(self, conn, cmd):
+        with self._lock:
+            return [{'code': connector._Response.CODE_OK, 'groups': sorted(self._changelog_groups)}]
+
+
+    def _cmd_changelog_read(self, conn, cmd):
+        group = cmd['group']
+        with self._lock:
+            if group not in self._changelog_groups:
+                return [{'code': connector._Response.CODE_NOTFOUND, 'group': group, 'tag': cmd['tag']}]
+            start = _parse_stamp(cmd['start'])
+            end = _parse_stamp(cmd['end']) if 'end' in cmd else None
+            entries = []
+            for stamp, path, text in self._changelog_groups[group]:
+                if stamp >= start and (end is None or stamp <= end):
+                    entries.append({'path': path, 'stamp': stamp.isoformat(), 'text': text})
+        return [{'code': connector._Response.CODE_OK, 'group': group, 'changelog': entries, 'tag': cmd['tag']}]
+
+
+    # DMS-events
+    @staticmethod
+    def _is_matching(sub_path, max_depth, path):
+        if path == sub_path:
+            return True
+        if max_depth == 0 or not path.startswith(sub_path + ':'):
+            return False
+        return max_depth < 0 or path[len(sub_path) + 1:].count(':') < max_depth
+
+
+    def _fire_events(self, events):
+        # events: list of tuples (code, path, additional fields)
+        frames = collections.defaultdict(list)
+        with self._lock:
+            for conn, subs in self._subscriptions.items():
+                for tag, (sub_path, max_depth, codes) in subs.items():
+                    for code, path, fields in events:
+                        if code in codes and self._is_matching(sub_path, max_depth, path):
+                            node = self._nodes.get(path) or self._nodes.get(fields.get('newPath'))
+                            event = {'code': code,
+                                     'path': path,
+                                     'value': node.value if node else None,
+                                     'type': node.type if node else None,
+                                     'stamp': node.stamp.isoformat() if node else _now().isoformat(),
+                                     'tag': tag}
+                            event.update(fields)
+                            frames[conn].append(event)
+        for conn, event_list in frames.items():
+            self.nof_events += len(event_list)
+            conn.send_message(json.dumps({'event': event_list}))
+
+
+    def get_stats(self):
+        """ returns dictionary with request counters and WebSocket traffic """
+        stats = {'nof_datapoints': len(self._nodes) - 1,
+                 'nof_requests': self.nof_requests,
+                 'nof_commands': self.nof_commands,
+                 'nof_events': self.nof_events,
+                 'connections': []}
+        for conn in self.get_connections():
+            stats['connections'].append({'address': conn.address,
+                                         'use_deflate': conn.use_deflate,
+                                         'bytes_tx': conn.bytes_tx,
+                                         'bytes_tx_wire': conn.bytes_tx_wire,
+                                         'bytes_rx_wire': conn.bytes_rx_wire})
+        return stats
+
+
+
+def _type_of(value):
+    # DMS type of a JSON value
+    if isinstance(value, bool):
+        return 'bool'
+    elif isinstance(value, int):
+        return 'int'
+    elif isinstance(value, float):
+        return 'double'
+    else:
+        return 'string'
+
+
+def _convert(value, type_str):
+    # converting value to DMS type
+    if type_str == 'bool':
+        return bool(value)
+    elif type_str == 'int':
+        return int(value)
+    elif type_str == 'double':
+        return float(value)
+    elif type_str == 'string':
+        return '' + str(value)
+    return value
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='local stand-in for DMS "JSON Data Exchange" over WebSocket')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=connector.DMS_PORT)
+    parser.add_argument('--datapoints', type=int, default=1000, help='number of synthetic datapoints')
+    parser.add_argument('--no-deflate', action='store_true', help='refuse compression extension "permessage-deflate"')
+    args = parser.parse_args()
+
+    server = StandInDMS(host=args.host, port=args.port, deflate=not args.no_deflate)
+    server.populate(args.datapoints)
+    server.start()
+    server.start_blinker()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\transport.py
+
+Transports of request frames to DMS: WebSocket connection of DMSClient
+or HTTP POST over a pool of keep-alive connections (DMSHttpClient)
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+=>both transports have the same interface: send(msg, read_only, timeout), close()
+=>_MessageHandler doesn't care about the transport, responses are handed over to it's table of pending requests
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import http.client
+import logging
+import queue
+import threading
+
+
+# same logger as module "connector" (configured there)
+logger = logging.getLogger('visitoolkit_connector')
+
+# HTTP transport (class DMSHttpClient): maximum number of keep-alive connections to DMS
+HTTP_POOL_SIZE = 8
+
+
+
+class _WebSocketTransport(object):
+    """ sending requests over WebSocket connection of DMSClient """
+    # =>responses and DMS-events arrive asynchronously in websocket thread (DMSClient._cb_on_message())
+
+    def __init__(self, dmsclient, connect_timeout):
+        self._dmsclient = dmsclient
+        # maximum seconds a request waits for establishment of WebSocket connection (shorter request timeouts win)
+        self._connect_timeout = connect_timeout
+
+    def send(self, msg, read_only=False, timeout=None):
+        if timeout is None:
+            timeout = self._connect_timeout
+        self._dmsclient._send_message(msg, timeout=min(timeout, self._connect_timeout))
+
+    def close(self):
+        pass
+
+
+
+class _HttpTransport(object):
+    """ sending requests as HTTP POST over a pool of keep-alive connections """
+    # =>every request gets it's response in the same HTTP exchange,
+    #   so it's handed over to "on_frame" before send() returns (caller finds it in table of pending requests)
+    # =>DMS doesn't push anything over HTTP: no DMS-events, no subscriptions
+
+    def __init__(self, host, port, basepath, on_frame, timeout, pool_size=HTTP_POOL_SIZE, recorder=None):
+        self._host = host
+        self._port = port
+        self._basepath = basepath
+        self._on_frame = on_frame
+        self._timeout = timeout
+        self._recorder = recorder
+
+        # idle connections (most recently used first: it's the one with least risk of being closed by server)
+        self._idle_conns = queue.LifoQueue()
+        # limit of concurrently used connections
+        self._pool_semaphore = threading.BoundedSemaphore(pool_size)
+        self.pool_size = pool_size
+
+        # statistics
+        self._stats_lock = threading.Lock()
+        self.nof_requests = 0
+        self.nof_connects = 0
+        self.nof_retries = 0
+        self.bytes_tx = 0
+        self.bytes_rx = 0
+
+
+    def _new_connection(self):
+        with self._stats_lock:
+            self.nof_connects += 1
+        return http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+
+
+    def _send_request(self, conn, body):
+        conn.request('POST', self._basepath, body=body, headers={'Content-Type': 'application/json; charset=utf-8',
+                                                                 'Connection': 'keep-alive'})
+
+
+    def _read_response(self, conn):
+        resp = conn.getresponse()
+        # reading whole body: connection is ready for next request
+        data = resp.read()
+        if resp.status != 200:
+            raise IOError('_HttpTransport: DMS answered with HTTP status ' + str(resp.status) + ' ' + str(resp.reason))
+        return data
+
+
+    def send(self, msg, read_only=False, timeout=None):
+        # read_only=True: frame contains no writing command, it's safe to send it twice
+        # (timeout is not used: every connection has it's own socket timeout)
+        body = msg.encode('utf-8')
+        self._pool_semaphore.acquire()
+        try:
+            try:
+                conn = self._idle_conns.get_nowait()
+                is_reused = True
+            except queue.Empty:
+                conn = self._new_connection()
+                is_reused = False
+
+            is_sent = False
+            try:
+                self._send_request(conn, body)
+                is_sent = True
+                data = self._read_response(conn)
+            except (http.client.RemoteDisconnected, ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                # server closed idle keep-alive connection: trying once again with a new connection,
+                # but a writing request is repeated only when it never left us
+                # (server could have executed it before closing the connection)
+                if not is_reused or (is_sent and not read_only):
+                    raise
+                logger.debug('_HttpTransport.send(): idle connection was closed by server, reconnecting...')
+                with self._stats_lock:
+                    self.nof_retries += 1
+                conn = self._new_connection()
+                try:
+                    self._send_request(conn, body)
+                    data = self._read_response(conn)
+                except Exception:
+                    conn.close()
+                    raise
+            except Exception:
+                conn.close()
+                raise
+            self._idle_conns.put(conn)
+        finally:
+            self._pool_semaphore.release()
+
+        with self._stats_lock:
+            self.nof_requests += 1
+            self.bytes_tx += len(body)
+            self.bytes_rx += len(data)
+        msg_rx = data.decode('utf-8')
+        if self._recorder:
+            self._recorder.record_tx(msg)
+            self._recorder.record_rx(msg_rx)
+        self._on_frame(msg_rx)
+
+
+    def get_stats(self):
+        """ returns dictionary with request, connection and byte counters """
+        with self._stats_lock:
+            return {'pool_size': self.pool_size,
+                    'idle_connections': self._idle_conns.qsize(),
+                    'nof_requests': self.nof_requests,
+                    'nof_connects': self.nof_connects,
+                    'nof_retries': self.nof_retries,
+                    'bytes_tx': self.bytes_tx,
+                    'bytes_rx': self.bytes_rx}
+
+
+    def close(self):
+        while True:
+            try:
+                self._idle_conns.get_nowait().close()
+            except queue.Empty:
+                break
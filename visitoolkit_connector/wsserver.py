@@ -0,0 +1,432 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+visiToolkit_connector\wsserver.py
+
+Minimal threaded WebSocket server (RFC 6455) with optional "permessage-deflate" extension (RFC 7692),
+plain HTTP POST requests with keep-alive are accepted on the same port (as DMS does),
+only Python standard library is used.
+=>base for local stand-in of DMS (module standin.py) and for local gateways
+
+
+Copyright (C) 2017-2018 Stefan Braun
+
+
+This program is free software: you can redistribute it and/or modify it under the terms of the
+GNU General Public License as published by the Free Software Foundation, either version 2 of the License,
+or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY;
+without even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.
+See the GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License along with this program.
+If not, see <http://www.gnu.org/licenses/>.
+"""
+
+import base64
+import hashlib
+import socket
+import struct
+import threading
+import zlib
+
+from visitoolkit_connector import connector
+
+
+# according RFC 6455
+_WS_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+OPCODE_CONT = 0x0
+OPCODE_TEXT = 0x1
+OPCODE_BINARY = 0x2
+OPCODE_CLOSE = 0x8
+OPCODE_PING = 0x9
+OPCODE_PONG = 0xA
+
+# according RFC 7692: trailing bytes of every compressed message
+_DEFLATE_TAIL = b'\x00\x00\xff\xff'
+
+# maximum size of HTTP handshake request
+_MAX_HANDSHAKE_SIZE = 65536
+
+
+def _parse_deflate_offer(ext_str):
+    """ returns dictionary with parameters of first "permessage-deflate" offer (None without such offer) """
+    # (parameter without value gets value None, e.g. "client_max_window_bits")
+    for ext in ext_str.split(','):
+        params = [param.strip() for param in ext.split(';')]
+        if params[0] != 'permessage-deflate':
+            continue
+        offer = {}
+        for param in params[1:]:
+            name, _, val = param.partition('=')
+            val = val.strip().strip('"')
+            offer[name.strip()] = val or None
+        return offer
+    return None
+
+
+
+class WebSocketConnection(object):
+    """ one accepted WebSocket connection """
+
+    def __init__(self, sock, address, use_deflate=False, compression_level=6, server_wbits=zlib.MAX_WBITS, client_wbits=zlib.MAX_WBITS):
+        self._sock = sock
+        self.address = address
+        self.use_deflate = use_deflate
+        self._send_lock = threading.Lock()
+        self.is_open = True
+
+        # negotiated window sizes in bits (server_wbits: our compressor, client_wbits: compressor of client)
+        self.server_wbits = server_wbits
+        self.client_wbits = client_wbits
+        self._compressor = None
+        if use_deflate:
+            # (context takeover on both sides: one compressor and one decompressor per connection)
+            # =>zlib doesn't support raw deflate streams with 256 byte window,
+            #   with server_max_window_bits=8 we send all messages uncompressed (this is always allowed)
+            if server_wbits >= 9:
+                self._compressor = zlib.compressobj(compression_level, zlib.DEFLATED, -server_wbits)
+            self._decompressor = zlib.decompressobj(-max(client_wbits, 9))
+
+        # statistics
+        self.bytes_rx_wire = 0
+        self.bytes_tx_wire = 0
+        self.bytes_tx = 0
+
+
+    def _recv_exact(self, nof_bytes):
+        chunks = []
+        while nof_bytes > 0:
+            chunk = self._sock.recv(min(nof_bytes, 1048576))
+            if not chunk:
+                raise ConnectionError('connection closed by peer')
+            chunks.append(chunk)
+            nof_bytes -= len(chunk)
+        return b''.join(chunks)
+
+
+    def _recv_frame(self):
+        # returns tuple (fin, rsv1, opcode, payload)
+        byte1, byte2 = self._recv_exact(2)
+        fin = byte1 >> 7 & 1
+        rsv1 = byte1 >> 6 & 1
+        opcode = byte1 & 0x0F
+        has_mask = byte2 >> 7 & 1
+        length = byte2 & 0x7F
+        if length == 126:
+            length = struct.unpack('!H', self._recv_exact(2))[0]
+        elif length == 127:
+            length = struct.unpack('!Q', self._recv_exact(8))[0]
+        mask = self._recv_exact(4) if has_mask else None
+        payload = self._recv_exact(length)
+        self.bytes_rx_wire += length
+        if mask:
+            # unmasking with integer arithmetic is much faster than looping over bytes
+            mask_repeated = (mask * (length // 4 + 1))[:length]
+            payload = (int.from_bytes(payload, 'big') ^ int.from_bytes(mask_repeated, 'big')).to_bytes(length, 'big')
+        return fin, rsv1, opcode, payload
+
+
+    def recv_message(self):
+        """ blocks until next text message is complete, returns None when connection is closed """
+        fragments = []
+        is_compressed = False
+        while True:
+            try:
+                fin, rsv1, opcode, payload = self._recv_frame()
+            except (ConnectionError, OSError):
+                self.is_open = False
+                return None
+
+            if opcode == OPCODE_CLOSE:
+                self.close()
+                return None
+            elif opcode == OPCODE_PING:
+                self._send_frame(OPCODE_PONG, payload)
+                continue
+            elif opcode == OPCODE_PONG:
+                continue
+            elif opcode in (OPCODE_TEXT, OPCODE_BINARY):
+                fragments = [payload]
+                is_compressed = bool(rsv1)
+            else:
+                fragments.append(payload)
+
+            if fin:
+                data = b''.join(fragments)
+                if is_compressed:
+                    data = self._decompressor.decompress(data + _DEFLATE_TAIL)
+                return data.decode('utf-8')
+
+
+    def _send_frame(self, opcode, payload, rsv1=0):
+        with self._send_lock:
+            self._send_frame_unlocked(opcode, payload, rsv1)
+
+
+    def send_message(self, msg):
+        """ send one text message (compressed when "permessage-deflate" was negotiated) """
+        payload = msg.encode('utf-8')
+        self.bytes_tx += len(payload)
+        try:
+            if self._compressor:
+                # (compressor keeps context between messages: compressing and sending has to be atomic)
+                with self._send_lock:
+                    compressed = self._compressor.compress(payload) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+                    self._send_frame_unlocked(OPCODE_TEXT, compressed[:-len(_DEFLATE_TAIL)], rsv1=1)
+            else:
+                self._send_frame(OPCODE_TEXT, payload)
+        except OSError:
+            self.is_open = False
+
+
+    def _send_frame_unlocked(self, opcode, payload, rsv1=0):
+        # (caller has to hold self._send_lock)
+        header = bytearray([0x80 | (rsv1 << 6) | opcode])
+        length = len(payload)
+        if length < 126:
+            header.append(length)
+        elif length < 65536:
+            header.append(126)
+            header.extend(struct.pack('!H', length))
+        else:
+            header.append(127)
+            header.extend(struct.pack('!Q', length))
+        self._sock.sendall(bytes(header) + payload)
+        self.bytes_tx_wire += length
+
+
+    def close(self):
+        if self.is_open:
+            self.is_open = False
+            try:
+                self._send_frame(OPCODE_CLOSE, struct.pack('!H', 1000))
+            except OSError:
+                pass
+        try:
+            self._sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._sock.close()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return 'WebSocketConnection(address=' + repr(self.address) + ', use_deflate=' + repr(self.use_deflate) + ')'
+
+
+
+class WebSocketServer(object):
+    """ threaded WebSocket server: one background thread per connection """
+    # =>subclasses override on_connect(), on_message(), on_disconnect() and on_http_message()
+
+    def __init__(self, host='127.0.0.1', port=0, path=connector.DMS_BASEPATH, deflate=True, compression_level=6,
+                 server_max_window_bits=None, client_max_window_bits=None):
+        self.host = host
+        # port=0: operating system chooses a free port (look in attribute "port" after start())
+        self.port = port
+        self.path = path
+        self.deflate = deflate
+        self.compression_level = compression_level
+        # optional limits of LZ77 window (in bits) for compression: own messages and messages of client
+        # (client window can only be limited when client offers parameter "client_max_window_bits")
+        assert server_max_window_bits is None or 8 <= server_max_window_bits <= 15, 'server_max_window_bits has to be in range 8..15'
+        assert client_max_window_bits is None or 8 <= client_max_window_bits <= 15, 'client_max_window_bits has to be in range 8..15'
+        self.server_max_window_bits = server_max_window_bits
+        self.client_max_window_bits = client_max_window_bits
+
+        self._listen_sock = None
+        self._accept_thread = None
+        self._connections = set()
+        self._connections_lock = threading.Lock()
+        self.keep_running = False
+
+
+    def start(self):
+        """ start listening in background thread """
+        self._listen_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._listen_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._listen_sock.bind((self.host, self.port))
+        self._listen_sock.listen(128)
+        self.port = self._listen_sock.getsockname()[1]
+        self.keep_running = True
+        self._accept_thread = threading.Thread(target=self._accept_loop)
+        self._accept_thread.daemon = True
+        self._accept_thread.start()
+        connector.logger.info(self.__class__.__name__ + ': listening on ws://' + self.host + ':' + str(self.port) + self.path)
+        return self
+
+
+    def stop(self):
+        self.keep_running = False
+        if self._listen_sock:
+            self._listen_sock.close()
+        with self._connections_lock:
+            connections = list(self._connections)
+        for conn in connections:
+            conn.close()
+
+
+    def _accept_loop(self):
+        while self.keep_running:
+            try:
+                sock, address = self._listen_sock.accept()
+            except OSError:
+                break
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            thread = threading.Thread(target=self._serve_connection, args=(sock, address))
+            thread.daemon = True
+            thread.start()
+
+
+    @staticmethod
+    def _read_http_head(sock, buffer):
+        # reading HTTP request line and headers, returns tuple (request line, headers dict, remaining bytes)
+        # (returns None when connection is closed)
+        while b'\r\n\r\n' not in buffer:
+            chunk = sock.recv(4096)
+            if not chunk or len(buffer) > _MAX_HANDSHAKE_SIZE:
+                return None
+            buffer += chunk
+        head, _, buffer = buffer.partition(b'\r\n\r\n')
+        lines = head.decode('latin-1').split('\r\n')
+        headers = {}
+        for line in lines[1:]:
+            key, _, val = line.partition(':')
+            headers[key.strip().lower()] = val.strip()
+        return lines[0], headers, buffer
+
+
+    def _handshake(self, sock, address, headers):
+        # answering HTTP upgrade request, returns WebSocketConnection or None
+        if 'sec-websocket-key' not in headers:
+            sock.sendall(b'HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n')
+            return None
+
+        accept_key = base64.b64encode(hashlib.sha1((headers['sec-websocket-key'] + _WS_GUID).encode('ascii')).digest()).decode('ascii')
+        response_lines = ['HTTP/1.1 101 Switching Protocols',
+                          'Upgrade: websocket',
+                          'Connection: Upgrade',
+                          'Sec-WebSocket-Accept: ' + accept_key]
+        use_deflate = False
+        server_wbits = zlib.MAX_WBITS
+        client_wbits = zlib.MAX_WBITS
+        offer = _parse_deflate_offer(headers.get('sec-websocket-extensions', ''))
+        if self.deflate and offer is not None:
+            # accepting offer with context takeover on both sides, window sizes according RFC 7692 chapter 7.1.2
+            use_deflate = True
+            params = ['permessage-deflate']
+            if offer.get('server_max_window_bits') or self.server_max_window_bits:
+                # client demands a smaller window of our compressor (or we choose it)
+                server_wbits = min(int(offer.get('server_max_window_bits') or zlib.MAX_WBITS),
+                                   self.server_max_window_bits or zlib.MAX_WBITS)
+                params.append('server_max_window_bits=' + str(server_wbits))
+            if 'client_max_window_bits' in offer:
+                # client announced window size of it's compressor and allows us to limit it
+                client_wbits = min(int(offer['client_max_window_bits'] or zlib.MAX_WBITS),
+                                   self.client_max_window_bits or zlib.MAX_WBITS)
+                if client_wbits < zlib.MAX_WBITS:
+                    params.append('client_max_window_bits=' + str(client_wbits))
+            response_lines.append('Sec-WebSocket-Extensions: ' + '; '.join(params))
+        sock.sendall(('\r\n'.join(response_lines) + '\r\n\r\n').encode('latin-1'))
+        return WebSocketConnection(sock, address, use_deflate=use_deflate, compression_level=self.compression_level,
+                                   server_wbits=server_wbits, client_wbits=client_wbits)
+
+
+    def _serve_http(self, sock, request_line, headers, buffer):
+        # answering HTTP requests on this keep-alive connection until client closes it
+        while self.keep_running:
+            length = int(headers.get('content-length', 0))
+            while len(buffer) < length:
+                chunk = sock.recv(max(4096, length - len(buffer)))
+                if not chunk:
+                    return
+                buffer += chunk
+            body, buffer = buffer[:length], buffer[length:]
+
+            method, _, rest = request_line.partition(' ')
+            if method == 'POST' and rest.split(' ')[0] == self.path:
+                status = '200 OK'
+                try:
+                    payload = self.on_http_message(body.decode('utf-8')).encode('utf-8')
+                except Exception:
+                    connector.logger.exception(self.__class__.__name__ + ': exception while handling HTTP request')
+                    status = '500 Internal Server Error'
+                    payload = b''
+            else:
+                status = '404 Not Found'
+                payload = b''
+            sock.sendall(('HTTP/1.1 ' + status + '\r\n'
+                          'Content-Type: application/json; charset=utf-8\r\n'
+                          'Content-Length: ' + str(len(payload)) + '\r\n'
+                          'Connection: keep-alive\r\n\r\n').encode('latin-1') + payload)
+
+            if headers.get('connection', '').lower() == 'close':
+                return
+            result = self._read_http_head(sock, buffer)
+            if result is None:
+                return
+            request_line, headers, buffer = result
+
+
+    def _serve_connection(self, sock, address):
+        conn = None
+        try:
+            result = self._read_http_head(sock, b'')
+            if result is not None:
+                request_line, headers, buffer = result
+                if headers.get('upgrade', '').lower() == 'websocket':
+                    conn = self._handshake(sock, address, headers)
+                else:
+                    self._serve_http(sock, request_line, headers, buffer)
+        except OSError:
+            conn = None
+        if conn is None:
+            sock.close()
+            return
+
+        with self._connections_lock:
+            self._connections.add(conn)
+        try:
+            self.on_connect(conn)
+            while self.keep_running:
+                msg = conn.recv_message()
+                if msg is None:
+                    break
+                try:
+                    self.on_message(conn, msg)
+                except Exception:
+                    connector.logger.exception(self.__class__.__name__ + ': exception while handling message')
+        finally:
+            with self._connections_lock:
+                self._connections.discard(conn)
+            self.on_disconnect(conn)
+            conn.close()
+
+
+    def get_connections(self):
+        with self._connections_lock:
+            return list(self._connections)
+
+    def on_connect(self, conn):
+        pass
+
+    def on_message(self, conn, msg):
+        pass
+
+    def on_disconnect(self, conn):
+        pass
+
+    def on_http_message(self, msg):
+        """ answering one HTTP POST request, returns response body """
+        raise NotImplementedError('HTTP requests are not supported by ' + self.__class__.__name__)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __repr__(self):
+        """ developer representation of this object """
+        return self.__class__.__name__ + '(host=' + repr(self.host) + ', port=' + repr(self.port) + ')'